@@ -0,0 +1,125 @@
+"""Detail-page extraction: per-field ``response.css()`` vs ``ExtractionSpec``.
+
+Runs the old per-field selector calls and the precompiled specs of
+``CarScrapper``/``BikeScrapper`` over the saved detail pages in
+``fixtures/`` and reports the time per page. Parsing the HTML is left out
+of the timing; both sides share one parsed document.
+
+    python bench_extraction.py --repeat 2000
+"""
+import argparse
+import os
+import timeit
+
+from common import make_response
+
+from bike import BikeScrapper
+from car import CarScrapper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_riyasewana(response):
+    values = {"image": response.css("div.thumb a::attr(href)").getall()}
+    description = []
+    for row in response.css("table.moret tr"):
+        tds = row.css("td")
+        if len(tds) == 4:
+            for header, value in ((tds[0].css("p.moreh::text").get(), tds[1].css("::text").get()),
+                                  (tds[2].css("p.moreh::text").get(), tds[3].css("::text").get())):
+                if header and value:
+                    field_name = CarScrapper.description_mapping.get(header.strip().lower())
+                    if field_name:
+                        values.setdefault(field_name, value.strip())
+                    description.append(f"{header.strip()}: {value.strip()}")
+    values["description"] = " | ".join(description)
+    return values
+
+
+def legacy_patpatlk(response):
+    return {
+        "image": response.css('div.item-images a img::attr(data-src)').extract(),
+        "modelYear": response.css('td:contains("Model Year") + td::text').get(),
+        "condition": response.css('td:contains("Condition") + td::text').get(),
+        "transmission": response.css('td:contains("Transmission") + td::text').get(),
+        "manufacturer": response.css('td:contains("Manufacturer") + td::text').get(),
+        "model": response.css('table.course-info tr:nth-child(6) td:nth-child(2)::text').get(),
+        "fuelType": response.css('td:contains("Fuel Type") + td::text').get(),
+        "engineCapacity": response.css('td:contains("Engine Capacity") + td::text').get(),
+        "mileage": response.css('td:contains("Mileage") + td::text').get(),
+        "color": response.css('td:contains("Color") + td::text').get(),
+    }
+
+
+def legacy_autolanka(response):
+    descriptions = []
+    for cell in response.css('div.table-cell.clearfix'):
+        header = cell.css('.name span::text').get()
+        value = cell.css('.value::text').get()
+        if header and value:
+            descriptions.append(f"{header.strip()}: {value.strip()}")
+    return {
+        "image": response.css("ul.swiper-wrapper li img::attr(src)").getall(),
+        "description": " | ".join(descriptions),
+        "modelYear": response.css("div#df_field_built div.value::text").get(),
+        "model": response.css("div#df_field_body_style div.value::text").get(),
+        "transmission": response.css("div#df_field_transmission div.value::text").get(),
+        "fuelType": response.css("div#df_field_fuel div.value::text").get(),
+        "mileage": response.css("div#df_field_milage div.value::text").get(),
+        "condition": response.css("div#df_field_condition div.value::text").get(),
+    }
+
+
+def legacy_saleme(response):
+    return {
+        "image": response.css("li.gallery-item a::attr(href)").extract(),
+        "modelYear": response.css('ul.spec-ul li:nth-child(3) span.spec-des::text').get(),
+        "condition": response.css('div.vap-details-tail:nth-child(1) div.vap-tail-desc '
+                                  'span.vap-tail-values::text').get(),
+        "manufacturer": response.css('ul.spec-ul li:nth-child(1) span.spec-des::text').get(),
+        "model": response.css('ul.spec-ul li:nth-child(2) span.spec-des::text').get(),
+        "engineCapacity": response.css('ul.spec-ul li:nth-child(4) span.spec-des::text').get(),
+        "mileage": response.css('div.vap-details-tail:nth-child(2) div.vap-tail-desc '
+                                'span.vap-tail-values::text').get(),
+        "description": response.css('div.description-div p::text').get(),
+    }
+
+
+def spec_extract(spec, describe=False):
+    def extract(response):
+        values, pairs = spec.extract(response)
+        if describe:
+            values["description"] = " | ".join(f"{header}: {value}" for header, value in pairs)
+        return values
+    return extract
+
+
+CASES = [
+    ("riyasewana", "riyasewana_car_detail.html", legacy_riyasewana, spec_extract(CarScrapper.riyasewana_spec, True)),
+    ("patpatlk", "patpat_car_detail.html", legacy_patpatlk, spec_extract(CarScrapper.patpatlk_spec)),
+    ("autolanka", "autolanka_car_detail.html", legacy_autolanka, spec_extract(CarScrapper.autolanka_spec, True)),
+    ("saleme", "saleme_bike_detail.html", legacy_saleme, spec_extract(BikeScrapper.saleme_spec)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'site':<12}{'per-field (us)':>16}{'spec (us)':>12}{'speedup':>10}  fields")
+    for site, fixture, legacy, spec in CASES:
+        with open(os.path.join(FIXTURES, fixture), "rb") as f:
+            response = make_response(f"https://example.com/{site}", f.read())
+        response.selector  # parse once, outside the timing
+        expected, actual = legacy(response), spec(response)
+        same = sorted(k for k, v in expected.items() if actual.get(k) == v)
+        differ = sorted(k for k, v in expected.items() if actual.get(k) != v)
+        old = timeit.timeit(lambda: legacy(response), number=args.repeat) / args.repeat * 1e6
+        new = timeit.timeit(lambda: spec(response), number=args.repeat) / args.repeat * 1e6
+        note = f"{len(same)} match" + (f", differ: {', '.join(differ)}" if differ else "")
+        print(f"{site:<12}{old:>16.1f}{new:>12.1f}{old / new:>9.1f}x  {note}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Per-item cost of building a vehicle item: ItemLoader vs ``VehicleRecord``.
+
+Both paths do what a car listing + detail callback pair does: load the
+listing values from a listing-row selector, hand them to the detail step,
+add the detail values and produce a ``VehicleItem``. The ItemLoader path
+runs ``MapCompose(remove_tags, remove_whitespace)`` on every value; the
+record only strips whitespace. Reports CPU time per item, and the memory
+held per in-flight item (a loader or record waiting for its detail page).
+
+    python bench_item_records.py --items 20000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+
+from common import make_response
+
+from scrapy.loader import ItemLoader
+
+from car import CarScrapper
+from items import VehicleItem, VehicleRecord
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LISTING = (
+    '<li class="item"><h2 class="more"><a href="https://riyasewana.com/buy/toyota-axio-1">Toyota Axio 2016</a></h2>'
+    '<div class="boxintxt b">Rs. 7,250,000</div></li>'
+)
+
+
+def detail_values():
+    with open(os.path.join(FIXTURES, "riyasewana_car_detail.html"), "rb") as f:
+        response = make_response("https://riyasewana.com/buy/toyota-axio-1", f.read())
+    values, pairs = CarScrapper.riyasewana_spec.extract(response)
+    values["description"] = " | ".join(f"{header}: {value}" for header, value in pairs)
+    return values
+
+
+def listing_loader(product):
+    loader = ItemLoader(item=VehicleItem(), selector=product)
+    loader.add_css("title", "h2.more a::text")
+    loader.add_value("price", "7,250,000")
+    loader.add_value("url", "https://riyasewana.com/buy/toyota-axio-1")
+    loader.add_value("site", "riyasewana")
+    return loader
+
+
+def via_loader(product, values):
+    partial = dict(listing_loader(product).load_item())
+    loader = ItemLoader(item=VehicleItem(partial))
+    for field, value in values.items():
+        loader.add_value(field, value)
+    return loader.load_item()
+
+
+def listing_record(product):
+    record = VehicleRecord()
+    record.add_text("title", product.css("h2.more a::text").getall())
+    record.add_text("price", "7,250,000")
+    record.add_text("url", "https://riyasewana.com/buy/toyota-axio-1")
+    record.add_text("site", "riyasewana")
+    return record
+
+
+def via_record(product, values):
+    record = VehicleRecord(**listing_record(product).to_dict())
+    for field, value in values.items():
+        record.add_text(field, value)
+    return record.to_item()
+
+
+def cpu_per_item(build, product, values, n):
+    start = time.process_time()
+    for _ in range(n):
+        build(product, values)
+    return (time.process_time() - start) / n * 1e6
+
+
+def bytes_per_pending(make, product, n):
+    tracemalloc.start()
+    pending = [make(product) for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del pending
+    return size / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=20000)
+    args = parser.parse_args()
+
+    product = make_response("https://riyasewana.com/search/cars", f"<ul>{LISTING}</ul>").css("li.item")[0]
+    values = detail_values()
+    assert dict(via_loader(product, values)) == dict(via_record(product, values))
+
+    rows = [
+        ("ItemLoader", cpu_per_item(via_loader, product, values, args.items),
+         bytes_per_pending(listing_loader, product, args.items // 4)),
+        ("VehicleRecord", cpu_per_item(via_record, product, values, args.items),
+         bytes_per_pending(listing_record, product, args.items // 4)),
+    ]
+    print(f"{'path':<15}{'CPU/item (us)':>15}{'pending bytes/item':>21}")
+    for name, cpu, mem in rows:
+        print(f"{name:<15}{cpu:>15.1f}{mem:>21.0f}")
+    print(f"speedup: {rows[0][1] / rows[1][1]:.1f}x CPU, {rows[0][2] / rows[1][2]:.1f}x memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Peak RSS of queued detail requests: loader in ``meta`` vs ``cb_kwargs``.
+
+Parses synthetic riyasewana listing pages and keeps every detail request
+they yield alive, the way the scheduler queue does during a crawl. The
+"loader" mode reproduces the old hand-off (``request.meta['loader']``,
+which keeps each listing page's lxml tree alive); the "partial" mode runs
+the current ``CarScrapper.parse_riyasewana``. Each mode runs in its own
+process so the peak RSS figures do not mix.
+
+    python bench_listing_memory.py --pages 200
+"""
+import argparse
+import gc
+import subprocess
+import sys
+
+from common import make_response, make_spider, peak_rss_kb
+
+from scrapy.loader import ItemLoader
+
+from car import CarScrapper
+from items import VehicleItem
+
+ITEMS_PER_PAGE = 40
+
+
+def listing_page(page, filler=400):
+    items = "".join(
+        f'<li class="item"><h2 class="more"><a href="https://riyasewana.com/buy/car-{page}-{i}">'
+        f"Toyota Axio {page}-{i}</a></h2>"
+        f'<div class="boxintxt b">Rs. {3_000_000 + i * 1000:,}</div>'
+        f'<div class="boxintxt">Colombo</div><div class="boxintxt s">2024-07-{i % 28 + 1:02d}</div></li>'
+        for i in range(ITEMS_PER_PAGE)
+    )
+    # Real listing pages carry navigation, ads and scripts around the results.
+    chrome = "".join(f'<div class="side"><a href="/x/{j}">Link {j}</a><p>{"lorem ipsum " * 10}</p></div>' for j in range(filler))
+    return f"<html><body>{chrome}<ul>{items}</ul>{chrome}</body></html>"
+
+
+def legacy_parse_riyasewana(spider, response):
+    for product in response.css("li.item"):
+        loader = ItemLoader(item=VehicleItem(), selector=product)
+        loader.add_css("title", "h2.more a::text")
+        price = product.css("div.boxintxt.b::text").get()
+        if price:
+            price = price.replace("Rs.", "").strip().replace("\r", "").replace(" ", "")
+        loader.add_value("price", price)
+        loader.add_value("url", product.css("h2.more a::attr(href)").get())
+        loader.add_value('site', 'riyasewana')
+        request = response.follow(product.css('h2.more a::attr(href)').get(), spider.parse_image_and_description)
+        request.meta['loader'] = loader
+        yield request
+
+
+def run_mode(mode, pages):
+    spider = make_spider(CarScrapper)
+    queued = []
+    for page in range(1, pages + 1):
+        response = make_response(f"https://riyasewana.com/search/cars?page={page}", listing_page(page))
+        if mode == "loader":
+            queued.extend(legacy_parse_riyasewana(spider, response))
+        else:
+            queued.extend(spider.parse_riyasewana(response))
+        del response
+        gc.collect()
+    print(f"{mode}\t{len(queued)}\t{peak_rss_kb()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--mode", choices=["loader", "partial"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        run_mode(args.mode, args.pages)
+        return
+
+    results = {}
+    for mode in ("loader", "partial"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--pages", str(args.pages)],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        results[mode] = (int(out[1]), int(out[2]))
+    print(f"{'mode':<10}{'queued':>10}{'peak RSS (MiB)':>18}")
+    for mode, (queued, rss) in results.items():
+        print(f"{mode:<10}{queued:>10}{rss / 1024:>18.1f}")
+    saved = results["loader"][1] - results["partial"][1]
+    print(f"peak RSS saved: {saved / 1024:.1f} MiB ({saved / results['loader'][1]:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Offline throughput of every parser callback, compared against a baseline.
+
+Feeds the pages in ``fixtures/`` through the real spider callbacks as
+``HtmlResponse`` objects, one listing and one detail page per site, and
+reports per callback: pages/s, items/s (items or detail requests carrying a
+partial item), peak memory allocated while handling one page and memory
+still held by what it yielded. Parsing the HTML is part of the timing, as
+in a crawl; timings are the best CPU time of ``--rounds`` rounds.
+
+Results are compared against ``baseline.json``; a callback that is slower
+or allocates more than ``--tolerance`` beyond its baseline is reported and
+the script exits with status 1.
+
+    python bench_parsers.py                       # compare against baseline.json
+    python bench_parsers.py --save-baseline       # record a new baseline
+    python bench_parsers.py riyasewana_car_listing --pages 500
+    python bench_parsers.py --record otc_mic_listing=https://otc.lk/product-category/microphones/
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from common import make_response, make_spider
+
+from scrapy import Request
+
+from bike import BikeScrapper
+from car import CarScrapper
+from mic import MicsScrapper
+from mobile import MobileScraper
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(HERE, "fixtures")
+BASELINE = os.path.join(HERE, "baseline.json")
+
+PHONE = {"title": "Samsung Galaxy A15", "price": "52,500.00"}
+MIC = {"title": "Boya BY-M1", "price": "3,950.00"}
+CAR = {"title": "Toyota Axio 2016", "price": "7,250,000"}
+BIKE = {"title": "Bajaj Pulsar 150 2019", "price": "385,000"}
+
+# name: (spider, callback, fixture, url, partial item for detail callbacks)
+CASES = {
+    "riyasewana_car_listing": (CarScrapper, "parse_riyasewana", "riyasewana_car_listing.html",
+                               "https://riyasewana.com/search/cars", None),
+    "riyasewana_car_detail": (CarScrapper, "parse_image_and_description", "riyasewana_car_detail.html",
+                              "https://riyasewana.com/buy/toyota-axio-sale-colombo-7800000",
+                              dict(CAR, site="riyasewana")),
+    "patpat_car_listing": (CarScrapper, "parse_patpatlk", "patpat_car_listing.html",
+                           "https://www.patpat.lk/vehicle/car", None),
+    "patpat_car_detail": (CarScrapper, "parse_image_and_description", "patpat_car_detail.html",
+                          "https://www.patpat.lk/vehicle/car/toyota-axio/510000", dict(CAR, site="patpatlk")),
+    "autolanka_car_listing": (CarScrapper, "parse_autolanka", "autolanka_car_listing.html",
+                              "https://www.autolanka.com/cars.html", None),
+    "autolanka_car_detail": (CarScrapper, "parse_image_and_description", "autolanka_car_detail.html",
+                             "https://www.autolanka.com/cars/toyota/axio/toyota-axio-2016-92000.html",
+                             dict(CAR, site="autolanka")),
+    "riyasewana_bike_listing": (BikeScrapper, "parse_riyasewana", "riyasewana_bike_listing.html",
+                                "https://riyasewana.com/search/motorcycles", None),
+    "riyasewana_bike_detail": (BikeScrapper, "parse_image_and_description", "riyasewana_car_detail.html",
+                               "https://riyasewana.com/buy/bajaj-pulsar-150-sale-kandy-7900000",
+                               dict(BIKE, site="riyasewana.com")),
+    "saleme_bike_listing": (BikeScrapper, "parse_saleme", "saleme_bike_listing.html",
+                            "https://www.saleme.lk/ads/sri-lanka/motorbikes", None),
+    "saleme_bike_detail": (BikeScrapper, "parse_image_and_description", "saleme_bike_detail.html",
+                           "https://www.saleme.lk/ad/bajaj-pulsar-150-for-sale-330000", dict(BIKE, site="saleme.lk")),
+    "celltronics_mobile_listing": (MobileScraper, "parse_celltronics", "celltronics_mobile_listing.html",
+                                   "https://celltronics.lk/product-category/mobile-phones-price-in-sri-lanka/", None),
+    "celltronics_mobile_detail": (MobileScraper, "parse_image_celltronics", "celltronics_product_detail.html",
+                                  "https://celltronics.lk/product/samsung-galaxy-a15/", dict(PHONE, site="celltronic")),
+    "lifemobile_mobile_listing": (MobileScraper, "parse_lifemobile", "lifemobile_mobile_listing.html",
+                                  "https://lifemobile.lk/product-category/mobile-phones/", None),
+    "lifemobile_mobile_detail": (MobileScraper, "parse_image_description_lifemobile", "lifemobile_product_detail.html",
+                                 "https://lifemobile.lk/product/samsung-galaxy-a15/", dict(PHONE, site="life_mobile")),
+    "xmobile_mobile_listing": (MobileScraper, "parse_xmobile", "xmobile_mobile_listing.html",
+                               "https://xmobile.lk/product-category/mobile-phones/", None),
+    "xmobile_mobile_detail": (MobileScraper, "parse_image_description_xmobile", "xmobile_product_detail.html",
+                              "https://xmobile.lk/product/samsung-galaxy-a15/", dict(PHONE, site="xmobile")),
+    "dialcom_mobile_listing": (MobileScraper, "parse_dialcom", "dialcom_mobile_listing.html",
+                               "https://dialcom.lk/product-category/mobile-accessories/mobile-phones/", None),
+    "dialcom_mobile_detail": (MobileScraper, "parse_image_description_dialcom", "dialcom_product_detail.html",
+                              "https://dialcom.lk/product/samsung-galaxy-a15/", dict(PHONE, site="dialcom")),
+    "celltronics_mic_listing": (MicsScrapper, "parse_celltronics", "celltronics_mic_listing.html",
+                                "https://celltronics.lk/product-category/microphones/", None),
+    "lifemobile_mic_listing": (MicsScrapper, "parse_lifemobile", "lifemobile_mic_listing.html",
+                               "https://lifemobile.lk/product-category/accessories/microphones/", None),
+    "otc_mic_listing": (MicsScrapper, "parse_otc", "otc_mic_listing.html",
+                        "https://otc.lk/product-category/microphones/", None),
+    "otc_mic_detail": (MicsScrapper, "parse_image_description_otc", "otc_mic_detail.html",
+                       "https://otc.lk/product/boya-by-m1/", dict(MIC, site="otc")),
+}
+
+
+def reset_pagination(spider):
+    """Fresh per-run pagination state, so every run schedules the same pages."""
+    if hasattr(spider, "page_count"):
+        spider.page_count = dict.fromkeys(spider.page_count, 0)
+        spider.scheduled_pages = {}
+
+
+def count_items(results):
+    return sum(1 for r in results if not isinstance(r, Request) or "partial" in r.cb_kwargs)
+
+
+class Case:
+
+    def __init__(self, name, spider_cls, callback, fixture, url, partial):
+        self.name = name
+        self.spider = make_spider(spider_cls)
+        self.callback = getattr(self.spider, callback)
+        self.url = url
+        self.partial = partial
+        with open(os.path.join(FIXTURES, fixture), "rb") as f:
+            self.body = f.read()
+
+    def run(self):
+        reset_pagination(self.spider)
+        response = make_response(self.url, self.body)
+        if self.partial is None:
+            return list(self.callback(response))
+        return list(self.callback(response, partial=dict(self.partial, url=self.url)))
+
+    def timing(self, pages, rounds):
+        """Best pages/s over ``rounds`` runs of ``pages`` pages."""
+        best = float("inf")
+        for _ in range(rounds):
+            gc.collect()
+            start = time.process_time()
+            for _ in range(pages):
+                self.run()
+            best = min(best, time.process_time() - start)
+        return pages / best
+
+    def memory(self):
+        """(peak, retained) KiB traced while handling one page."""
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        results = self.run()
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()  # the parsed tree is only freed by the cycle collector
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del results
+        return (peak - before) / 1024, (current - before) / 1024
+
+
+def measure(case, pages, rounds):
+    items = count_items(case.run())
+    pages_per_sec = case.timing(pages, rounds)
+    peak, retained = case.memory()
+    return {
+        "pages_per_sec": round(pages_per_sec, 1),
+        "items_per_page": items,
+        "items_per_sec": round(pages_per_sec * items, 1),
+        "peak_kib": round(peak, 1),
+        "retained_kib": round(retained, 1),
+    }
+
+
+def regressions(result, baseline, tolerance):
+    found = []
+    if result["pages_per_sec"] < baseline["pages_per_sec"] * (1 - tolerance):
+        found.append(f"pages/s {baseline['pages_per_sec']} -> {result['pages_per_sec']}")
+    if result["peak_kib"] > baseline["peak_kib"] * (1 + tolerance):
+        found.append(f"peak KiB {baseline['peak_kib']} -> {result['peak_kib']}")
+    if result["items_per_page"] != baseline["items_per_page"]:
+        found.append(f"items/page {baseline['items_per_page']} -> {result['items_per_page']}")
+    return found
+
+
+def record(name, url):
+    """Save the live page at ``url`` as the fixture of case ``name``."""
+    import requests
+
+    spider_cls, _, fixture, _, _ = CASES[name]
+    response = requests.get(url, headers={"User-Agent": make_spider(spider_cls).settings.get("USER_AGENT")}, timeout=30)
+    response.raise_for_status()
+    with open(os.path.join(FIXTURES, fixture), "wb") as f:
+        f.write(response.content)
+    print(f"recorded {url} -> fixtures/{fixture} ({len(response.content)} bytes)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cases", nargs="*", help="callbacks to run (default: all)")
+    parser.add_argument("--pages", type=int, default=100, help="pages per timing round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth vs the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {os.path.basename(BASELINE)}")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--record", action="append", default=[], metavar="CASE=URL",
+                        help="replace a case's fixture with the live page at URL")
+    args = parser.parse_args()
+
+    for spec in args.record:
+        name, _, url = spec.partition("=")
+        if name not in CASES or not url:
+            parser.error(f"--record expects CASE=URL with CASE one of: {', '.join(CASES)}")
+        record(name, url)
+    if args.record:
+        return
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    results = {}
+    # Some callbacks print per product; keep that out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in args.cases or CASES:
+            results[name] = measure(Case(name, *CASES[name]), args.pages, args.rounds)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(BASELINE):
+            with open(BASELINE) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(BASELINE, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = {}
+    if os.path.exists(BASELINE) and not args.save_baseline:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    failed = False
+    print(f"{'callback':<28}{'pages/s':>10}{'items/s':>11}{'peak KiB':>10}{'held KiB':>10}  vs baseline")
+    for name, result in results.items():
+        if name in baseline:
+            found = regressions(result, baseline[name], args.tolerance)
+            failed = failed or bool(found)
+            note = "REGRESSION: " + "; ".join(found) if found else \
+                f"{result['pages_per_sec'] / baseline[name]['pages_per_sec']:.2f}x"
+        else:
+            note = "-"
+        print(f"{name:<28}{result['pages_per_sec']:>10.1f}{result['items_per_sec']:>11.1f}"
+              f"{result['peak_kib']:>10.1f}{result['retained_kib']:>10.1f}  {note}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
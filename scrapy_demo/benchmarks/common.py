@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark scripts.
+
+The benchmarks import the spider modules directly, the same way
+``python car.py`` does, so the spiders directory is put on ``sys.path``.
+"""
+import os
+import resource
+import sys
+
+SPIDERS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "spiders")
+if SPIDERS_DIR not in sys.path:
+    sys.path.insert(0, SPIDERS_DIR)
+
+from scrapy.http import HtmlResponse  # noqa: E402
+from scrapy.settings import Settings  # noqa: E402
+
+from settings import SETTINGS  # noqa: E402
+
+
+def make_spider(spider_cls, **settings):
+    """Spider instance with the shared settings, without a running crawler."""
+    spider = spider_cls()
+    spider.settings = Settings(dict(SETTINGS, **settings))
+    return spider
+
+
+def make_response(url, body, request=None):
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return HtmlResponse(url, body=body, encoding="utf-8", request=request)
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB on Linux.
+    return peak // 1024 if sys.platform == "darwin" else peak
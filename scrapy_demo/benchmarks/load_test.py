@@ -0,0 +1,146 @@
+"""Crawl throughput against the local mock sites while sweeping settings.
+
+Starts ``mock_site.MockSiteServer`` and runs the four category spiders
+against it (all in one process, as ``runner.py`` does) once per
+combination of ``CONCURRENT_REQUESTS`` and ``DOWNLOAD_DELAY``, each run in
+its own process. Reports requests/s, items/s and download latency
+percentiles per run. Every domain is pinned to the swept concurrency;
+with ``--adaptive`` it is only the ceiling, and the per-domain limits start
+from the spiders' budgets and adapt as in a real crawl. The API upload is
+disabled.
+
+    python load_test.py --concurrency 4 8 16 32 --delay 0 0.1 --latency 0.05
+    python load_test.py --concurrency 16 --adaptive --error-rate 0.05
+"""
+import argparse
+import itertools
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_site import DETAIL_FIXTURES, start_server
+
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+
+from runner import SPIDERS
+from settings import SETTINGS
+
+
+def percentiles(values):
+    if len(values) < 2:
+        return {"p50": values[0] if values else None, "p90": None, "p99": None}
+    cuts = statistics.quantiles(values, n=100)
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98]}
+
+
+def run_point(mock_url, concurrency, delay, categories, adaptive=False):
+    """One crawl of ``categories``; returns its throughput figures."""
+    output_dir = tempfile.mkdtemp(prefix="load-test-")
+    settings = {
+        **SETTINGS,
+        "ITEM_PIPELINES": {**SETTINGS["ITEM_PIPELINES"], "pipelines.ApiUploadPipeline": None},
+        "JSONLINES_PATH": f"{output_dir}/%(category)s.jl",
+        "PRICE_HISTORY_PATH": f"{output_dir}/%(category)s.prices.db",
+        "CHECKPOINT_PATH": f"{output_dir}/%(category)s.checkpoint.db",
+        "DOWNLOAD_HANDLERS": {
+            "http": "mock_site.MockSiteDownloadHandler",
+            "https": "mock_site.MockSiteDownloadHandler",
+        },
+        "MOCK_SITE_URL": mock_url,
+        "CONCURRENT_REQUESTS": concurrency,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": concurrency,
+        "ADAPTIVE_CONCURRENCY": adaptive,
+        "ADAPTIVE_CONCURRENCY_STATE": None,
+        # Pin every domain to the swept value unless the limits adapt.
+        "DOMAIN_CONCURRENCY": {} if adaptive else dict.fromkeys(DETAIL_FIXTURES, concurrency),
+        "DOWNLOAD_DELAY": delay,
+        "RANDOMIZE_DOWNLOAD_DELAY": False,
+        "LOG_LEVEL": "ERROR",
+    }
+    latencies = []
+
+    def response_received(response, request, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            latencies.append(latency)
+
+    process = CrawlerProcess(settings=settings)
+    crawlers = []
+    for category in categories:
+        crawler = process.create_crawler(SPIDERS[category])
+        crawler.signals.connect(response_received, signal=signals.response_received)
+        crawlers.append(crawler)
+        process.crawl(crawler)
+    start = time.perf_counter()
+    process.start()
+    elapsed = time.perf_counter() - start
+
+    stats = [crawler.stats.get_stats() for crawler in crawlers]
+    requests = sum(s.get("downloader/request_count", 0) for s in stats)
+    items = sum(s.get("item_scraped_count", 0) for s in stats)
+    errors = sum(s.get("downloader/response_status_count/503", 0) for s in stats)
+    return {
+        "concurrency": concurrency,
+        "delay": delay,
+        "seconds": round(elapsed, 2),
+        "requests": requests,
+        "items": items,
+        "errors": errors,
+        "requests_per_sec": round(requests / elapsed, 1),
+        "items_per_sec": round(items / elapsed, 1),
+        **{k: round(v * 1000, 1) if v is not None else None for k, v in percentiles(latencies).items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("categories", nargs="*", help=f"categories to crawl: {', '.join(SPIDERS)} (default: all)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16, 32], help="CONCURRENT_REQUESTS values")
+    parser.add_argument("--delay", type=float, nargs="+", default=[0.0], help="DOWNLOAD_DELAY values")
+    parser.add_argument("--pages", type=int, default=5, help="listing pages per category on the mock sites")
+    parser.add_argument("--items", type=int, default=20, help="ads per listing page")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean mock response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock responses that are 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--adaptive", action="store_true", help="let per-domain limits adapt up to the swept value")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--point", nargs=3, metavar=("MOCK_URL", "CONCURRENCY", "DELAY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = set(args.categories) - set(SPIDERS)
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(sorted(unknown))}")
+    categories = args.categories or list(SPIDERS)
+
+    if args.point:
+        mock_url, concurrency, delay = args.point
+        print(json.dumps(run_point(mock_url, int(concurrency), float(delay), categories, args.adaptive)))
+        return
+
+    server = start_server(pages=args.pages, items=args.items, latency=args.latency,
+                          error_rate=args.error_rate, seed=args.seed)
+    results = []
+    for concurrency, delay in itertools.product(args.concurrency, args.delay):
+        out = subprocess.run(
+            [sys.executable, __file__, *categories, "--point", server.url, str(concurrency), str(delay)]
+            + (["--adaptive"] if args.adaptive else []),
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'conc':>5}{'delay':>7}{'secs':>8}{'requests':>10}{'items':>7}{'503s':>6}"
+          f"{'req/s':>8}{'items/s':>9}{'p50 ms':>8}{'p90 ms':>8}{'p99 ms':>8}")
+    for r in results:
+        print(f"{r['concurrency']:>5}{r['delay']:>7.2f}{r['seconds']:>8.1f}{r['requests']:>10}{r['items']:>7}{r['errors']:>6}"
+              f"{r['requests_per_sec']:>8.1f}{r['items_per_sec']:>9.1f}{r['p50']:>8.1f}{r['p90']:>8.1f}{r['p99']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""Local stand-in for every site the spiders crawl, for load tests.
+
+Serves paginated listing pages and detail pages with the markup the
+spiders expect (``li.item``, ``article.item``, ``div.all-ads-cont > a``,
+``div.product-wrapper``, ``li.product``, ``div.product-grid-item``...),
+with configurable page counts, items per page, latency and error rate.
+Image URLs get a generated JPEG that depends only on the last number in
+the file name, so ``full-2.jpg`` and ``med-2.jpg``, or the same name on two
+sites, are the same picture at different sizes; they carry an ETag and
+answer ``If-None-Match`` with 304. The WooCommerce stores except
+``NO_STORE_API`` also serve the same products as JSON from the Store API
+(``/wp-json/wc/store/v1/products``), paged by ``per_page``, and list
+them in a Yoast-style ``/sitemap_index.xml``. Product pages carry the
+WooCommerce title, price and ``product_cat-<slug>`` markup. One product in
+ten has ``revision`` days added to its ``lastmod``, so raising
+``--revision`` between two runs changes 10% of the catalogue.
+Pages are addressed as ``/<site host>/<path>``, e.g.
+``/riyasewana.com/search/cars?page=2``.
+
+``MockSiteDownloadHandler`` sends every request of a crawl to the mock
+server instead of the real host and hands the spider a response with the
+original URL, so the spiders run unchanged:
+
+    python mock_site.py --port 8900 --pages 10 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import datetime
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import common  # noqa: F401  (puts the spiders directory on sys.path)
+
+from PIL import Image, ImageDraw
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+
+from handlers import SharedPoolDownloadHandler, domain_key
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+CARS = ["Toyota Axio", "Honda Vezel", "Suzuki Wagon R", "Nissan Leaf", "Toyota Premio", "Honda Fit"]
+BIKES = ["Bajaj Pulsar 150", "Honda Dio", "Yamaha FZ", "TVS Apache", "Hero Pleasure", "Bajaj CT100"]
+PHONES = ["Samsung Galaxy A15", "Apple iPhone 15", "Xiaomi Redmi Note 13", "Vivo Y27", "Oppo A58", "Realme C55"]
+MICS = ["Boya BY-M1", "Rode Wireless GO II", "Maono AU-PM421", "Fifine K669B", "Hollyland Lark M1"]
+
+DETAIL_FIXTURES = {
+    "riyasewana.com": "riyasewana_car_detail.html",
+    "autolanka.com": "autolanka_car_detail.html",
+    "saleme.lk": "saleme_bike_detail.html",
+    "celltronics.lk": "celltronics_product_detail.html",
+    "lifemobile.lk": "lifemobile_product_detail.html",
+    "xmobile.lk": "xmobile_product_detail.html",
+    "dialcom.lk": "dialcom_product_detail.html",
+    "otc.lk": "otc_mic_detail.html",
+}
+
+# Category slugs of each WooCommerce store, as in the spiders' start URLs.
+STORE_CATEGORIES = {
+    "celltronics.lk": {"mobile-phones-price-in-sri-lanka": PHONES, "microphones": MICS},
+    "lifemobile.lk": {"mobile-phones": PHONES, "microphones": MICS},
+    "xmobile.lk": {"mobile-phones": PHONES},
+    "dialcom.lk": {"mobile-phones": PHONES},
+    "otc.lk": {"microphones": MICS},
+}
+PRODUCT_PAGE = re.compile(r"^/product/(.+)-(\d+)-(\d+)/$")
+LASTMOD = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Stores without the Store API, so the spiders fall back to their HTML.
+NO_STORE_API = {"otc.lk"}
+STORE_API_PATH = "/wp-json/wc/store/v1/products"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+WOO_PAGE = re.compile(r"^(.*/)page/(\d+)/$")
+IMAGE = re.compile(r"(\d+)?\.(?:jpe?g|png|webp)$", re.IGNORECASE)
+
+
+def mock_image(path):
+    """JPEG for an image URL path: the picture is chosen by the last number
+    in the file name, the size by whether the name looks like a thumbnail."""
+    match = IMAGE.search(path)
+    rng = random.Random(int(match.group(1) or 0))
+    image = Image.new("RGB", (320, 240), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(280), rng.randrange(200)
+        draw.rectangle((x, y, x + rng.randrange(20, 160), y + rng.randrange(20, 120)),
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    if not any(mark in path for mark in ("med-", "thumb", "small")):
+        image = image.resize((960, 720))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _name(names, page, i):
+    return f"{names[(page + i) % len(names)]} {2010 + (page * 7 + i) % 14}"
+
+
+def _slug(text):
+    return text.lower().replace(" ", "-")
+
+
+def _html(title, content):
+    return f"<html><head><title>{title}</title></head><body><div id=\"content\">{content}</div></body></html>"
+
+
+def _woo_price(amount):
+    return (f'<span class="woocommerce-Price-amount amount"><bdi>'
+            f'<span class="woocommerce-Price-currencySymbol">Rs.</span>{amount:,.2f}</bdi></span>')
+
+
+def _woo_nav(base, page, pages):
+    links = "".join(f'<li><a class="page-numbers" href="{base}page/{p}/">{p}</a></li>' for p in range(1, pages + 1) if p != page)
+    if page < pages:
+        links += f'<li><a class="next page-numbers" href="{base}page/{page + 1}/">&rarr;</a></li>'
+    return f'<nav class="woocommerce-pagination"><ul class="page-numbers">{links}</ul></nav>'
+
+
+def riyasewana_listing(base, path, page, pages, items):
+    names = BIKES if "motorcycles" in path else CARS
+    rows = "".join(
+        f'<li class="item round"><h2 class="more"><a href="{base}/buy/{_slug(_name(names, page, i))}-{page}-{i}">'
+        f'{_name(names, page, i)}</a></h2><div class="boxtext"><div class="boxintxt">Colombo</div>'
+        f'<div class="boxintxt b">Rs. {3_000_000 + i * 125_000:,}</div></div></li>'
+        for i in range(items))
+    links = "".join(f'<a href="{base}{path}?page={p}">{p}</a>' for p in range(1, pages + 1) if p != page)
+    if page < pages:
+        links += f'<a href="{base}{path}?page={page + 1}">Next</a>'
+    return _html("Vehicles", f'<ul>{rows}</ul><div class="pagination">{links}</div>')
+
+
+def autolanka_listing(base, path, page, pages, items):
+    rows = "".join(
+        f'<article class="item"><a class="link-large" href="{base}/cars/{_slug(_name(CARS, page, i)).split("-")[0]}/'
+        f'{_slug(_name(CARS, page, i))}-{page}-{i}.html">{_name(CARS, page, i)}</a>'
+        f'<span class="price-tag"><span>Rs {2_900_000 + i * 110_000:,}</span></span></article>'
+        for i in range(items))
+    links = "".join(f'<li><a href="{base}/cars/index{p}.html">{p}</a></li>' for p in range(1, pages + 1) if p != page)
+    more = f'<a class="button" href="{base}/cars/index{page + 1}.html">Next page</a>' if page < pages else ""
+    return _html("Cars", f'<section>{rows}</section><ul class="pagination">{links}</ul>{more}')
+
+
+def saleme_listing(base, path, page, pages, items):
+    rows = "".join(
+        f'<a href="{base}/ad/{_slug(_name(BIKES, page, i))}-{page}-{i}"><h3 class="item-title">{_name(BIKES, page, i)}</h3>'
+        f'<h4 class="item-price">RS {260_000 + i * 12_500:,}</h4></a>'
+        for i in range(items))
+    links = "".join(f'<li><a href="{base}{path}?page={p}">{p}</a></li>' for p in range(1, pages + 1) if p != page)
+    if page < pages:
+        links += f'<li><a rel="next" href="{base}{path}?page={page + 1}">Next</a></li>'
+    return _html("Motorbikes", f'<div class="all-ads-cont">{rows}</div><ul class="pager">{links}</ul>')
+
+
+def woocommerce_listing(host, base, path, page, pages, items):
+    names = MICS if "microphones" in path else PHONES
+    category = f"{base}{path}"
+    products = []
+    for i in range(items):
+        title = _name(names, page, i)
+        link = f"{base}/product/{_slug(title)}-{page}-{i}/"
+        price = _woo_price(12_000 + i * 2_750)
+        if host == "celltronics.lk":
+            products.append(
+                f'<div class="product-grid-item"><div class="product-wrapper"><a class="product-image-link" href="{link}"></a>'
+                f'<h3 class="wd-entities-title"><a href="{link}">{title}</a></h3><span class="price">{price}</span>'
+                f'<div class="hover-content-inner"><ul><li>RAM: 8GB</li><li>Storage: 128GB</li></ul></div></div></div>')
+        elif host in ("xmobile.lk", "dialcom.lk"):
+            products.append(
+                f'<div class="product-grid-item"><a class="product-image-link" href="{link}"></a>'
+                f'<h3 class="wd-entities-title"><a href="{link}">{title}</a></h3>'
+                f'<p class="wd-product-stock stock">In stock</p><span class="price">{price}</span></div>')
+        else:
+            products.append(
+                f'<li class="product"><a class="woocommerce-LoopProduct-link" href="{link}">'
+                f'<h2 class="woocommerce-loop-product__title">{title}</h2><span class="price">{price}</span></a></li>')
+    return _html("Shop", f'<ul class="products">{"".join(products)}</ul>{_woo_nav(category, page, pages)}')
+
+
+def store_api_products(host, base, query, pages, items):
+    """JSON body and page count of a Store API products request; the
+    products are those of the category's ``pages`` HTML pages."""
+    category = query.get("category", [""])[0]
+    per_page = min(int(query.get("per_page", ["10"])[0]), 100)
+    page = int(query.get("page", ["1"])[0])
+    names = MICS if "microphones" in category else PHONES
+    total = pages * items
+    products = []
+    for n in range((page - 1) * per_page, min(page * per_page, total)):
+        html_page, i = n // items + 1, n % items
+        title = _name(names, html_page, i)
+        products.append({
+            "id": n + 1,
+            "name": title,
+            "permalink": f"{base}/product/{_slug(title)}-{html_page}-{i}/",
+            "short_description": "<p>RAM: 8GB, Storage: 128GB</p>",
+            "prices": {"price": str((12_000 + i * 2_750) * 100), "currency_code": "LKR", "currency_minor_unit": 2},
+            "images": [{"src": f"{base}/wp-content/uploads/{_slug(title)}-{i}.jpg"}],
+            "attributes": [{"name": "Colour", "terms": [{"name": "Black"}, {"name": "Blue"}]}],
+            "is_in_stock": True,
+        })
+    return json.dumps(products).encode("utf-8"), max(1, -(-total // per_page))
+
+
+def _lastmod(page, i, revision):
+    return (LASTMOD + datetime.timedelta(days=revision if i % 10 == 0 else 0)).isoformat()
+
+
+def store_sitemap(host, base, path, pages, items, revision):
+    """Sitemap XML for ``path`` of a WooCommerce store, or None."""
+    if path == "/sitemap_index.xml":
+        entries = "".join(f"<sitemap><loc>{base}/{name}</loc></sitemap>"
+                          for name in ("product-sitemap.xml", "product_cat-sitemap.xml", "page-sitemap.xml"))
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'
+    if path != "/product-sitemap.xml":
+        return None
+    entries = "".join(
+        f"<url><loc>{base}/product/{_slug(_name(names, page, i))}-{page}-{i}/</loc>"
+        f"<lastmod>{_lastmod(page, i, revision)}</lastmod></url>"
+        for names in STORE_CATEGORIES[host].values() for page in range(1, pages + 1) for i in range(items))
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{entries}</urlset>'
+
+
+def product_header(host, path):
+    """WooCommerce title, price and category markup of a product page."""
+    match = PRODUCT_PAGE.match(path)
+    if match is None:
+        return b""
+    slug, page, i = match.group(1), int(match.group(2)), int(match.group(3))
+    for category, names in STORE_CATEGORIES[host].items():
+        title = _name(names, page, i)
+        if _slug(title) == slug:
+            return (f'<div class="product type-product product_cat-{category}"><h1 class="product_title entry-title">'
+                    f'{title}</h1><p class="price">{_woo_price(12_000 + i * 2_750)}</p></div>').encode("utf-8")
+    return b""
+
+
+def listing_page(host, base, path, query, pages, items):
+    """HTML for a listing URL of ``host``, or None if ``path`` is not one."""
+    if host == "riyasewana.com" and path.startswith("/search/"):
+        return riyasewana_listing(base, path, int(query.get("page", ["1"])[0]), pages, items)
+    if host == "autolanka.com" and (path == "/cars.html" or path.startswith("/cars/index")):
+        page = int(path[len("/cars/index"):-len(".html")]) if path.startswith("/cars/index") else 1
+        return autolanka_listing(base, path, page, pages, items)
+    if host == "saleme.lk" and path.startswith("/ads/"):
+        return saleme_listing(base, path, int(query.get("page", ["1"])[0]), pages, items)
+    if path.startswith("/product-category/"):
+        match = WOO_PAGE.match(path)
+        path, page = (match.group(1), int(match.group(2))) if match else (path, 1)
+        return woocommerce_listing(host, base, path, page, pages, items)
+    return None
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency * server.jitter())
+        if server.should_fail():
+            self._send(503, b"Service Unavailable", "text/plain")
+            return
+        _, host, rest = self.path.split("/", 2) if self.path.count("/") >= 2 else ("", "", "")
+        url = urlsplit("/" + rest)
+        host = domain_key(host)
+        base = f"https://{host}"
+        if IMAGE.search(url.path):
+            self._send_image(url.path)
+            return
+        if url.path.rstrip("/") == STORE_API_PATH and host not in NO_STORE_API:
+            body, total_pages = store_api_products(host, base, parse_qs(url.query), server.pages, server.items)
+            self._send(200, body, "application/json", {"X-WP-TotalPages": str(total_pages)})
+            return
+        if host in STORE_CATEGORIES and url.path.endswith(".xml"):
+            sitemap = store_sitemap(host, base, url.path, server.pages, server.items, server.revision)
+            if sitemap is not None:
+                self._send(200, sitemap.encode("utf-8"), "application/xml; charset=utf-8")
+                return
+        html = listing_page(host, base, url.path, parse_qs(url.query), server.pages, server.items)
+        if html is not None:
+            self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+        elif host in server.details:
+            body = server.details[host]
+            if host in STORE_CATEGORIES:
+                body = body.replace(b"<body>", b"<body>" + product_header(host, url.path), 1)
+            self._send(200, body, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"Not Found", "text/plain")
+
+    def _send_image(self, path):
+        body = self.server.image(path)
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, pages=5, items=20, latency=0.0, error_rate=0.0, seed=None, revision=0):
+        super().__init__(address, MockSiteHandler)
+        self.pages = pages
+        self.items = items
+        self.revision = revision
+        self.latency = latency
+        self.error_rate = error_rate
+        self.details = {}
+        for host, fixture in DETAIL_FIXTURES.items():
+            with open(os.path.join(FIXTURES, fixture), "rb") as f:
+                self.details[host] = f.read()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._images = {}
+
+    def image(self, path):
+        name = path.rsplit("/", 1)[-1]
+        with self._lock:
+            if name not in self._images:
+                self._images[name] = mock_image(name)
+            return self._images[name]
+
+    def jitter(self):
+        with self._lock:
+            return self._random.uniform(0.5, 1.5)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a ``MockSiteServer`` on a background thread and return it."""
+    server = MockSiteServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MockSiteDownloadHandler(SharedPoolDownloadHandler):
+    """Downloads every request from the mock server at ``MOCK_SITE_URL``.
+
+    Per-domain limits and download slots still follow the original host;
+    the response carries the original URL so the spiders' site dispatch and
+    link joining work as against the real sites.
+    """
+
+    def __init__(self, settings, crawler=None):
+        super().__init__(settings, crawler)
+        self.mock_url = settings.get("MOCK_SITE_URL").rstrip("/")
+
+    def _download(self, request, spider):
+        url = urlsplit(request.url)
+        mocked = request.replace(url=f"{self.mock_url}/{url.netloc}{url.path or '/'}" + (f"?{url.query}" if url.query else ""))
+        d = HTTP11DownloadHandler.download_request(self, mocked, spider)
+
+        def restore(response):
+            request.meta["download_latency"] = mocked.meta.get("download_latency")
+            return response.replace(url=request.url)
+
+        return d.addCallback(restore)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--pages", type=int, default=5, help="listing pages per category")
+    parser.add_argument("--items", type=int, default=20, help="ads per listing page")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--revision", type=int, default=0, help="days added to the lastmod of 10%% of the products")
+    args = parser.parse_args()
+    server = MockSiteServer((args.host, args.port), pages=args.pages, items=args.items,
+                            latency=args.latency, error_rate=args.error_rate, seed=args.seed, revision=args.revision)
+    print(f"Mock sites on {server.url}/<host>/...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,75 @@
+"""Checkpoint/resume state (checkpoint.py) and the dedup of a resumed crawl.
+
+    python -m pytest test_checkpoint.py
+"""
+import json
+
+import common  # noqa: F401
+import pytest
+from scrapy import Request
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from car import CarScrapper
+from checkpoint import META_KEY, Checkpoint, CheckpointQueue
+from pipelines import DedupPipeline
+from settings import SETTINGS
+
+
+def make_spider(**settings):
+    crawler = get_crawler(CarScrapper, dict(SETTINGS, TWISTED_REACTOR=None, **settings))
+    spider = CarScrapper.from_crawler(crawler)
+    crawler.stats.open_spider(spider)
+    return spider
+
+
+def test_queue_round_trip(tmp_path):
+    spider = make_spider()
+    path = str(tmp_path / "cars.checkpoint.db")
+    checkpoint = Checkpoint(path)
+    queue = CheckpointQueue(spider, checkpoint, priority=10)
+    urls = [f"https://riyasewana.com/search/cars?page={page}" for page in range(1, 4)]
+    for url in urls:
+        queue.push(Request(url, callback=spider.parse, cb_kwargs={"site": "riyasewana"}, meta={"page": url[-1]}))
+    # Popped but not done: still stored, as if it was downloading at the crash.
+    assert queue.pop().url == urls[-1]
+    checkpoint.commit()
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path)
+    try:
+        assert checkpoint.resumed
+        queued = checkpoint.queued()
+        assert list(queued) == [10] and len(queued[10]) == 3
+        queue = CheckpointQueue(spider, checkpoint, 10, queued[10])
+        requests = [queue.pop() for _ in range(3)]
+        assert queue.pop() is None
+        assert [r.url for r in requests] == urls[::-1]
+        assert all(r.callback == spider.parse and r.cb_kwargs == {"site": "riyasewana"} for r in requests)
+        assert [r.meta["page"] for r in requests] == ["3", "2", "1"]
+        for request in requests:
+            checkpoint.done(request.meta[META_KEY])
+        assert checkpoint.queued() == {}
+    finally:
+        checkpoint.close(remove=True)
+    assert not (tmp_path / "cars.checkpoint.db").exists()
+
+
+def test_resumed_dedup_starts_from_the_output(tmp_path):
+    path = tmp_path / "cars.jl"
+    written = [{"url": f"https://riyasewana.com/buy/{n}", "site": "riyasewana"} for n in range(3)]
+    path.write_text("".join(json.dumps(item) + "\n" for item in written), encoding="utf-8")
+    spider = make_spider(JSONLINES_PATH=str(tmp_path / "%(category)s.jl"))
+    spider.checkpoint = Checkpoint(str(tmp_path / "cars.checkpoint.db"))
+    spider.checkpoint.resumed = True
+    pipeline = DedupPipeline(settings=spider.settings)
+    try:
+        pipeline.open_spider(spider)
+        with pytest.raises(DropItem):
+            pipeline.process_item(dict(written[1]), spider)
+        new = {"url": "https://riyasewana.com/buy/3", "site": "riyasewana"}
+        assert pipeline.process_item(new, spider) is new
+        assert spider.crawler.stats.get_value("dedup/dropped") == 1
+    finally:
+        pipeline.close_spider(spider)
+        spider.checkpoint.close()
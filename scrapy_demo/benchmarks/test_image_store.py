@@ -0,0 +1,85 @@
+"""Image store with every category crawling in one process.
+
+Runs the four spiders together, as ``runner.py`` does, against the mock
+sites with ``FILES_STORE`` set, so all their ``ImageStorePipeline``\\ s
+write one ``images.db``. The crawl runs in a child process (a Twisted
+reactor cannot be restarted).
+
+    python -m pytest test_image_store.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+import common  # noqa: F401
+from mock_site import start_server
+
+from scrapy.crawler import CrawlerProcess
+
+from images import ImageIndex
+from pipelines import read_jsonlines
+from runner import SPIDERS
+from settings import SETTINGS
+
+
+def crawl(mock_url, output_dir):
+    """Crawl every category into ``output_dir``; returns each one's stats."""
+    settings = {
+        **SETTINGS,
+        "ITEM_PIPELINES": {**SETTINGS["ITEM_PIPELINES"], "pipelines.ApiUploadPipeline": None},
+        "JSONLINES_PATH": f"{output_dir}/%(category)s.jl",
+        "PRICE_HISTORY_PATH": f"{output_dir}/%(category)s.prices.db",
+        "CHECKPOINT_PATH": f"{output_dir}/%(category)s.checkpoint.db",
+        "NEAR_DUPLICATES_PATH": f"{output_dir}/%(category)s.near_dups.db",
+        "FILES_STORE": f"{output_dir}/images",
+        "IMAGE_INDEX_PATH": f"{output_dir}/images.db",
+        "DOWNLOAD_HANDLERS": {
+            "http": "mock_site.MockSiteDownloadHandler",
+            "https": "mock_site.MockSiteDownloadHandler",
+        },
+        "MOCK_SITE_URL": mock_url,
+        "ADAPTIVE_CONCURRENCY_STATE": None,
+        "LOG_LEVEL": "WARNING",
+    }
+    process = CrawlerProcess(settings=settings)
+    crawlers = {}
+    for category, spider_cls in SPIDERS.items():
+        crawlers[category] = process.create_crawler(spider_cls)
+        process.crawl(crawlers[category])
+    process.start()
+    return {category: crawler.stats.get_stats() for category, crawler in crawlers.items()}
+
+
+def test_crawlers_share_the_image_index(tmp_path):
+    server = start_server(pages=2, items=10)
+    try:
+        result = subprocess.run([sys.executable, __file__, server.url, str(tmp_path)],
+                                capture_output=True, text=True, timeout=600)
+    finally:
+        server.shutdown()
+    assert result.returncode == 0, result.stderr
+    assert "database is locked" not in result.stderr
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+
+    hashes = set()
+    for category, category_stats in stats.items():
+        assert category_stats.get("item_scraped_count"), category
+        assert not category_stats.get("log_count/ERROR"), (category, result.stderr)
+        assert category_stats.get("file_count"), category
+        for item in read_jsonlines(os.path.join(tmp_path, f"{category}.jl")):
+            assert len(item.get("imageHashes", [])) == len(item.get("image", [])), item["url"]
+            hashes.update(item.get("imageHashes", []))
+
+    # One file per distinct picture, all of them in the index.
+    stored = [name for _, _, names in os.walk(tmp_path / "images") for name in names]
+    assert len(stored) == len(hashes)
+    index = ImageIndex(str(tmp_path / "images.db"))
+    try:
+        assert all(index.stored_path(phash) for phash in hashes)
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    print(json.dumps(crawl(sys.argv[1], sys.argv[2]), default=str))
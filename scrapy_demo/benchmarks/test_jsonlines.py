@@ -0,0 +1,51 @@
+"""Streaming JSON Lines output (pipelines.JsonLinesPipeline).
+
+    python -m pytest test_jsonlines.py
+"""
+import common  # noqa: F401
+from scrapy.utils.test import get_crawler
+
+from car import CarScrapper
+from checkpoint import Checkpoint
+from items import VehicleItem
+from pipelines import JsonLinesPipeline, read_jsonlines
+from settings import SETTINGS
+
+
+def crawl(tmp_path, items, resumed=False):
+    crawler = get_crawler(CarScrapper, dict(SETTINGS, TWISTED_REACTOR=None,
+                                            JSONLINES_PATH=str(tmp_path / "%(category)s.jl")))
+    spider = CarScrapper.from_crawler(crawler)
+    if resumed:
+        spider.checkpoint = Checkpoint(str(tmp_path / "cars.checkpoint.db"))
+        spider.checkpoint.resumed = True
+    pipeline = JsonLinesPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+        # Flushed per item, so the file can be tailed during the crawl.
+        assert list(read_jsonlines(pipeline.path))[-1] == dict(item)
+    pipeline.close_spider(spider)
+    if resumed:
+        spider.checkpoint.close()
+
+
+def test_items_are_streamed(tmp_path):
+    items = [VehicleItem(url=f"https://riyasewana.com/buy/{n}", site="riyasewana", title="Toyota Axio 2016",
+                         image=["https://riyasewana.com/a.jpg"]) for n in range(3)]
+    crawl(tmp_path, items)
+    assert list(read_jsonlines(tmp_path / "cars.jl")) == [dict(item) for item in items]
+
+
+def test_resumed_crawl_appends(tmp_path):
+    first = [{"url": "https://riyasewana.com/buy/1", "site": "riyasewana", "title": "Toyota Axio 2016"}]
+    second = [{"url": "https://riyasewana.com/buy/2", "site": "riyasewana", "title": "Honda Vezel 2017"}]
+    crawl(tmp_path, first)
+    crawl(tmp_path, second, resumed=True)
+    assert list(read_jsonlines(tmp_path / "cars.jl")) == first + second
+    crawl(tmp_path, second)
+    assert list(read_jsonlines(tmp_path / "cars.jl")) == second
+
+
+def test_missing_file_reads_as_empty(tmp_path):
+    assert list(read_jsonlines(tmp_path / "cars.jl")) == []
@@ -0,0 +1,64 @@
+"""Cross-site near-duplicate clustering (near_duplicates.py).
+
+    python -m pytest test_near_duplicates.py
+"""
+import common  # noqa: F401
+
+from near_duplicates import NearDuplicateIndex, NearDuplicateStore
+
+# riyasewana's description is its spec table, nearly the same for every car.
+SPEC_TABLE = ("YOM: 2016 | Mileage (km): 68,000 | Make: Toyota | Model: {model} | Gear: Automatic | "
+              "Fuel Type: Hybrid | Engine (cc): 1500 | Options: AIR CONDITION, POWER STEERING, POWER MIRROR")
+
+
+def ad(site, url, title, model, price="Rs. 4,500,000", mileage="68,000", description=""):
+    return {
+        "site": site, "url": url, "title": title, "manufacturer": "Toyota", "model": model,
+        "modelYear": "2016", "mileage": mileage, "price": price, "description": description,
+    }
+
+
+def test_different_models_from_one_site_stay_separate():
+    index = NearDuplicateIndex()
+    ids = {
+        index.add(ad("riyasewana", f"https://riyasewana.com/buy/{model.lower()}", f"Toyota {model} 2016", model,
+                     description=SPEC_TABLE.format(model=model)))[0]
+        for model in ("Axio", "Premio", "Aqua")
+    }
+    assert len(ids) == 3
+
+
+def test_same_site_ads_are_not_clustered():
+    index = NearDuplicateIndex()
+    first, _ = index.add(ad("riyasewana", "https://riyasewana.com/buy/1", "Toyota Axio 2016", "Axio"))
+    second, duplicate = index.add(ad("riyasewana", "https://riyasewana.com/buy/2", "Toyota Axio 2016", "Axio"))
+    assert not duplicate and first != second
+
+
+def test_same_car_on_two_sites_shares_an_id():
+    index = NearDuplicateIndex()
+    riyasewana, _ = index.add(ad("riyasewana", "https://riyasewana.com/buy/1", "Toyota Axio 2016", "Axio",
+                                 description=SPEC_TABLE.format(model="Axio")))
+    # autolanka's "model" is the body style; its price is in lakhs.
+    autolanka, duplicate = index.add(ad("autolanka", "https://autolanka.com/toyota/axio-1", "Toyota Axio 2016",
+                                        "Sedan", price="45Lakhs", mileage="68,000 km"))
+    assert duplicate and autolanka == riyasewana
+
+
+def test_ids_are_kept_in_the_store(tmp_path):
+    cars = [
+        ad("riyasewana", "https://riyasewana.com/buy/1", "Toyota Axio 2016", "Axio"),
+        ad("patpat", "https://patpat.lk/vehicle/1", "Toyota Axio 2016", "Axio"),
+    ]
+    store = NearDuplicateStore(str(tmp_path / "cars.near_dups.db"))
+    index = NearDuplicateIndex(store=store)
+    first = [index.add(car)[0] for car in cars]
+    assert first[0] == first[1]
+    store.close()
+    store = NearDuplicateStore(str(tmp_path / "cars.near_dups.db"))
+    try:
+        index = NearDuplicateIndex(store=store)
+        assert len(index) == 2
+        assert [index.add(car)[0] for car in reversed(cars)] == list(reversed(first))
+    finally:
+        store.close()
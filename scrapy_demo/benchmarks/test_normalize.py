@@ -0,0 +1,47 @@
+"""Post-crawl normalization of the text fields (normalize.py).
+
+    python -m pytest test_normalize.py
+"""
+import datetime
+import json
+
+import common  # noqa: F401
+import pyarrow.parquet as pq
+from scrapy.settings import Settings
+
+from car import CarScrapper
+from normalize import normalize_category
+
+# (price, mileage, engineCapacity, modelYear) as the sites write them, and
+# the values they should normalize to.
+ROWS = [
+    (("4,500,000", "68,000 km", "1500 cc", "2016"), (4_500_000.0, 68_000, 1500, 2016)),
+    (("597500", "12000", "1.5", "2019"), (597_500.0, 12_000, 1500, 2019)),
+    (("36.25Lakhs", "85,000", "660", "2015"), (3_625_000.0, 85_000, 660, 2015)),
+    (("3.5Mn", "1,200 km", "2.0 L", "1899"), (3_500_000.0, 1_200, 2000, None)),
+    (("Negotiable", "", None, str(datetime.date.today().year + 2)), (None, None, None, None)),
+]
+
+
+def test_normalize_category(tmp_path):
+    with open(tmp_path / "cars.jl", "w", encoding="utf-8") as f:
+        for n, ((price, mileage, engine, year), _) in enumerate(ROWS):
+            f.write(json.dumps({"url": f"https://riyasewana.com/buy/{n}", "site": "riyasewana", "price": price,
+                                "mileage": mileage, "engineCapacity": engine, "modelYear": year}) + "\n")
+    settings = Settings({
+        "JSONLINES_PATH": str(tmp_path / "%(category)s.jl"),
+        "NORMALIZED_PATH": str(tmp_path / "%(category)s.parquet"),
+    })
+    output_path, rows = normalize_category(CarScrapper, settings)
+    assert output_path == str(tmp_path / "cars.parquet") and rows == len(ROWS)
+
+    table = pq.read_table(output_path)
+    assert str(table.schema.field("price").type) == "double"
+    assert str(table.schema.field("mileage").type) == "int64"
+    assert str(table.schema.field("engineCapacity").type) == "int32"
+    assert str(table.schema.field("modelYear").type) == "int16"
+    columns = ("price", "mileage", "engineCapacity", "modelYear")
+    normalized = list(zip(*(table[name].to_pylist() for name in columns)))
+    assert normalized == [expected for _, expected in ROWS]
+    # The other fields are kept as they were.
+    assert table["url"].to_pylist() == [f"https://riyasewana.com/buy/{n}" for n in range(len(ROWS))]
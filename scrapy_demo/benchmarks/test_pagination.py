@@ -0,0 +1,61 @@
+"""Listing page enumeration and stop-when-stale pagination (pagination.py).
+
+    python -m pytest test_pagination.py
+"""
+import common
+
+from scrapy.utils.test import get_crawler
+
+from car import CarScrapper
+from pagination import infer_page_template, is_stale
+from seen_urls import SeenUrls
+from settings import SETTINGS
+
+PAGE = "https://riyasewana.com/search/cars?page={}"
+ADS = ["https://riyasewana.com/buy/toyota-axio-1", "https://riyasewana.com/buy/honda-vezel-2"]
+
+
+def test_page_template_from_links():
+    links = [PAGE.format(2), PAGE.format(3), PAGE.format(10), "https://riyasewana.com/search/cars"]
+    assert infer_page_template(links) == ("https://riyasewana.com/search/cars?page=", "", {2, 3, 10})
+
+
+def test_page_template_ignores_other_numbers():
+    # Only the page number varies, not the year or the sort order.
+    links = [f"https://autolanka.com/cars/2016/list/{page}/?sort=7" for page in (1, 2, 3)]
+    assert infer_page_template(links) == ("https://autolanka.com/cars/2016/list/", "/?sort=7", {1, 2, 3})
+
+
+def test_no_page_template_from_a_next_link():
+    assert infer_page_template([PAGE.format(2)]) is None
+    assert infer_page_template(["https://riyasewana.com/search/cars"]) is None
+    assert infer_page_template([]) is None
+
+
+def make_stale_spider(tmp_path):
+    crawler = get_crawler(CarScrapper, dict(SETTINGS, TWISTED_REACTOR=None))
+    spider = CarScrapper.from_crawler(crawler)
+    crawler.stats.open_spider(spider)
+    spider.seen_urls = SeenUrls(str(tmp_path / "seen.db"))
+    spider.stale_streak = {}
+    return spider
+
+
+def test_known_pages_stop_the_feed(tmp_path):
+    spider = make_stale_spider(tmp_path)
+    try:
+        assert not is_stale(spider, common.make_response(PAGE.format(1), ""), "riyasewana", ADS)
+        assert not is_stale(spider, common.make_response(PAGE.format(1), ""), "riyasewana", ADS)
+        assert is_stale(spider, common.make_response(PAGE.format(2), ""), "riyasewana", ADS)
+    finally:
+        spider.seen_urls.close()
+
+
+def test_empty_pages_are_not_stale(tmp_path):
+    spider = make_stale_spider(tmp_path)
+    try:
+        for page in range(1, 5):
+            assert not is_stale(spider, common.make_response(PAGE.format(page), ""), "riyasewana", [])
+        assert spider.crawler.stats.get_value("pagination/empty_pages/riyasewana") == 4
+    finally:
+        spider.seen_urls.close()
@@ -0,0 +1,35 @@
+"""Append-only price history (price_history.py).
+
+    python -m pytest test_price_history.py
+"""
+import common  # noqa: F401
+
+from price_history import PriceHistory
+
+URL = "https://riyasewana.com/buy/toyota-axio-1"
+
+
+def listing(price, url=URL):
+    return {"url": url, "site": "riyasewana", "price": price}
+
+
+def test_changes_and_drops(tmp_path):
+    path = str(tmp_path / "cars.prices.db")
+    history = PriceHistory(path)
+    assert history.record(listing("4,500,000"), ts=100)
+    # Same price, written another way: no new row.
+    assert not history.record(listing("45Lakhs"), ts=200)
+    assert history.record(listing("4,200,000"), ts=300)
+    assert history.record(listing("4,400,000"), ts=400)
+    assert not history.record(listing("Negotiable"), ts=500)
+    assert history.record(listing("3,000,000", url="https://riyasewana.com/buy/honda-vezel-2"), ts=600)
+    history.close()
+
+    history = PriceHistory(path)
+    try:
+        assert history.history(URL, "riyasewana") == [(100, 4_500_000), (300, 4_200_000), (400, 4_400_000)]
+        assert history.drops(since=0) == [(URL, "riyasewana", 300, 4_500_000, 4_200_000)]
+        assert history.drops(since=350) == []
+        assert not history.record(listing("4,400,000"), ts=700)
+    finally:
+        history.close()
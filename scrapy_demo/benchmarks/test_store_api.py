@@ -0,0 +1,65 @@
+"""WooCommerce Store API fetch mode (woocommerce.py).
+
+    python -m pytest test_store_api.py
+"""
+import json
+
+import common  # noqa: F401
+from scrapy import Request
+from scrapy.http import TextResponse
+from scrapy.utils.test import get_crawler
+
+from mobile import MobileScraper
+from settings import SETTINGS
+from woocommerce import store_api_url
+
+HTML_URL = "https://lifemobile.lk/product-category/mobile-phones/"
+
+
+def product(slug, name, price, in_stock=True, **fields):
+    return {
+        "name": name, "permalink": f"https://lifemobile.lk/product/{slug}/",
+        "is_in_stock": in_stock, "prices": {"price": price, "currency_minor_unit": 2},
+        "images": [{"src": "https://lifemobile.lk/wp-content/uploads/a.jpg"}], **fields,
+    }
+
+
+def parse(body, page=1, headers=None):
+    crawler = get_crawler(MobileScraper, dict(SETTINGS, TWISTED_REACTOR=None, WOOCOMMERCE_FETCH_MODE="api"))
+    spider = MobileScraper.from_crawler(crawler)
+    crawler.stats.open_spider(spider)
+    response = TextResponse(store_api_url(HTML_URL, page), body=json.dumps(body).encode(), headers=headers,
+                            encoding="utf-8")
+    return spider, list(spider.parse_store_api(response, HTML_URL, page))
+
+
+def test_products_and_pages():
+    products = [
+        product("galaxy-a15", "Galaxy A15 &amp; Case", "4599000", attributes=[
+            {"name": "Storage", "terms": [{"name": "128GB"}]}, {"name": "Colour", "terms": [{"name": "Black"}]},
+        ]),
+        product("redmi-13", "Redmi 13", "3900000", in_stock=False),
+        product("nokia-105", "Nokia 105", "0"),
+    ]
+    spider, output = parse(products, headers={"X-WP-TotalPages": "3"})
+    items = [o for o in output if not isinstance(o, Request)]
+    assert [dict(item) for item in items] == [{
+        "title": "Galaxy A15 & Case", "price": "45,990.00", "url": "https://lifemobile.lk/product/galaxy-a15/",
+        "site": "life_mobile", "description": "Storage: 128GB | Colour: Black",
+        "image": ["https://lifemobile.lk/wp-content/uploads/a.jpg"],
+    }]
+    requests = [r.url for r in output if isinstance(r, Request)]
+    assert requests == [store_api_url(HTML_URL, 2), store_api_url(HTML_URL, 3)]
+    assert spider.crawler.stats.get_value("store_api/products") == 1
+
+
+def test_falls_back_to_the_html_pages():
+    spider, output = parse({"code": "rest_no_route"})
+    assert [(r.url, r.callback) for r in output] == [(HTML_URL, spider.parse)]
+    assert spider.crawler.stats.get_value("store_api/fallbacks/lifemobile.lk") == 1
+
+
+def test_later_pages_do_not_fall_back():
+    spider, output = parse({"code": "rest_no_route"}, page=2)
+    assert output == []
+    assert spider.crawler.stats.get_value("store_api/failed_pages") == 1
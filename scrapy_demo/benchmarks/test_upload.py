@@ -0,0 +1,66 @@
+"""Batched save API uploads with retries (pipelines.BatchUploader).
+
+    python -m pytest test_upload.py
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import common  # noqa: F401
+import pytest
+
+from pipelines import BatchUploader
+
+
+class SaveApi(BaseHTTPRequestHandler):
+    """Answers 500 to the first ``failures`` posts, then 201."""
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.posts.append((self.headers["x-api-key"], json.loads(body)))
+        status = 500 if len(server.posts) <= server.failures else 201
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def save_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SaveApi)
+    server.posts = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def uploader(server, max_retries=3):
+    return BatchUploader(f"http://127.0.0.1:{server.server_port}/api/saveCars", "test-key",
+                         max_retries=max_retries, backoff=0.01)
+
+
+def test_retries_until_saved(save_api):
+    save_api.failures = 2
+    batch = [{"url": "https://riyasewana.com/buy/1", "title": "Toyota Axio 2016"}]
+    client = uploader(save_api)
+    try:
+        assert client.post(batch) == (True, 2)
+    finally:
+        client.close()
+    assert save_api.posts == [("test-key", batch)] * 3
+
+
+def test_gives_up_after_max_retries(save_api):
+    save_api.failures = 10
+    client = uploader(save_api, max_retries=2)
+    try:
+        assert client.post([{"url": "https://riyasewana.com/buy/1"}]) == (False, 2)
+    finally:
+        client.close()
+    assert len(save_api.posts) == 3
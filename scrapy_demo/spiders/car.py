@@ -1,101 +1,18 @@
-import requests
 import scrapy
-import json
-from scrapy import Request
 from scrapy.crawler import CrawlerProcess
-from scrapy.loader import ItemLoader
-from itemloaders.processors import MapCompose, TakeFirst
-from w3lib.html import remove_tags
 
-
-def remove_whitespace(value):
-    return value.strip().replace("\n", "")
-
-
-class ProductItem(scrapy.Item):
-    title = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    price = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    url = scrapy.Field(
-        output_processor=TakeFirst()
-    )
-    image = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace)
-    )
-    description = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    modelYear = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    condition = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    transmission = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    manufacturer = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    model = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    fuelType = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    engineCapacity = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    mileage = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    color = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    site = scrapy.Field(
-        output_processor=TakeFirst()
-    )
-
-    def to_dict(self):
-        return {field: value for field, value in self.items()}
-
-    def validate(self):
-        required_fields = ['title', 'price', 'url', 'image', 'description', 'site']
-        for field in required_fields:
-            if not self.get(field):
-                raise scrapy.exceptions.DropItem(f"Missing required field: {field}")
-
-
-# Configure CrawlerProcess to export to JSON
-process = CrawlerProcess(settings={
-    "FEEDS": {
-        "cars.json": {"format": "json"},
-    },
-    "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
-    "REQUEST_FINGERPRINTER_IMPLEMENTATION": "2.7",
-    "FEED_EXPORT_ENCODING": "utf-8",
-    "ROBOTSTXT_OBEY": False,
-    "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
-})
+from extraction import ExtractionSpec, TableSpec
+from listing_state import follow_detail
+from items import VehicleItem, VehicleRecord
+from pagination import follow_pages
+from settings import SETTINGS
 
 
 class CarScrapper(scrapy.Spider):
     name = "car_spider"
+    api_endpoint = "http://localhost:8080/api/saveCars"
+    category = "cars"
+    item_class = VehicleItem
 
     start_urls = [
         "https://riyasewana.com/search/cars",
@@ -105,6 +22,17 @@ class CarScrapper(scrapy.Spider):
 
     page_count = {'riyasewana': 0, 'patpatlk': 0, 'autolanka': 0}
     max_pages = {'riyasewana': 30, 'patpatlk': 2, 'autolanka': 30}
+    domain_concurrency = {'riyasewana.com': 4, 'patpat.lk': 2, 'autolanka.com': 4}
+    scheduled_pages = {}
+    # Newest-first feeds: stop after this many pages of known ads (seen_urls.py).
+    stale_pages = {'riyasewana': 2, 'autolanka': 2}
+    stale_streak = {}
+    checkpoint_attributes = ("page_count", "scheduled_pages", "stale_streak")
+    pagination_links = {
+        'riyasewana': 'div.pagination a::attr(href)',
+        'patpatlk': 'ul.pagination a::attr(href)',
+        'autolanka': 'ul.pagination a::attr(href)',
+    }
 
     description_mapping = {
         "yom": "modelYear",
@@ -115,7 +43,52 @@ class CarScrapper(scrapy.Spider):
         "engine (cc)": "engineCapacity",
         "mileage (km)": "mileage",
     }
-    data = []
+
+    riyasewana_spec = ExtractionSpec(
+        lists={"image": "div.thumb a::attr(href)"},
+        tables=[TableSpec(
+            "table.moret tr",
+            [("td:nth-child(1) p.moreh::text", "td:nth-child(2) ::text"),
+             ("td:nth-child(3) p.moreh::text", "td:nth-child(4) ::text")],
+            description_mapping,
+            cell_count=4,
+        )],
+    )
+    patpatlk_spec = ExtractionSpec(
+        lists={"image": "div.item-images a img::attr(data-src)"},
+        tables=[TableSpec(
+            "table.course-info tr",
+            [("td:nth-child(1) ::text", "td:nth-child(2)::text")],
+            {
+                "model year": "modelYear",
+                "condition": "condition",
+                "transmission": "transmission",
+                "manufacturer": "manufacturer",
+                "model": "model",
+                "fuel type": "fuelType",
+                "engine capacity": "engineCapacity",
+                "mileage": "mileage",
+                "color": "color",
+            },
+            contains=True,
+        )],
+    )
+    autolanka_spec = ExtractionSpec(
+        lists={"image": "ul.swiper-wrapper li img::attr(src)"},
+        tables=[TableSpec(
+            "div.table-cell.clearfix",
+            [(".name span::text", ".value::text")],
+            {
+                "df_field_built": "modelYear",
+                "df_field_body_style": "model",
+                "df_field_transmission": "transmission",
+                "df_field_fuel": "fuelType",
+                "df_field_milage": "mileage",
+                "df_field_condition": "condition",
+            },
+            key_css="::attr(id)",
+        )],
+    )
 
     def parse(self, response):
         if "riyasewana" in response.url:
@@ -125,203 +98,105 @@ class CarScrapper(scrapy.Spider):
         elif "autolanka" in response.url:
             yield from self.parse_autolanka(response)
 
-    def parse_image_and_description(self, response):
-        loader = response.meta['loader']
+    def parse_image_and_description(self, response, partial):
+        record = VehicleRecord(**partial)
         if "riyasewana" in response.url:
-            self.parse_riyasewana_image_and_description(response, loader)
+            yield from self.parse_riyasewana_image_and_description(response, record)
         elif "patpat.lk" in response.url:
-            self.parse_patpatlk_image_and_description(response, loader)
+            yield from self.parse_patpatlk_image_and_description(response, record)
         elif "autolanka" in response.url:
-            self.parse_autolanka_image_and_description(response, loader)
+            yield from self.parse_autolanka_image_and_description(response, record)
 
     def parse_riyasewana(self, response):
         site = 'riyasewana'  # Identifier for the current site
+        listings = []
         for product in response.css("li.item"):
 
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "h2.more a::text")
+            record = VehicleRecord()
+            record.add_text("title", product.css("h2.more a::text").getall())
             price = product.css("div.boxintxt.b::text").get()
             if price:
                 price = price.replace("Rs.", "").strip().replace("\r", "").replace(" ", "")
-
-            loader.add_value("price", price)
-            loader.add_value("url", product.css("h2.more a::attr(href)").get())
-            loader.add_value('site', site)
+            record.add_text("price", price)
+            record.add_text("url", product.css("h2.more a::attr(href)").get())
+            record.add_text('site', site)
             inner_page = product.css('h2.more a::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_and_description)
-                request.meta['loader'] = loader
-                yield request
+                listings.append(inner_page)
+                partial = record.to_dict()
+                yield from follow_detail(self, response, inner_page, partial, self.parse_image_and_description)
             else:
-                item = loader.load_item()
-                item.validate()
-                if item not in self.data:
-                    self.data.append(item)
+                yield record.to_item()
 
-        next_page = response.css('div.pagination a:contains("Next")::attr(href)').get()
-        if next_page and self.page_count['riyasewana'] < self.max_pages['riyasewana']:
-            self.page_count['riyasewana'] += 1
-            self.logger.info(f"Following next page: {next_page}")
-            yield response.follow(next_page, self.parse_riyasewana)
-        else:
-            self.logger.info("No next page found or maximum page limit reached.")
+        yield from follow_pages(self, response, 'riyasewana', self.parse_riyasewana, 'div.pagination a:contains("Next")::attr(href)', listings)
 
     def parse_patpatlk(self, response):
         site = 'patpatlk'  # Identifier for the current site
+        listings = []
         for product in response.css("div.result-item"):
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "h4.result-title span::text")
+            record = VehicleRecord()
+            record.add_text("title", product.css("h4.result-title span::text").getall())
 
             price = product.css("h3.clearfix label::text").get()
             if price:
                 price = price.replace("Rs", "").strip().replace("\r", "").replace(" ", "")
-
-            loader.add_value("price", price)
-            loader.add_value("url", product.css("div.result-img a::attr(href)").get())
-            loader.add_value('site', site)
+            record.add_text("price", price)
+            record.add_text("url", product.css("div.result-img a::attr(href)").get())
+            record.add_text('site', site)
             inner_page = product.css('div.result-img a::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_and_description)
-                request.meta['loader'] = loader
-                yield request
+                listings.append(inner_page)
+                partial = record.to_dict()
+                yield from follow_detail(self, response, inner_page, partial, self.parse_image_and_description)
             else:
-                item = loader.load_item()
-                item.validate()
-                if item not in self.data:
-                    self.data.append(item)
+                yield record.to_item()
 
-        next_page = response.css('ul.pagination a[rel="next"]::attr(href)').get()
-
-        if next_page and self.page_count['patpatlk'] < self.max_pages['patpatlk']:
-            self.page_count['patpatlk'] += 1
-            yield response.follow(next_page, self.parse_patpatlk)
-        else:
-            self.logger.info("No next page found.")
+        yield from follow_pages(self, response, 'patpatlk', self.parse_patpatlk, 'ul.pagination a[rel="next"]::attr(href)', listings)
 
     def parse_autolanka(self, response):
         site = 'autolanka'  # Identifier for the current site
+        listings = []
         for product in response.css("article.item"):
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "a.link-large::text")
+            record = VehicleRecord()
+            record.add_text("title", product.css("a.link-large::text").getall())
 
             price = product.css("span.price-tag span::text").get()
             if price:
                 price = price.replace("Rs", "").strip().replace("\r", "").replace(" ", "")
-
-            loader.add_value("price", price)
-            loader.add_value("site", site)
-            loader.add_value("url", product.css("a.link-large::attr(href)").get())
+            record.add_text("price", price)
+            record.add_text("site", site)
+            record.add_text("url", product.css("a.link-large::attr(href)").get())
 
             inner_page = product.css('a.link-large::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_and_description)
-                request.meta['loader'] = loader
-                yield request
+                listings.append(inner_page)
+                partial = record.to_dict()
+                yield from follow_detail(self, response, inner_page, partial, self.parse_image_and_description)
             else:
-                item = loader.load_item()
-                item.validate()
-                if item not in self.data:
-                    self.data.append(item)
-
-        next_page = response.css('a.button::attr(href)').get()
-        if next_page and self.page_count['autolanka'] < self.max_pages['autolanka']:
-            self.page_count['autolanka'] += 1
-            self.logger.info(f"Following next page: {next_page}")
-            yield response.follow(next_page, self.parse_autolanka)
-        else:
-            self.logger.info("No next page found or maximum page limit reached.")
-
-    def parse_riyasewana_image_and_description(self, response, loader):
-        global description_text
-        # Extract all image URLs from the slider
-        # main_image_url = response.css("#main-image-url::attr(href)").extract()
-        thumbnail_images = response.css("div.thumb a::attr(href)").getall()
-
-
-
-        # Extracting the description fields from the table
-        description = []
-        rows = response.css("table.moret tr")
-        for row in rows:
-            tds = row.css("td")
-            if len(tds) == 4:
-                header1 = tds[0].css("p.moreh::text").get()
-                value1 = tds[1].css("::text").get()
-                header2 = tds[2].css("p.moreh::text").get()
-                value2 = tds[3].css("::text").get()
-
-                if header1 and value1:
-                    field_name = self.description_mapping.get(header1.strip().lower())
-                    if field_name:
-                        loader.add_value(field_name, value1.strip())
-                    description.append(f"{header1.strip()}: {value1.strip()}")
-                if header2 and value2:
-                    field_name = self.description_mapping.get(header2.strip().lower())
-                    if field_name:
-                        loader.add_value(field_name, value2.strip())
-                    description.append(f"{header2.strip()}: {value2.strip()}")
-
-            description_text = " | ".join(description)
-
-        # Add the images to the loader
-        loader.add_value('image', thumbnail_images)
-
-        # Extracting the description fields from the table
-        loader.add_value("description", description_text)
-
-        item = loader.load_item()
-        item.validate()
-        if item not in self.data:
-            self.data.append(item)
+                yield record.to_item()
 
-    def parse_patpatlk_image_and_description(self, response, loader):
+        yield from follow_pages(self, response, 'autolanka', self.parse_autolanka, 'a.button::attr(href)', listings)
 
-        # Extract all image URLs from the div with class 'slick-track'
-        image_urls = response.css('div.item-images a img::attr(data-src)').extract()
-        loader.add_value('modelYear', response.css('td:contains("Model Year") + td::text').get())
-        loader.add_value('condition', response.css('td:contains("Condition") + td::text').get())
-        loader.add_value('transmission', response.css('td:contains("Transmission") + td::text').get())
-        loader.add_value('manufacturer', response.css('td:contains("Manufacturer") + td::text').get())
-        loader.add_value('model', response.css('table.course-info tr:nth-child(6) td:nth-child(2)::text').get())
-        loader.add_value('fuelType', response.css('td:contains("Fuel Type") + td::text').get())
-        loader.add_value('engineCapacity', response.css('td:contains("Engine Capacity") + td::text').get())
-        loader.add_value('mileage', response.css('td:contains("Mileage") + td::text').get())
-        loader.add_value('color', response.css('td:contains("Color") + td::text').get())
+    def parse_riyasewana_image_and_description(self, response, record):
+        values, pairs = self.riyasewana_spec.extract(response)
+        for field, value in values.items():
+            record.add_text(field, value)
+        record.add_text("description", " | ".join(f"{header}: {value}" for header, value in pairs))
 
-        # Add unique image URLs to the loader
-        loader.add_value('image', image_urls)
+        yield record.to_item()
 
-        item = loader.load_item()
-        item.validate()
-        if item not in self.data:
-            self.data.append(item)
+    def parse_patpatlk_image_and_description(self, response, record):
+        values, _ = self.patpatlk_spec.extract(response)
+        for field, value in values.items():
+            record.add_text(field, value)
 
-    def parse_autolanka_image_and_description(self, response, loader):
-        # global description_text
+        yield record.to_item()
 
-        # Extract all image URLs from the slider
-        thumbnail_images = response.css("ul.swiper-wrapper li img::attr(src)").getall()
-
-
-
-        # Extracting the description fields from the table
-        descriptions = []
-        cells = response.css('div.table-cell.clearfix')
-
-        for cell in cells:
-            header = cell.css('.name span::text').get()
-            value = cell.css('.value::text').get()
-
-            if header and value:
-                descriptions.append(f"{header.strip()}: {value.strip()}")
-
-        description_text = " | ".join(descriptions)
-        loader.add_value("modelYear", response.css("div#df_field_built div.value::text").get())
-        loader.add_value("model", response.css("div#df_field_body_style div.value::text").get())
-        loader.add_value("transmission", response.css("div#df_field_transmission div.value::text").get())
-        loader.add_value("fuelType", response.css("div#df_field_fuel div.value::text").get())
-        loader.add_value("milage", response.css("div#df_field_milage div.value::text").get())
-        loader.add_value("condition", response.css("div#df_field_condition div.value::text").get())
+    def parse_autolanka_image_and_description(self, response, record):
+        values, pairs = self.autolanka_spec.extract(response)
+        for field, value in values.items():
+            record.add_text(field, value)
+        record.add_text("description", " | ".join(f"{header}: {value}" for header, value in pairs))
 
         # Extracting manufacturer from URL
         url = response.url
@@ -331,40 +206,12 @@ class CarScrapper(scrapy.Spider):
             if len(parts) > 5:  # Ensure URL structure is as expected
                 manufacturer = parts[4]  # Assuming manufacturer is at index 5
 
-        loader.add_value("manufacturer", manufacturer)
-
-        # # Add the images to the loader
-        loader.add_value('image', thumbnail_images)
+        record.add_text("manufacturer", manufacturer)
 
-        # Extracting the description fields from the table
-        loader.add_value("description", description_text)
-
-        item = loader.load_item()
-        item.validate()
-        if item not in self.data:
-            self.data.append(item)
-
-    def close(self, reason):
-        with open("bikes.json", "w") as f:
-            json.dump([item.to_dict() for item in self.data], f)
-
-        self.send_data_to_api(self.data, 'http://localhost:8080/api/saveCars')
-
-        self.data.clear()
-
-    def send_data_to_api(self, data, endpoint):
-        chunk_size = 20
-        for i in range(0, len(data), chunk_size):
-            chunk = data[i:i + chunk_size]
-            json_data = json.dumps([item.to_dict() for item in chunk])
-            response = requests.post(endpoint, headers={"Content-Type": "application/json", "x-api-key": "your-api-key"}, data=json_data)
-            if response.status_code != 201:
-                print(response.text)
-            else:
-                print(f"Data sent successfully: {response.status_code}")
+        yield record.to_item()
 
-process.crawl(CarScrapper)
-process.start()
 
-with open('cars.json', 'w', encoding='utf-8') as f:
-    json.dump([item.to_dict() for item in CarScrapper.data], f, ensure_ascii=False, indent=4)
+if __name__ == "__main__":
+    process = CrawlerProcess(settings=SETTINGS)
+    process.crawl(CarScrapper)
+    process.start()
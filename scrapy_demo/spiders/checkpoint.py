@@ -0,0 +1,291 @@
+"""Crash-safe checkpoints, so a killed crawl resumes where it stopped.
+
+With ``CHECKPOINT_PATH`` set ``CheckpointScheduler`` keeps the crawl's
+state in one SQLite file:
+
+* the scheduler queue: every request that can be serialized is stored on
+  push and only deleted once its callback has run to the end
+  (``CheckpointMiddleware``), so requests that were downloading when the
+  process died are scheduled again. A request that fails for good (the
+  callback raises, the retry middleware gives up, a downloader middleware
+  ignores it) or whose retry is dropped by the scheduler is deleted too
+  (``CheckpointDownloaderMiddleware``), so it is not retried on every
+  resume;
+* the fingerprints the dupefilter has seen (``CheckpointDupeFilter``);
+* the spider attributes named in its ``checkpoint_attributes``, e.g. the
+  per-site ``page_count`` and ``scheduled_pages`` of the vehicle spiders.
+
+Writes go into one open transaction that is committed every
+``CHECKPOINT_INTERVAL`` seconds, so a checkpoint costs one WAL commit of
+what changed since the last one, and every commit is a consistent
+snapshot of queue, fingerprints and counters. After a crash the next run
+of the same spider loads the snapshot and carries on; anything done after
+the last commit is done again. Items already written are not: the JSON
+Lines output is appended to instead of replaced, and ``DedupPipeline``
+starts from the items in it. When a crawl finishes normally the
+checkpoint is deleted, so the next run starts from scratch.
+"""
+import os
+import pickle
+import time
+from collections import deque
+
+from scrapy import signals
+from scrapy.core.scheduler import Scheduler
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.pqueues import ScrapyPriorityQueue
+from scrapy.utils.misc import create_instance
+from scrapy.utils.request import request_from_dict
+from twisted.internet import task
+
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+META_KEY = "checkpoint_id"
+
+
+class Checkpoint(SqliteStore):
+    """SQLite file holding the queued requests, seen fingerprints and
+    spider state of one crawl."""
+
+    def __init__(self, path):
+        self.resumed = os.path.exists(path)
+        super().__init__(path)
+        # Durable at every commit but without an fsync per commit; a power
+        # cut can lose the last checkpoint, a crashed process cannot.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS requests (id INTEGER PRIMARY KEY, priority INTEGER, data BLOB)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS seen (fingerprint TEXT PRIMARY KEY) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB)")
+        self.db.commit()
+        self._failed = []
+        self._failed_before = []
+
+    def queued(self):
+        """``{priority: [request id, ...]}`` of the stored requests, oldest
+        first."""
+        queued = {}
+        for request_id, priority in self.db.execute("SELECT id, priority FROM requests ORDER BY id"):
+            queued.setdefault(priority, []).append(request_id)
+        return queued
+
+    def push(self, priority, data):
+        return self.db.execute("INSERT INTO requests (priority, data) VALUES (?, ?)", (priority, data)).lastrowid
+
+    def request_data(self, request_id):
+        return self.db.execute("SELECT data FROM requests WHERE id = ?", (request_id,)).fetchone()[0]
+
+    def done(self, request_id):
+        self.db.execute("DELETE FROM requests WHERE id = ?", (request_id,))
+
+    def failed(self, request_id):
+        """Mark a request whose download failed done at the commit after
+        next: the scraper calls its errback a moment later, and the
+        requests that yields have to be stored first."""
+        self._failed.append(request_id)
+
+    def seen(self):
+        return {fingerprint for fingerprint, in self.db.execute("SELECT fingerprint FROM seen")}
+
+    def add_seen(self, fingerprint):
+        self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (fingerprint,))
+
+    def get_state(self, key, default=None):
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row else default
+
+    def set_state(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, pickle.dumps(value)))
+
+    def commit(self):
+        for request_id in self._failed_before:
+            self.done(request_id)
+        self._failed_before, self._failed = self._failed, []
+        super().commit()
+
+    def close(self, remove=False):
+        # Every errback has run by now.
+        for request_id in self._failed_before + self._failed:
+            self.done(request_id)
+        self._failed_before, self._failed = [], []
+        super().close()
+        if remove:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+
+class CheckpointQueue:
+    """LIFO request queue for one priority, stored in the ``Checkpoint``.
+
+    Only request IDs are kept in memory. A popped request stays stored
+    until ``done``; if it comes back (a retry or redirect carries its
+    meta), the copy replaces it.
+    """
+
+    def __init__(self, spider, checkpoint, priority, request_ids=()):
+        self.spider = spider
+        self.checkpoint = checkpoint
+        self.priority = priority
+        self.ids = deque(request_ids)
+
+    @classmethod
+    def from_crawler(cls, crawler, key):
+        spider = crawler.spider
+        priority = int(key.rsplit("/", 1)[1])
+        return cls(spider, spider.checkpoint, priority, spider.checkpoint_queued.pop(priority, ()))
+
+    def push(self, request):
+        try:
+            data = pickle.dumps(request.to_dict(spider=self.spider), protocol=4)
+        except (ValueError, TypeError, AttributeError, pickle.PicklingError) as e:
+            raise ValueError(str(e)) from e
+        previous = request.meta.get(META_KEY)
+        if previous is not None:
+            self.checkpoint.done(previous)
+        self.ids.append(self.checkpoint.push(self.priority, data))
+
+    def pop(self):
+        if not self.ids:
+            return None
+        request_id = self.ids.pop()
+        request = request_from_dict(pickle.loads(self.checkpoint.request_data(request_id)), spider=self.spider)
+        request.meta[META_KEY] = request_id
+        return request
+
+    def peek(self):
+        if not self.ids:
+            return None
+        return request_from_dict(pickle.loads(self.checkpoint.request_data(self.ids[-1])), spider=self.spider)
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class CheckpointDupeFilter(RFPDupeFilter):
+    """``RFPDupeFilter`` that also stores its fingerprints in the
+    ``Checkpoint``, once ``CheckpointScheduler`` has attached one."""
+
+    checkpoint = None
+
+    def attach(self, checkpoint):
+        self.checkpoint = checkpoint
+        self.fingerprints.update(checkpoint.seen())
+
+    def request_seen(self, request):
+        fp = self.request_fingerprint(request)
+        if fp in self.fingerprints:
+            return True
+        self.fingerprints.add(fp)
+        if self.checkpoint is not None:
+            self.checkpoint.add_seen(fp)
+        return False
+
+
+class CheckpointScheduler(Scheduler):
+    """Scheduler whose disk queue, dupefilter and spider state live in a
+    ``Checkpoint`` when ``CHECKPOINT_PATH`` is set; the stock scheduler
+    otherwise."""
+
+    def open(self, spider):
+        settings = self.crawler.settings
+        template = settings.get("CHECKPOINT_PATH")
+        if not template:
+            return super().open(spider)
+        self.spider = spider
+        self.checkpoint = spider.checkpoint = Checkpoint(spider_path(template, spider))
+        self.interval = settings.getfloat("CHECKPOINT_INTERVAL", 5)
+        if self.checkpoint.resumed:
+            for name in getattr(spider, "checkpoint_attributes", ()):
+                getattr(spider, name).update(self.checkpoint.get_state(name, {}))
+        spider.checkpoint_queued = self.checkpoint.queued()
+        self.mqs = self._mq()
+        self.dqs = create_instance(
+            ScrapyPriorityQueue,
+            settings=None,
+            crawler=self.crawler,
+            downstream_queue_cls=CheckpointQueue,
+            key="checkpoint",
+            startprios=list(spider.checkpoint_queued),
+        )
+        if self.checkpoint.resumed:
+            spider.logger.info(f"Resuming crawl from {self.checkpoint.path} ({len(self.dqs)} requests scheduled)")
+        if hasattr(self.df, "attach"):
+            self.df.attach(self.checkpoint)
+        self.loop = task.LoopingCall(self.save)
+        self.loop.start(self.interval, now=False)
+        return self.df.open()
+
+    def save(self):
+        """Commit a checkpoint."""
+        start = time.perf_counter()
+        for name in getattr(self.spider, "checkpoint_attributes", ()):
+            self.checkpoint.set_state(name, dict(getattr(self.spider, name)))
+        self.checkpoint.commit()
+        self.stats.inc_value("checkpoint/commits", spider=self.spider)
+        self.stats.set_value("checkpoint/last_seconds", time.perf_counter() - start, spider=self.spider)
+
+    def close(self, reason):
+        if self.dqs is None or getattr(self, "checkpoint", None) is None:
+            return super().close(reason)
+        self.loop.stop()
+        self.save()
+        # A finished crawl leaves nothing to resume.
+        self.checkpoint.close(remove=reason == "finished")
+        self.spider.checkpoint = None
+        return self.df.close(reason)
+
+
+class CheckpointMiddleware:
+    """Spider middleware that marks a request done in the ``Checkpoint``
+    once everything its callback produced has been scheduled or
+    scraped."""
+
+    def process_spider_output(self, response, result, spider):
+        yield from result
+        self._done(response, spider)
+
+    def process_spider_exception(self, response, exception, spider):
+        # An HTTP error without an errback, or a callback that raised.
+        self._done(response, spider)
+
+    def _done(self, response, spider):
+        checkpoint = getattr(spider, "checkpoint", None)
+        request_id = response.request.meta.get(META_KEY) if response.request is not None else None
+        if checkpoint is not None and request_id is not None:
+            checkpoint.done(request_id)
+
+
+class CheckpointDownloaderMiddleware:
+    """Downloader middleware that marks requests done in the ``Checkpoint``
+    when their download fails for good or the scheduler drops them.
+
+    It runs after ``RetryMiddleware`` in ``process_exception``, so it only
+    sees the failures that are not retried.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.request_dropped, signal=signals.request_dropped)
+        return middleware
+
+    def process_exception(self, request, exception, spider):
+        checkpoint = getattr(spider, "checkpoint", None)
+        request_id = request.meta.get(META_KEY)
+        if checkpoint is not None and request_id is not None:
+            checkpoint.failed(request_id)
+
+    def request_dropped(self, request, spider):
+        # A retry or redirect the dupefilter turned away; it never replaced
+        # the stored request.
+        checkpoint = getattr(spider, "checkpoint", None)
+        request_id = request.meta.get(META_KEY)
+        if checkpoint is not None and request_id is not None:
+            checkpoint.done(request_id)
@@ -0,0 +1,131 @@
+"""Compressed, partitioned Parquet output next to the JSON Lines files.
+
+``ParquetPipeline`` streams items into a Hive-style dataset under
+``PARQUET_EXPORT_DIR``:
+
+    crawls/category=cars/site=riyasewana/crawl_date=2026-10-18/part-20261018T101500.parquet
+
+One file per site and crawl, written in row groups of
+``PARQUET_ROW_GROUP_SIZE`` items, so only one row group per site is ever
+held in memory. The schema comes from the spider's ``item_class`` (see
+``normalize.item_schema``) with price, mileage, engineCapacity and
+modelYear converted to numbers by ``normalize.normalize_table``; category,
+site and crawl date live in the directory names. Off unless the setting is
+given (python runner.py --parquet).
+
+``read_dataset`` loads any slice of it back as one Arrow table:
+
+    read_dataset("crawls", category="cars", since="2026-10-01").to_pandas()
+"""
+import datetime
+import os
+import re
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+from normalize import item_schema, normalize_table
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("category", pa.string()), ("site", pa.string()), ("crawl_date", pa.string())]), flavor="hive"
+)
+
+
+def _partition_value(value):
+    return re.sub(r"[^\w.-]", "_", value or "unknown")
+
+
+class ParquetPipeline:
+    """Writes items to ``PARQUET_EXPORT_DIR`` as Parquet, one row group at
+    a time."""
+
+    def __init__(self, root, stats, row_group_size=5000, compression="zstd"):
+        self.root = root
+        self.stats = stats
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.get("PARQUET_EXPORT_DIR"):
+            raise NotConfigured
+        return cls(
+            settings.get("PARQUET_EXPORT_DIR"),
+            crawler.stats,
+            row_group_size=settings.getint("PARQUET_ROW_GROUP_SIZE", 5000),
+            compression=settings.get("PARQUET_COMPRESSION", "zstd"),
+        )
+
+    def open_spider(self, spider):
+        item_class = spider.item_class
+        self.fields = [name for name in item_class.fields if name != "site"]
+        self.input_schema = pa.schema([f for f in item_schema(item_class) if f.name != "site"])
+        self.schema = normalize_table(self.input_schema.empty_table()).schema
+        started = datetime.datetime.now()
+        self.partition = os.path.join(
+            self.root, f"category={_partition_value(getattr(spider, 'category', spider.name))}"
+        )
+        self.crawl_date = started.date().isoformat()
+        self.filename = f"part-{started:%Y%m%dT%H%M%S}.parquet"
+        self.buffers = {}
+        self.writers = {}
+
+    def close_spider(self, spider):
+        for site in list(self.buffers):
+            self._flush(site, spider)
+        for writer in self.writers.values():
+            writer.close()
+        self.stats.set_value("parquet/files", len(self.writers), spider=spider)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        site = _partition_value(adapter.get("site"))
+        buffer = self.buffers.setdefault(site, [])
+        buffer.append({name: adapter.get(name) for name in self.fields})
+        if len(buffer) >= self.row_group_size:
+            self._flush(site, spider)
+        return item
+
+    def _flush(self, site, spider):
+        rows = self.buffers.pop(site)
+        if not rows:
+            return
+        writer = self.writers.get(site)
+        if writer is None:
+            directory = os.path.join(self.partition, f"site={site}", f"crawl_date={self.crawl_date}")
+            os.makedirs(directory, exist_ok=True)
+            writer = self.writers[site] = pq.ParquetWriter(
+                os.path.join(directory, self.filename), self.schema, compression=self.compression
+            )
+        writer.write_table(normalize_table(pa.Table.from_pylist(rows, schema=self.input_schema)))
+        self.stats.inc_value("parquet/row_groups", spider=spider)
+        self.stats.inc_value("parquet/rows", len(rows), spider=spider)
+
+
+def read_dataset(root, category, site=None, since=None, until=None, columns=None):
+    """The crawls of ``category`` under ``root`` as one Arrow table,
+    optionally limited to a site and a range of crawl dates (ISO strings,
+    inclusive).
+
+    Only the matching partitions are opened. Files written before a field
+    was added to the item read as null in that column.
+    """
+    conditions = [ds.field("category") == category]
+    if site is not None:
+        conditions.append(ds.field("site") == _partition_value(site))
+    if since is not None:
+        conditions.append(ds.field("crawl_date") >= since)
+    if until is not None:
+        conditions.append(ds.field("crawl_date") <= until)
+    condition = conditions[0]
+    for c in conditions[1:]:
+        condition = condition & c
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    paths = [fragment.path for fragment in dataset.get_fragments(filter=condition)]
+    schema = pa.unify_schemas([pq.read_schema(path) for path in paths] + [PARTITIONING.schema])
+    dataset = ds.dataset(paths, schema=schema, format="parquet", partitioning=PARTITIONING, partition_base_dir=root)
+    return dataset.to_table(columns=columns)
@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from w3lib.url import canonicalize_url
+
+
+def item_fingerprint(item, content_fields=None):
+    """Stable fingerprint for a scraped item: canonical URL + site, plus an
+    optional hash over ``content_fields`` so edited ads count as new."""
+    url = item.get('url') or ''
+    if isinstance(url, list):
+        url = url[0] if url else ''
+    fp = hashlib.sha1()
+    fp.update(canonicalize_url(url).encode('utf-8'))
+    fp.update(b'\0')
+    fp.update(str(item.get('site') or '').encode('utf-8'))
+    if content_fields:
+        content = {field: item.get(field) for field in content_fields}
+        fp.update(b'\0')
+        fp.update(json.dumps(content, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return fp.digest()
+
+
+class DedupStore:
+    """Set of item fingerprints with O(1) membership checks.
+
+    Replaces the ``item not in self.data`` scan, which compared every new
+    item against every item collected so far.
+    """
+
+    def __init__(self, content_fields=None):
+        self.content_fields = tuple(content_fields) if content_fields else None
+        self._seen = set()
+
+    def fingerprint(self, item):
+        return item_fingerprint(item, self.content_fields)
+
+    def add(self, item):
+        """Record ``item`` and return True if it had not been seen before."""
+        fp = self.fingerprint(item)
+        if fp in self._seen:
+            return False
+        self._seen.add(fp)
+        return True
+
+    def __contains__(self, item):
+        return self.fingerprint(item) in self._seen
+
+    def __len__(self):
+        return len(self._seen)
+
+    def clear(self):
+        self._seen.clear()
@@ -0,0 +1,118 @@
+"""Declarative, precompiled extraction rules for detail pages.
+
+``response.css()`` translates its selector and has lxml compile the XPath
+again on every call, and each ``td:contains(...)`` rule re-scans the whole
+document. An ``ExtractionSpec`` compiles every CSS rule to an
+``lxml.etree.XPath`` once, at import time, and reads a spec table (e.g.
+``table.course-info`` rows) in a single walk, mapping each row to an item
+field through a header dictionary.
+"""
+from functools import lru_cache
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+@lru_cache(maxsize=None)
+def compile_css(css):
+    """Compile a parsel CSS selector (``::text``/``::attr()`` included)."""
+    return etree.XPath(_translator.css_to_xpath(css))
+
+
+def _first(results):
+    for result in results:
+        return str(result)
+    return None
+
+
+class TableSpec:
+    """Header/value pairs laid out in repeated rows.
+
+    ``cells`` lists ``(header_css, value_css)`` pairs evaluated relative to
+    each row, so a row can hold several pairs (riyasewana puts two per
+    ``tr``); ``header_css`` may be None for rows without a label. Each pair
+    is looked up in ``mapping`` by its ``key_css`` value if given (e.g.
+    ``::attr(id)``), else by its normalised header text; integer keys in
+    ``mapping`` match the 1-based row position instead. With
+    ``contains=True`` a header that matches no key exactly falls back to the
+    first key it contains, like ``td:contains("...")``.
+    """
+
+    def __init__(self, rows, cells, mapping=None, contains=False, cell_count=None, key_css=None):
+        self.rows = compile_css(rows)
+        self.cells = [(compile_css(header) if header else None, compile_css(value)) for header, value in cells]
+        self.mapping = {key.lower() if isinstance(key, str) else key: field for key, field in (mapping or {}).items()}
+        self.positional = any(isinstance(key, int) for key in self.mapping)
+        self.contains = contains
+        self.cell_count = cell_count
+        self.key = compile_css(key_css) if key_css else None
+        self._td = compile_css("td") if cell_count else None
+
+    def field_for(self, key):
+        if isinstance(key, int):
+            return self.mapping.get(key)
+        key = key.strip().rstrip(":").strip().lower()
+        field = self.mapping.get(key)
+        if field is None and self.contains:
+            for name, candidate in self.mapping.items():
+                if isinstance(name, str) and name in key:
+                    return candidate
+        return field
+
+    def extract(self, root):
+        """Return ``[(header, value, field), ...]`` for every non-empty value;
+        ``field`` is None for pairs the mapping does not cover."""
+        pairs = []
+        for position, row in enumerate(self.rows(root), 1):
+            if self.cell_count and len(self._td(row)) != self.cell_count:
+                continue
+            key = _first(self.key(row)) if self.key else None
+            for header_xpath, value_xpath in self.cells:
+                header = _first(header_xpath(row)) if header_xpath else None
+                header = header.strip() if header else None
+                value = _first(value_xpath(row))
+                value = value.strip() if value else None
+                if not value or (header_xpath and not header):
+                    continue
+                field = self.field_for(position) if self.positional else None
+                if field is None and (key or header):
+                    field = self.field_for(key or header)
+                pairs.append((header, value, field))
+        return pairs
+
+
+class ExtractionSpec:
+    """Per-site extraction rules for one kind of page.
+
+    ``fields`` maps item fields to a CSS rule whose first match is kept,
+    ``lists`` maps fields to rules whose matches are all kept, and
+    ``tables`` holds ``TableSpec``s. Explicit ``fields`` win over values
+    found through a table.
+    """
+
+    def __init__(self, fields=None, lists=None, tables=()):
+        self.fields = {field: compile_css(css) for field, css in (fields or {}).items()}
+        self.lists = {field: compile_css(css) for field, css in (lists or {}).items()}
+        self.tables = list(tables)
+
+    def extract(self, response):
+        """Return ``(values, pairs)``: field values, and the labelled
+        ``(header, value)`` pairs of the tables in document order."""
+        root = response.selector.root
+        values = {}
+        pairs = []
+        for table in self.tables:
+            for header, value, field in table.extract(root):
+                if field:
+                    values.setdefault(field, value)
+                if header:
+                    pairs.append((header, value))
+        for field, xpath in self.fields.items():
+            value = _first(xpath(root))
+            if value is not None:
+                values[field] = value
+        for field, xpath in self.lists.items():
+            values[field] = [str(value) for value in xpath(root)]
+        return values, pairs
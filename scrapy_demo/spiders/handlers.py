@@ -0,0 +1,206 @@
+import json
+import os
+import time
+from collections import deque
+
+from twisted.internet.defer import Deferred, maybeDeferred
+
+from scrapy.core.downloader.handlers.http11 import HTTP11DownloadHandler
+from scrapy.utils.httpobj import urlparse_cached
+
+
+def domain_key(hostname):
+    hostname = (hostname or "").lower()
+    return hostname[4:] if hostname.startswith("www.") else hostname
+
+
+class DomainSlot:
+    """Concurrency limit for one domain, adjusted from its responses.
+
+    Additive increase, multiplicative decrease: the limit grows by one
+    after ``limit`` good responses in a row, halves on a 429, 5xx or
+    download error, and drops by one when the smoothed latency climbs past
+    ``LATENCY_FACTOR`` times the best smoothed latency seen. At most one
+    decrease per round trip, so a burst of errors from requests that were
+    already in flight counts once.
+    """
+
+    LATENCY_FACTOR = 3.0
+    SMOOTHING = 0.2
+
+    def __init__(self, limit, max_limit, adaptive=True):
+        self.limit = max(1, min(limit, max_limit))
+        self.max_limit = max_limit
+        self.adaptive = adaptive
+        self.active = 0
+        self.waiting = deque()
+        self.latency = None
+        self.best_latency = None
+        self.good = 0
+        self.last_decrease = 0.0
+
+    def run(self, f, *args, **kwargs):
+        def execute(_):
+            return maybeDeferred(f, *args, **kwargs).addBoth(self._release)
+        return self._acquire().addCallback(execute)
+
+    def _acquire(self):
+        # A download cancelled while it waits (timeout, engine closing)
+        # leaves the queue without ever holding a slot.
+        d = Deferred(canceller=self._cancel)
+        if self.active < self.limit:
+            self.active += 1
+            d.callback(self)
+        else:
+            self.waiting.append(d)
+        return d
+
+    def _cancel(self, d):
+        try:
+            self.waiting.remove(d)
+        except ValueError:
+            pass
+
+    def _release(self, result):
+        self.active -= 1
+        self._wake()
+        return result
+
+    def _wake(self):
+        while self.waiting and self.active < self.limit:
+            d = self.waiting.popleft()
+            if d.called:
+                continue
+            self.active += 1
+            d.callback(self)
+
+    def _decrease(self, limit):
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency or 1.0):
+            return
+        self.last_decrease = now
+        self.limit = max(1, limit)
+        self.good = 0
+
+    def observe(self, latency, throttled):
+        """Feed one response (or failure) back into the limit."""
+        if not self.adaptive:
+            return
+        if throttled:
+            self._decrease(self.limit // 2)
+            return
+        if latency is not None:
+            self.latency = latency if self.latency is None else \
+                (1 - self.SMOOTHING) * self.latency + self.SMOOTHING * latency
+            self.best_latency = min(self.best_latency or self.latency, self.latency)
+            if self.latency > self.LATENCY_FACTOR * self.best_latency:
+                self._decrease(self.limit - 1)
+                return
+        self.good += 1
+        if self.good >= self.limit and self.limit < self.max_limit:
+            self.good = 0
+            self.limit += 1
+            self._wake()
+
+
+class SharedPoolDownloadHandler(HTTP11DownloadHandler):
+    """HTTP(S) download handler that shares one connection pool and one set
+    of per-domain concurrency limits between every crawler in the process.
+
+    Scrapy gives each crawler its own handler and pool, so spiders run
+    together by ``runner.py`` would otherwise open separate connections to
+    shared domains (celltronics.lk, lifemobile.lk) and each apply their own
+    ``CONCURRENT_REQUESTS_PER_DOMAIN``.
+
+    A domain starts at the rate it settled on in the previous run (read
+    from ``ADAPTIVE_CONCURRENCY_STATE``), else at its budget: the
+    ``DOMAIN_CONCURRENCY`` setting, then the spider's ``domain_concurrency``,
+    then ``DOMAIN_CONCURRENCY_DEFAULT``. With ``ADAPTIVE_CONCURRENCY`` the
+    limit then follows the domain's latency and 429/5xx rate (see
+    ``DomainSlot``), up to ``CONCURRENT_REQUESTS_PER_DOMAIN``; the settled
+    rates are saved when the last crawler closes.
+    """
+
+    _shared_pool = None
+    _refs = 0
+    _domain_slots = {}
+    _saved_rates = {}
+
+    def __init__(self, settings, crawler=None):
+        super().__init__(settings, crawler)
+        cls = type(self)
+        self._state_path = settings.get("ADAPTIVE_CONCURRENCY_STATE")
+        if cls._shared_pool is None:
+            cls._shared_pool = self._pool
+            cls._domain_slots = {}
+            cls._saved_rates = self._load_rates()
+        else:
+            self._pool = cls._shared_pool
+        cls._refs += 1
+        self._closed = False
+        self._stats = crawler.stats if crawler else None
+        self._adaptive = settings.getbool("ADAPTIVE_CONCURRENCY")
+        self._max_limit = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+        self._default_limit = settings.getint("DOMAIN_CONCURRENCY_DEFAULT", self._max_limit)
+        self._limits = {domain_key(k): v for k, v in settings.getdict("DOMAIN_CONCURRENCY").items()}
+
+    def _load_rates(self):
+        if not self._state_path or not os.path.exists(self._state_path):
+            return {}
+        with open(self._state_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_rates(self):
+        if not self._state_path:
+            return
+        rates = dict(type(self)._saved_rates)
+        for domain, slot in type(self)._domain_slots.items():
+            rates[domain] = {"concurrency": slot.limit, "latency": slot.latency, "updated": time.time()}
+        with open(self._state_path, "w", encoding="utf-8") as f:
+            json.dump(rates, f, indent=2, sort_keys=True)
+
+    def _budget(self, domain, spider):
+        if domain in self._limits:
+            return self._limits[domain]
+        budgets = {domain_key(k): v for k, v in getattr(spider, "domain_concurrency", {}).items()}
+        return budgets.get(domain, self._default_limit)
+
+    def _slot(self, request, spider):
+        domain = domain_key(urlparse_cached(request).hostname)
+        slots = type(self)._domain_slots
+        if domain not in slots:
+            limit = self._budget(domain, spider)
+            saved = type(self)._saved_rates.get(domain)
+            if self._adaptive and saved and domain not in self._limits:
+                limit = saved["concurrency"]
+            slots[domain] = DomainSlot(limit, self._max_limit, self._adaptive)
+        return domain, slots[domain]
+
+    def download_request(self, request, spider):
+        domain, slot = self._slot(request, spider)
+
+        def observe(result, throttled):
+            slot.observe(request.meta.get("download_latency"), throttled(result))
+            if self._stats is not None:
+                self._stats.set_value(f"adaptive/concurrency/{domain}", slot.limit, spider=spider)
+            return result
+
+        d = slot.run(self._download, request, spider)
+        return d.addCallbacks(observe, observe,
+                              callbackArgs=(lambda r: r.status == 429 or r.status >= 500,),
+                              errbackArgs=(lambda f: True,))
+
+    def _download(self, request, spider):
+        return super().download_request(request, spider)
+
+    def close(self):
+        cls = type(self)
+        if not self._closed:
+            self._closed = True
+            cls._refs -= 1
+        if cls._refs > 0:
+            return None
+        if self._adaptive:
+            self._save_rates()
+        cls._shared_pool = None
+        return super().close()
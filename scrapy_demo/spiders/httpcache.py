@@ -0,0 +1,52 @@
+"""Cache policy for the on-disk response cache used during development.
+
+Scrapy's ``HttpCacheMiddleware`` with ``FilesystemCacheStorage`` already
+stores gzip-compressed responses under the request fingerprint (the 2.7
+fingerprinter configured in ``settings.py``). ``RFC2616Policy`` would only
+keep what the sites mark cacheable, which the classifieds sites mostly
+don't, so ``RevalidatingPolicy`` keeps every successful response, serves it
+for ``HTTPCACHE_TTL`` seconds and then revalidates it with
+``If-None-Match``/``If-Modified-Since``. A 304, or a 5xx while revalidating,
+keeps the cached copy.
+
+With ``HTTPCACHE_OFFLINE`` every cached response counts as fresh and
+``HTTPCACHE_IGNORE_MISSING`` drops requests that were never cached, so a
+crawl replays from disk without touching the network.
+"""
+from time import time
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.utils.httpobj import urlparse_cached
+
+
+class RevalidatingPolicy(RFC2616Policy):
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttl = settings.getint("HTTPCACHE_TTL")
+        self.offline = settings.getbool("HTTPCACHE_OFFLINE")
+        self.ignore_http_codes = [int(code) for code in settings.getlist("HTTPCACHE_IGNORE_HTTP_CODES")]
+
+    def should_cache_request(self, request):
+        return urlparse_cached(request).scheme not in self.ignore_schemes
+
+    def should_cache_response(self, response, request):
+        return response.status != 304 and response.status not in self.ignore_http_codes
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if self.offline:
+            return True
+        # Without a Date header the age is unknown; revalidate.
+        if b"Date" in cachedresponse.headers and self._compute_current_age(cachedresponse, request, time()) < self.ttl:
+            return True
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+
+def cache_settings(offline=False):
+    """Settings overrides that switch the response cache on."""
+    return {
+        "HTTPCACHE_ENABLED": True,
+        "HTTPCACHE_OFFLINE": offline,
+        "HTTPCACHE_IGNORE_MISSING": offline,
+    }
@@ -0,0 +1,177 @@
+"""Content-addressed image store for every gallery image of every item.
+
+``ImageStorePipeline`` is a ``FilesPipeline``: it downloads the ``image``
+URLs of each item through the crawler's own downloader, so images are
+fetched concurrently over the shared connection pool and within each
+domain's concurrency limit. Each image is stored under its perceptual
+hash (a 64-bit dHash, ``<hash[:2]>/<hash>.<ext>`` in ``FILES_STORE``), so
+the same photo reposted on riyasewana, autolanka and patpat, or resized
+or re-encoded by one of them, is stored once. The hashes are written to
+the item's ``imageHashes``, in ``image`` order.
+
+``ImageIndex`` (SQLite at ``IMAGE_INDEX_PATH``, one connection shared by
+every crawler in the process) remembers each URL's hash and validators. An
+image checked within ``IMAGE_RECHECK_DAYS`` is not requested at all; an
+older one is requested conditionally
+(``If-None-Match``/``If-Modified-Since``), and a 304 keeps the stored
+copy. Off unless ``FILES_STORE`` is set (python runner.py --images).
+"""
+import mimetypes
+import time
+from io import BytesIO
+
+from itemadapter import ItemAdapter
+from PIL import Image
+from scrapy.exceptions import NotConfigured
+from scrapy.pipelines.files import FileException, FilesPipeline
+
+from sqlite_store import SqliteStore
+
+HASH_SIZE = 8
+
+
+def dhash(data):
+    """64-bit difference hash of the image in ``data``, as 16 hex digits.
+
+    The image is shrunk to 9x8 greyscale and each bit says whether a pixel
+    is brighter than its right neighbour, so resizing, recompression and
+    small colour shifts leave the hash unchanged.
+    """
+    try:
+        image = Image.open(BytesIO(data))
+        image.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))
+        pixels = list(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS).getdata())
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise FileException(f"not an image: {e}") from e
+    bits = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            bits = bits << 1 | (left > pixels[row * (HASH_SIZE + 1) + col + 1])
+    return f"{bits:016x}"
+
+
+class ImageIndex(SqliteStore):
+    """Perceptual hash, stored path and HTTP validators of every image URL
+    fetched."""
+
+    COMMIT_EVERY = 200
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            " url TEXT PRIMARY KEY, phash TEXT, path TEXT, etag TEXT, last_modified TEXT, checked REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_phash ON images (phash)")
+
+    def get(self, url):
+        """``(phash, path, etag, last_modified, checked)`` of ``url``, or None."""
+        return self.db.execute(
+            "SELECT phash, path, etag, last_modified, checked FROM images WHERE url = ?", (url,)
+        ).fetchone()
+
+    def stored_path(self, phash):
+        """Where the image with ``phash`` is stored, None if it is not."""
+        row = self.db.execute("SELECT path FROM images WHERE phash = ? LIMIT 1", (phash,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, url, phash, path, etag, last_modified):
+        self.db.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)",
+            (url, phash, path, etag, last_modified, time.time()),
+        )
+        self._maybe_commit()
+
+    def touch(self, url):
+        self.db.execute("UPDATE images SET checked = ? WHERE url = ?", (time.time(), url))
+        self._maybe_commit()
+
+
+def _header(response, name):
+    value = response.headers.get(name)
+    return value.decode("latin-1") if value else None
+
+
+class ImageStorePipeline(FilesPipeline):
+    """Stores each item's images once per perceptual hash and skips the
+    ones that have not changed."""
+
+    FILES_URLS_FIELD = "image"
+
+    def __init__(self, store_uri, download_func=None, settings=None):
+        if not store_uri:
+            # FilesPipeline would store into a directory named "None".
+            raise NotConfigured
+        super().__init__(store_uri, download_func=download_func, settings=settings)
+        self.index_path = settings.get("IMAGE_INDEX_PATH", "images.db")
+        self.recheck = settings.getfloat("IMAGE_RECHECK_DAYS", 7) * 86400
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.index = ImageIndex.shared(self.index_path)
+
+    def close_spider(self, spider):
+        self.index.close()
+
+    def get_media_requests(self, item, info):
+        urls = ItemAdapter(item).get(self.files_urls_field) or []
+        if isinstance(urls, str):
+            urls = [urls]
+        return super().get_media_requests({self.files_urls_field: urls}, info)
+
+    def media_to_download(self, request, info, *, item=None):
+        known = self.index.get(request.url)
+        if known is None:
+            return None
+        phash, path, etag, last_modified, checked = known
+        if time.time() - checked < self.recheck:
+            self.inc_stats(info.spider, "uptodate")
+            return {"url": request.url, "path": path, "checksum": phash, "status": "uptodate"}
+        if etag:
+            request.headers["If-None-Match"] = etag
+        if last_modified:
+            request.headers["If-Modified-Since"] = last_modified
+        return None
+
+    def media_downloaded(self, response, request, info, *, item=None):
+        if response.status == 304:
+            known = self.index.get(request.url)
+            if known is not None:
+                self.index.touch(request.url)
+                self.inc_stats(info.spider, "revalidated")
+                return {"url": request.url, "path": known[1], "checksum": known[0], "status": "revalidated"}
+        return super().media_downloaded(response, request, info, item=item)
+
+    def file_path(self, request, response=None, info=None, *, item=None):
+        if response is None:
+            return super().file_path(request, response=response, info=info, item=item)
+        phash = request.meta.get("image_phash")
+        if phash is None:
+            phash = request.meta["image_phash"] = dhash(response.body)
+        stored = self.index.stored_path(phash)
+        if stored is not None:
+            return stored
+        content_type = _header(response, "Content-Type") or mimetypes.guess_type(request.url)[0] or ""
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".jpg"
+        return f"{phash[:2]}/{phash}{extension}"
+
+    def file_downloaded(self, response, request, info, *, item=None):
+        path = self.file_path(request, response=response, info=info, item=item)
+        phash = request.meta["image_phash"]
+        if self.index.stored_path(phash) is not None:
+            # The same picture from another URL or site: keep the first copy.
+            self.inc_stats(info.spider, "deduplicated")
+        else:
+            self.store.persist_file(path, BytesIO(response.body), info)
+        self.index.record(
+            request.url, phash, path, _header(response, "ETag"), _header(response, "Last-Modified")
+        )
+        return phash
+
+    def item_completed(self, results, item, info):
+        adapter = ItemAdapter(item)
+        if "imageHashes" in adapter.field_names():
+            adapter["imageHashes"] = [result["checksum"] for ok, result in results if ok]
+        return item
+
@@ -0,0 +1,231 @@
+"""Per-callback timers and hot-path counters, reported through crawl stats.
+
+``Instrumentation`` is a Scrapy extension. When ``INSTRUMENTATION_ENABLED``
+is set it wraps every ``parse*`` callback of the spider and times each step
+of the generator (the work the callback does, not the time Scrapy spends
+on what it yields; a dispatcher such as ``parse`` includes the site
+callback it delegates to), and times ``ItemLoader.load_item`` and
+``Record.to_item`` while a callback runs. It also counts items per site
+and downloaded bytes and download time per domain. Everything goes into
+the stats under ``instrumentation/``, next to the drop counts the
+pipelines keep (``validation/dropped``, ``dedup/dropped``). At close the
+stats are written as JSON to ``INSTRUMENTATION_REPORT``.
+
+``INSTRUMENTATION_PROFILE`` additionally samples the reactor thread's
+stack every ``INSTRUMENTATION_PROFILE_INTERVAL`` seconds and writes the
+samples in folded format (``frame;frame;frame count``) to
+``INSTRUMENTATION_PROFILE_PATH``, for ``flamegraph.pl`` or speedscope.
+"""
+import json
+import sys
+import threading
+import time
+import types
+from collections import Counter
+from functools import wraps
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.loader import ItemLoader
+from scrapy.utils.httpobj import urlparse_cached
+
+from handlers import domain_key
+from items import Record
+from pipelines import spider_path
+
+# (stats, spider) of the callback being iterated; callbacks never run
+# concurrently on the reactor thread, so one slot is enough.
+_current = None
+_patched = {}
+
+
+def _timed_builder(name, original):
+    @wraps(original)
+    def timed(self, *args, **kwargs):
+        if _current is None:
+            return original(self, *args, **kwargs)
+        stats, spider = _current
+        start = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            stats.inc_value(f"instrumentation/{name}/calls", spider=spider)
+            stats.inc_value(f"instrumentation/{name}/seconds", time.perf_counter() - start, spider=spider)
+    return timed
+
+
+def _patch_builders():
+    if not _patched:
+        _patched[ItemLoader] = ("load_item", ItemLoader.load_item)
+        _patched[Record] = ("to_item", Record.to_item)
+        ItemLoader.load_item = _timed_builder("load_item", ItemLoader.load_item)
+        Record.to_item = _timed_builder("record_to_item", Record.to_item)
+
+
+def _unpatch_builders():
+    for cls, (attr, original) in _patched.items():
+        setattr(cls, attr, original)
+    _patched.clear()
+
+
+def _timed_callback(stats, spider, name, method):
+    prefix = f"instrumentation/callback/{name}"
+
+    def callback(self, *args, **kwargs):
+        global _current
+        outer = _current
+        _current = (stats, spider)
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current = outer
+        stats.inc_value(f"{prefix}/calls", spider=spider)
+        if not isinstance(result, types.GeneratorType):
+            stats.inc_value(f"{prefix}/seconds", elapsed, spider=spider)
+            return result
+        return _timed_steps(result, stats, spider, prefix, elapsed)
+
+    # A bound method, so requests can still be serialized by callback name.
+    return types.MethodType(wraps(method)(callback), spider)
+
+
+def _timed_steps(generator, stats, spider, prefix, elapsed):
+    global _current
+    outputs = 0
+    while True:
+        outer = _current
+        _current = (stats, spider)
+        start = time.perf_counter()
+        try:
+            value = next(generator)
+        except StopIteration:
+            break
+        finally:
+            elapsed += time.perf_counter() - start
+            _current = outer
+        outputs += 1
+        yield value
+    stats.inc_value(f"{prefix}/seconds", elapsed, spider=spider)
+    stats.inc_value(f"{prefix}/outputs", outputs, spider=spider)
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Instrumentation:
+
+    # Shared by every crawler in the process, like the download pool.
+    _sampler = None
+    _refs = 0
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("INSTRUMENTATION_ENABLED"):
+            raise NotConfigured
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.report_template = settings.get("INSTRUMENTATION_REPORT")
+        self.profile = settings.getbool("INSTRUMENTATION_PROFILE")
+        self.profile_interval = settings.getfloat("INSTRUMENTATION_PROFILE_INTERVAL", 0.005)
+        self.profile_path = settings.get("INSTRUMENTATION_PROFILE_PATH", "profile.folded")
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def spider_opened(self, spider):
+        for name in dir(type(spider)):
+            if name.startswith("parse") and callable(getattr(type(spider), name)):
+                setattr(spider, name, _timed_callback(self.stats, spider, name, getattr(spider, name)))
+        cls = type(self)
+        if cls._refs == 0:
+            _patch_builders()
+            if self.profile:
+                cls._sampler = StackSampler(threading.get_ident(), self.profile_interval)
+                cls._sampler.start()
+        cls._refs += 1
+        self.started = time.perf_counter()
+
+    def spider_closed(self, spider, reason):
+        self.stats.set_value("instrumentation/wall_seconds", time.perf_counter() - self.started, spider=spider)
+        cls = type(self)
+        cls._refs -= 1
+        if cls._refs == 0:
+            _unpatch_builders()
+            if cls._sampler is not None:
+                cls._sampler.stop()
+                cls._sampler.write_folded(self.profile_path)
+                spider.logger.info(f"Wrote {sum(cls._sampler.samples.values())} stack samples to {self.profile_path}")
+                cls._sampler = None
+        if self.report_template:
+            path = spider_path(self.report_template, spider)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.report(spider, reason), f, indent=2, sort_keys=True, default=str)
+            spider.logger.info(f"Wrote instrumentation report to {path}")
+
+    def item_scraped(self, item, response, spider):
+        site = ItemAdapter(item).get("site") or "unknown"
+        self.stats.inc_value(f"instrumentation/items/{site}", spider=spider)
+
+    def response_received(self, response, request, spider):
+        domain = domain_key(urlparse_cached(request).hostname)
+        self.stats.inc_value(f"instrumentation/bytes/{domain}", len(response.body), spider=spider)
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.stats.inc_value(f"instrumentation/download_seconds/{domain}", latency, spider=spider)
+
+    def report(self, spider, reason):
+        stats = self.stats.get_stats(spider)
+        callbacks = {}
+        for key, value in stats.items():
+            if key.startswith("instrumentation/callback/"):
+                name, metric = key[len("instrumentation/callback/"):].rsplit("/", 1)
+                callbacks.setdefault(name, {})[metric] = value
+        for values in callbacks.values():
+            values["mean_ms"] = 1000 * values.get("seconds", 0) / max(values.get("calls", 1), 1)
+        return {
+            "spider": spider.name,
+            "reason": reason,
+            "callbacks": callbacks,
+            "stats": {key: value for key, value in stats.items()
+                      if not key.startswith("instrumentation/callback/")},
+        }
@@ -0,0 +1,169 @@
+import scrapy
+from itemloaders.processors import MapCompose, TakeFirst
+from w3lib.html import remove_tags
+
+
+def remove_whitespace(value):
+    return value.strip().replace("\n", "")
+
+
+class ProductItem(scrapy.Item):
+    """Fields shared by every category."""
+    title = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    price = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    url = scrapy.Field(
+        output_processor=TakeFirst()
+    )
+    description = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    site = scrapy.Field(
+        output_processor=TakeFirst()
+    )
+    # Perceptual hashes of the stored images, in ``image`` order (images.py).
+    imageHashes = scrapy.Field()
+
+    def to_dict(self):
+        return {field: value for field, value in self.items()}
+
+
+class ElectronicsItem(ProductItem):
+    """Mobile phones and microphones from the WooCommerce stores."""
+    image = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace)
+    )
+
+
+class VehicleItem(ProductItem):
+    """Cars and bikes from the classifieds sites."""
+    image = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace)
+    )
+    modelYear = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    condition = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    transmission = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    manufacturer = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    model = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    fuelType = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    engineCapacity = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    mileage = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    color = scrapy.Field(
+        input_processor=MapCompose(remove_tags, remove_whitespace),
+        output_processor=TakeFirst()
+    )
+    # Shared by the copies of one ad posted on several sites (near_duplicates.py).
+    canonicalId = scrapy.Field(
+        output_processor=TakeFirst()
+    )
+
+    def validate(self):
+        required_fields = ['title', 'price', 'url', 'image', 'description', 'site']
+        for field in required_fields:
+            if not self.get(field):
+                raise scrapy.exceptions.DropItem(f"Missing required field: {field}")
+
+
+class Record:
+    """Lightweight ``__slots__`` record for the hot path.
+
+    Fills the same fields as ``item_class`` with the same results as an
+    ItemLoader (first non-empty value wins, list fields collect every
+    value), but skips the processor machinery: ``add_text`` only strips
+    whitespace, for values that came from ``::text``/``::attr()`` and so
+    cannot contain tags; ``add_html`` also runs ``remove_tags``.
+    ``to_item()`` converts to the Scrapy item when needed.
+    """
+    __slots__ = ()
+    item_class = None
+    list_fields = ()
+    raw_fields = ("url", "site")
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, [] if field in self.list_fields else None)
+        for field, value in values.items():
+            self.add_text(field, value)
+
+    def _add(self, field, value, clean):
+        if value is None:
+            return
+        values = value if isinstance(value, (list, tuple)) else (value,)
+        if field in self.list_fields:
+            current = getattr(self, field)
+            current.extend(v for v in map(clean, values) if v not in (None, ""))
+            return
+        if getattr(self, field) not in (None, ""):
+            return
+        for v in values:
+            v = clean(v) if v is not None else None
+            if v not in (None, ""):
+                setattr(self, field, v)
+                return
+
+    def add_text(self, field, value):
+        self._add(field, value, _identity if field in self.raw_fields else remove_whitespace)
+
+    def add_html(self, field, value):
+        self._add(field, value, _identity if field in self.raw_fields else _strip_html)
+
+    def to_dict(self):
+        values = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value not in (None, "", []):
+                values[field] = value
+        return values
+
+    def to_item(self):
+        return self.item_class(self.to_dict())
+
+
+def _identity(value):
+    return value
+
+
+def _strip_html(value):
+    return remove_whitespace(remove_tags(value))
+
+
+class VehicleRecord(Record):
+    __slots__ = tuple(VehicleItem.fields)
+    item_class = VehicleItem
+    list_fields = ("image",)
+
+
+class ElectronicsRecord(Record):
+    __slots__ = tuple(ElectronicsItem.fields)
+    item_class = ElectronicsItem
+    list_fields = ("image",)
@@ -0,0 +1,113 @@
+"""Incremental crawls: only fetch detail pages for new or changed ads.
+
+``ListingState`` keeps, per listing (URL + site fingerprint), the listing
+price, a hash of the title and the last item scraped in SQLite. On the
+next run the listing callbacks ask ``follow_detail`` for each ad: if the
+price and title are unchanged the detail request is skipped and the stored
+item is scraped again, as ``sitemaps.py`` carries over unchanged products,
+so the JSON Lines, Parquet and API output is still a full snapshot and
+every consumer sees the ad is alive. ``IncrementalPipeline`` writes the
+state once a complete item has passed validation, so an ad whose detail
+page failed is fetched again. Recording an unchanged item only bumps its
+``last_seen`` time, which ``ListingState.alive()`` reads.
+
+Enabled by setting ``INCREMENTAL_STATE_PATH``.
+"""
+import hashlib
+import json
+import time
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+from dedup import item_fingerprint
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+
+def title_hash(title):
+    if isinstance(title, list):
+        title = title[0] if title else ""
+    return hashlib.sha1((title or "").encode("utf-8")).hexdigest()
+
+
+class ListingState(SqliteStore):
+    """Last known price and title hash of every listing seen."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " fingerprint BLOB PRIMARY KEY, url TEXT, site TEXT, price TEXT, title_hash TEXT,"
+            " first_seen REAL, last_seen REAL, last_changed REAL, item TEXT)"
+        )
+        # State files written before the items were stored.
+        if "item" not in {row[1] for row in self.db.execute("PRAGMA table_info(listings)")}:
+            self.db.execute("ALTER TABLE listings ADD COLUMN item TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS listings_site_seen ON listings (site, last_seen)")
+
+    def unchanged(self, listing):
+        """The item stored for ``listing`` (a dict with url, site, price,
+        title) if its price and title are the stored ones, else None."""
+        row = self.db.execute(
+            "SELECT price, title_hash, item FROM listings WHERE fingerprint = ?", (item_fingerprint(listing),)
+        ).fetchone()
+        if row is None or row[:2] != (listing.get("price"), title_hash(listing.get("title"))) or not row[2]:
+            return None
+        return json.loads(row[2])
+
+    def record(self, item):
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (fingerprint) DO UPDATE SET"
+            " last_changed = CASE WHEN price IS excluded.price AND title_hash = excluded.title_hash"
+            " THEN last_changed ELSE excluded.last_changed END,"
+            " url = excluded.url, price = excluded.price, title_hash = excluded.title_hash,"
+            " last_seen = excluded.last_seen, item = excluded.item",
+            (item_fingerprint(item), item.get("url"), item.get("site"), item.get("price"),
+             title_hash(item.get("title")), now, now, now, json.dumps(item.asdict(), ensure_ascii=False)),
+        )
+        self._maybe_commit()
+
+    def alive(self, site, since):
+        """URLs of ``site`` listings seen (fetched or heartbeat) since ``since``."""
+        rows = self.db.execute("SELECT url FROM listings WHERE site = ? AND last_seen >= ?", (site, since))
+        return [url for url, in rows]
+
+
+def follow_detail(spider, response, url, partial, callback):
+    """Request the detail page at ``url`` unless the listing is unchanged
+    since the last run, in which case scrape its stored item again."""
+    state = getattr(spider, "listing_state", None)
+    item = state.unchanged(partial) if state is not None else None
+    if item is not None:
+        spider.crawler.stats.inc_value("incremental/unchanged", spider=spider)
+        yield spider.item_class(item)
+        return
+    yield response.follow(url, callback, cb_kwargs={'partial': partial})
+
+
+class IncrementalPipeline:
+    """Opens the ``ListingState`` for the spider and records scraped items."""
+
+    def __init__(self, settings):
+        if not settings.get("INCREMENTAL_STATE_PATH"):
+            raise NotConfigured
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    def open_spider(self, spider):
+        spider.listing_state = ListingState(spider_path(self.settings.get("INCREMENTAL_STATE_PATH"), spider))
+
+    def close_spider(self, spider):
+        spider.listing_state.close()
+        spider.listing_state = None
+
+    def process_item(self, item, spider):
+        spider.listing_state.record(ItemAdapter(item))
+        spider.crawler.stats.inc_value("incremental/recorded", spider=spider)
+        return item
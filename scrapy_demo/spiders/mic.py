@@ -1,66 +1,32 @@
-
-import json
-import logging
-
 import scrapy
 from scrapy.crawler import CrawlerProcess
-from scrapy.loader import ItemLoader
-from itemloaders.processors import MapCompose, TakeFirst
-from w3lib.html import remove_tags
-
-
-def remove_whitespace(value):
-    return value.strip().replace("\n", "")
-
-
-class ProductItem(scrapy.Item):
-    title = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    price = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    url = scrapy.Field(
-        output_processor=TakeFirst()
-    )
-    image = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    description = scrapy.Field(
-        input_processor=MapCompose(remove_tags, remove_whitespace),
-        output_processor=TakeFirst()
-    )
-    site = scrapy.Field(
-        output_processor=TakeFirst()
-    )
-
-    def to_dict(self):
-        return {field: value for field, value in self.items()}
-
-
-process = CrawlerProcess(settings={
-    "FEEDS": {
-        "mics.json": {"format": "json"},
-    },
-    "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
-    "REQUEST_FINGERPRINTER_IMPLEMENTATION": "2.7",
-    "FEED_EXPORT_ENCODING": "utf-8",
-    "ROBOTSTXT_OBEY": False,
-    "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
-})
-
-
-class MicsScrapper(scrapy.Spider):
-    name = "mobilespider"
-    data = []
+
+from items import ElectronicsItem, ElectronicsRecord
+from pagination import follow_pages
+from settings import SETTINGS
+from sitemaps import SitemapMixin
+from woocommerce import StoreApiMixin
+
+
+class MicsScrapper(SitemapMixin, StoreApiMixin, scrapy.Spider):
+    name = "mic_spider"
+    category = "mics"
+    item_class = ElectronicsItem
     start_urls = [
         "https://celltronics.lk/product-category/microphones/",
         "https://lifemobile.lk/product-category/accessories/microphones/",
         "https://otc.lk/product-category/microphones/",
     ]
+    domain_concurrency = {'celltronics.lk': 6, 'lifemobile.lk': 6, 'otc.lk': 8}
+    store_sites = {'celltronics.lk': 'celltronic', 'lifemobile.lk': 'life_mobile', 'otc.lk': 'otc'}
+    store_details = {'celltronics.lk': 'parse_image_celltronics', 'lifemobile.lk': 'parse_image_description_lifemobile',
+                     'otc.lk': 'parse_image_description_otc'}
+    # Hard cap on each store's "Next" chain (MAX_PAGES overrides it).
+    page_count = {'celltronics': 0, 'lifemobile': 0, 'otc': 0}
+    max_pages = {'celltronics': 50, 'lifemobile': 50, 'otc': 50}
+    scheduled_pages = {}
+    pagination_links = {}
+    checkpoint_attributes = ("page_count", "scheduled_pages")
 
     def parse(self, response):
         if "celltronics.lk" in response.url:
@@ -70,49 +36,42 @@ class MicsScrapper(scrapy.Spider):
         elif "otc.lk" in response.url:
             yield from self.parse_otc(response)
 
-    def parse_image_description_otc(self, response):
-        loader = response.meta['loader']
+    def parse_image_description_otc(self, response, partial):
+        record = ElectronicsRecord(**partial)
 
         stock = response.css('p.stock::text').get()
         # Skip item if out of stock
         if stock and 'Out of stock' in stock:
             return
 
-        # Extract the first image URL from the provided HTML structure
-        image = response.css('div.woocommerce-product-gallery__image:nth-child(1) a img::attr(src)').extract_first()
+        # Extract every gallery image URL
+        image = response.css('div.woocommerce-product-gallery__image a img::attr(src)').extract()
         description_parts = response.css('div.woocommerce-product-details__short-description ul li::text').extract()
 
         description = ' | '.join(description_parts)
-        loader.add_value('description', description)
-        loader.add_value('image', image)
-        logging.info(" Inner Page ", loader.load_item())
-        self.data.append(loader.load_item())
+        record.add_text('description', description)
+        record.add_text('image', image)
+        yield record.to_item()
 
     def parse_lifemobile(self, response):
         for product in response.css("li.product"):
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "h2.woocommerce-loop-product__title")
-            loader.add_css("price", "span.woocommerce-Price-amount bdi::text")
-            loader.add_value("url", product.css("a.woocommerce-LoopProduct-link::attr(href)").get())
-            loader.add_value("site", "life_mobile")
+            record = ElectronicsRecord()
+            record.add_html("title", product.css("h2.woocommerce-loop-product__title").getall())
+            record.add_text("price", product.css("span.woocommerce-Price-amount bdi::text").getall())
+            record.add_text("url", product.css("a.woocommerce-LoopProduct-link::attr(href)").get())
+            record.add_text("site", "life_mobile")
 
             inner_page = product.css('a.woocommerce-LoopProduct-link::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_description_lifemobile)
-                request.meta['loader'] = loader
-                yield request
+                partial = record.to_dict()
+                yield response.follow(inner_page, self.parse_image_description_lifemobile, cb_kwargs={'partial': partial})
             else:
-                self.data.append(loader.load_item())
+                yield record.to_item()
 
-        next_page = response.css('a.next.page-numbers::attr(href)').get()
-        if next_page:
-            self.logger.info(f"Following next page: {next_page}")
-            yield response.follow(next_page, self.parse_lifemobile)
-        else:
-            self.logger.info("No next page found.")
+        yield from follow_pages(self, response, 'lifemobile', self.parse_lifemobile, 'a.next.page-numbers::attr(href)')
 
-    def parse_image_description_lifemobile(self, response):
-        loader = response.meta['loader']
+    def parse_image_description_lifemobile(self, response, partial):
+        record = ElectronicsRecord(**partial)
         stock = response.css('p.stock::text').get()
         # Skip item if out of stock
         if stock and 'Out of stock' in stock:
@@ -122,9 +81,9 @@ class MicsScrapper(scrapy.Spider):
         description_parts = response.css('div.woocommerce-Tabs-panel--specification table tr').extract()
 
         description = ' | '.join(description_parts)
-        loader.add_value('description', description)
-        loader.add_value('image', image)
-        self.data.append(loader.load_item())
+        record.add_html('description', description)
+        record.add_text('image', image)
+        yield record.to_item()
 
     def parse_celltronics(self, response):
 
@@ -133,67 +92,52 @@ class MicsScrapper(scrapy.Spider):
             if product.css("span.out-of-stock::text").get() == "Sold out":
                 continue
 
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "h3.wd-entities-title a::text")
-            loader.add_css("price", "span.woocommerce-Price-amount bdi::text")
-            loader.add_value("url", product.css("h3.wd-entities-title a::attr(href)").get())
-            loader.add_value("site", "celltronic")
+            record = ElectronicsRecord()
+            record.add_text("title", product.css("h3.wd-entities-title a::text").getall())
+            record.add_text("price", product.css("span.woocommerce-Price-amount bdi::text").getall())
+            record.add_text("url", product.css("h3.wd-entities-title a::attr(href)").get())
+            record.add_text("site", "celltronic")
 
             # Extracting the description from the list items within hover-content-inner
             description_items = product.css("div.hover-content-inner ul li::text").getall()
             description = " | ".join(description_items)  # Join items with a separator for clarity
-            loader.add_value("description", description)
+            record.add_text("description", description)
 
-            # item =  loader.load_item()
             inner_page = product.css('a.product-image-link::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_celltronics)
-                request.meta['loader'] = loader
-                yield request
+                partial = record.to_dict()
+                yield response.follow(inner_page, self.parse_image_celltronics, cb_kwargs={'partial': partial})
             else:
-                self.data.append(loader.load_item())
+                yield record.to_item()
 
-        next_page = response.css('a.next.page-numbers::attr(href)').get()
-        if next_page:
-            self.logger.info(f"Following next page: {next_page}")
-            yield response.follow(next_page, self.parse_celltronics)
-        else:
-            self.logger.info("No next page found.")
+        yield from follow_pages(self, response, 'celltronics', self.parse_celltronics, 'a.next.page-numbers::attr(href)')
 
-    def parse_image_celltronics(self, response):
-        loader = response.meta['loader']
+    def parse_image_celltronics(self, response, partial):
+        record = ElectronicsRecord(**partial)
         image = response.css('figure.woocommerce-product-gallery__image a::attr(href)').extract()
 
-        loader.add_value('image', image)
-        self.data.append(loader.load_item())
+        record.add_text('image', image)
+        yield record.to_item()
 
     def parse_otc(self, response):
         for product in response.css("li.product"):
-            loader = ItemLoader(item=ProductItem(), selector=product)
-            loader.add_css("title", "h2.woocommerce-loop-product__title")
-            loader.add_css("price", "span.woocommerce-Price-amount bdi::text")
-            loader.add_value("url", product.css("a.woocommerce-LoopProduct-link::attr(href)").get())
-            loader.add_value("site", "otc")
+            record = ElectronicsRecord()
+            record.add_html("title", product.css("h2.woocommerce-loop-product__title").getall())
+            record.add_text("price", product.css("span.woocommerce-Price-amount bdi::text").getall())
+            record.add_text("url", product.css("a.woocommerce-LoopProduct-link::attr(href)").get())
+            record.add_text("site", "otc")
 
             inner_page = product.css('a.woocommerce-LoopProduct-link::attr(href)').get()
             if inner_page:
-                request = response.follow(inner_page, self.parse_image_description_otc)
-                request.meta['loader'] = loader
-                yield request
+                partial = record.to_dict()
+                yield response.follow(inner_page, self.parse_image_description_otc, cb_kwargs={'partial': partial})
             else:
-                self.data.append(loader.load_item())
-
-        next_page = response.css('a.next.page-numbers::attr(href)').get()
-        if next_page:
-            self.logger.info(f"Following next page: {next_page}")
-            yield response.follow(next_page, self.parse_otc)
-        else:
-            self.logger.info("No next page found.")
+                yield record.to_item()
 
+        yield from follow_pages(self, response, 'otc', self.parse_otc, 'a.next.page-numbers::attr(href)')
 
-process.crawl(MicsScrapper)
-process.start()
 
-# Save the data to a JSON file
-with open('mics.json', 'w', encoding='utf-8') as f:
-    json.dump([item.to_dict() for item in MicsScrapper.data], f, ensure_ascii=False, indent=4)
+if __name__ == "__main__":
+    process = CrawlerProcess(settings=SETTINGS)
+    process.crawl(MicsScrapper)
+    process.start()
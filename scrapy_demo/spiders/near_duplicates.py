@@ -0,0 +1,297 @@
+"""Cross-site near-duplicate detection for vehicle ads.
+
+The same car is often posted on riyasewana, autolanka and patpat (and the
+same bike on riyasewana, saleme and patpat) with different URLs, titles
+and wording, so ``DedupPipeline`` keeps every copy. ``NearDuplicateIndex``
+groups them in two steps:
+
+* Blocking: only ads with the same manufacturer, model and year and a
+  similar mileage (``MILEAGE_BUCKET`` km) and price (``PRICE_BUCKET``, a
+  ratio) are compared. The model is the first word of the title that is
+  not part of the manufacturer or a number ("Toyota Axio 2016" -> axio),
+  and the ``model`` field only for titles without one, because autolanka
+  fills that field from its body style. An ad is stored in its own block
+  and looked up in the neighbouring mileage and price buckets too, so
+  values just either side of a bucket edge still meet.
+* MinHash/LSH on the character shingles of title, model, mileage and
+  price (the descriptions are mostly each site's spec table, so they are
+  left out): within a block an ad is only compared with the ads from other
+  sites that share at least one LSH band, and joins the cluster of the
+  most similar one whose estimated Jaccard similarity reaches
+  ``threshold``. Two ads from the same site are separate listings even
+  when they read alike. The signature is a one-permutation MinHash (each
+  shingle hashed once into one of ``NUM_PERM`` bins, keeping the minimum
+  per bin), so it costs one hash per shingle rather than ``NUM_PERM``.
+
+Each ad costs a constant number of hash lookups, so a crawl is clustered
+in near-linear time instead of comparing all pairs.
+
+``NearDuplicatePipeline`` puts the cluster's ID, the fingerprint of its
+first ad, into the item's ``canonicalId`` field. Only items that have the
+field are clustered (``VehicleItem``). With ``NEAR_DUPLICATES_PATH`` set
+the index is kept in SQLite between runs, so an ad keeps its
+``canonicalId`` from one crawl to the next. The pipeline is on unless ``NEAR_DUPLICATES_ENABLED`` is False;
+``NEAR_DUPLICATES_THRESHOLD`` sets the similarity. To see the clusters of a
+finished crawl:
+
+    python near_duplicates.py cars.jl
+"""
+import argparse
+import json
+import math
+import re
+import zlib
+from array import array
+from collections import defaultdict
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+from dedup import item_fingerprint
+from normalize import number_value, price_value
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+MILEAGE_BUCKET = 10_000
+PRICE_BUCKET = 1.1
+SHINGLE = 4
+NUM_PERM = 64
+BANDS = 16
+EMPTY = -1
+
+
+def _text(value):
+    if isinstance(value, list):
+        value = " ".join(v for v in value if v)
+    return value or ""
+
+
+def _words(value):
+    return re.findall(r"[a-z0-9]+", _text(value).lower())
+
+
+def model_key(item):
+    """The model word of the ad's title, else of its ``model`` field; None
+    if neither has one."""
+    # "Mercedes-Benz" on one site, "mercedes-benz" from a URL on another.
+    manufacturer = set(_words(item.get("manufacturer")))
+    manufacturer.add("".join(sorted(manufacturer)))
+    for value in (item.get("title"), item.get("model")):
+        for word in _words(value):
+            if word not in manufacturer and not word.isdigit():
+                return word
+    return None
+
+
+def block_keys(item):
+    """The ad's own block key followed by those of the neighbouring
+    mileage/price buckets; empty if it lacks manufacturer, model or year."""
+    manufacturer = "".join(_words(item.get("manufacturer")))
+    model = model_key(item)
+    year = number_value(_text(item.get("modelYear")))
+    if not manufacturer or not model or year is None:
+        return []
+    mileage = number_value(_text(item.get("mileage")))
+    price = price_value(_text(item.get("price")))
+    mileage_bucket = int(mileage // MILEAGE_BUCKET) if mileage is not None else None
+    price_bucket = int(math.log(price, PRICE_BUCKET)) if price else None
+    keys = []
+    for dm in (0, -1, 1) if mileage_bucket is not None else (0,):
+        for dp in (0, -1, 1) if price_bucket is not None else (0,):
+            keys.append((manufacturer, model, int(year),
+                         mileage_bucket + dm if mileage_bucket is not None else None,
+                         price_bucket + dp if price_bucket is not None else None))
+    return keys
+
+
+def signature_text(item):
+    """Title, model, mileage and price of the ad, the numbers written the
+    same way whatever the site's format."""
+    mileage = number_value(_text(item.get("mileage")))
+    price = price_value(_text(item.get("price")))
+    return " ".join([
+        _text(item.get("title")),
+        _text(item.get("model")),
+        f"{mileage:.0f}" if mileage is not None else "",
+        f"{price:.0f}" if price is not None else "",
+    ])
+
+
+def shingles(text):
+    text = re.sub(r"[^\w]+", " ", text.lower()).strip()
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def minhash(text):
+    """One-permutation MinHash signature of the shingles of ``text``
+    (``EMPTY`` in bins no shingle fell into), or None if it has none."""
+    signature = [EMPTY] * NUM_PERM
+    # crc32 is deterministic across runs, unlike hash(); the multiply
+    # spreads its low bits over the bins.
+    for s in shingles(text):
+        h = (zlib.crc32(s.encode("utf-8")) * 0x9E3779B1) & 0xFFFFFFFF
+        b, v = h % NUM_PERM, h // NUM_PERM
+        if signature[b] == EMPTY or v < signature[b]:
+            signature[b] = v
+    return tuple(signature) if any(v != EMPTY for v in signature) else None
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures: matching bins over
+    the bins that are filled in either."""
+    filled = matches = 0
+    for x, y in zip(a, b):
+        if x != EMPTY or y != EMPTY:
+            filled += 1
+            matches += x == y
+    return matches / filled if filled else 0.0
+
+
+class NearDuplicateStore(SqliteStore):
+    """Site, block key, signature and canonical ID of every ad indexed."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS ads "
+            "(fingerprint TEXT PRIMARY KEY, canonical TEXT, site TEXT, block TEXT, signature BLOB)"
+        )
+
+    def ads(self):
+        """``(fingerprint, canonical, site, block key, signature)`` of every
+        ad, in the order they were added."""
+        rows = self.db.execute("SELECT fingerprint, canonical, site, block, signature FROM ads ORDER BY rowid")
+        for fingerprint, canonical, site, block, signature in rows:
+            yield fingerprint, canonical, site, tuple(json.loads(block)), tuple(array("q", signature))
+
+    def add(self, fingerprint, canonical, site, block, signature):
+        self.db.execute(
+            "INSERT OR REPLACE INTO ads VALUES (?, ?, ?, ?, ?)",
+            (fingerprint, canonical, site, json.dumps(block), array("q", signature).tobytes()),
+        )
+        self._maybe_commit()
+
+
+class NearDuplicateIndex:
+    """Blocking plus MinHash/LSH index that assigns canonical listing IDs,
+    starting from the ads in ``store`` if one is given."""
+
+    def __init__(self, threshold=0.5, store=None):
+        self.threshold = threshold
+        self.rows = NUM_PERM // BANDS
+        self.store = store
+        self._buckets = defaultdict(list)
+        self._signatures = []
+        self._canonical = []
+        self._sites = []
+        self._entries = {}
+        if store is not None:
+            for fingerprint, canonical, site, block, signature in store.ads():
+                self._insert(fingerprint, canonical, site, block, signature)
+
+    def __len__(self):
+        return len(self._canonical)
+
+    def _bands(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def _insert(self, fingerprint, canonical, site, block, signature):
+        entry = len(self._canonical)
+        self._entries[fingerprint] = entry
+        self._signatures.append(signature)
+        self._canonical.append(canonical)
+        self._sites.append(site)
+        for band in self._bands(signature):
+            self._buckets[(block, band)].append(entry)
+
+    def add(self, item):
+        """Index ``item`` and return ``(canonical_id, is_duplicate)``."""
+        fingerprint = item_fingerprint(item).hex()[:16]
+        if fingerprint in self._entries:
+            # Indexed by an earlier run: keep its cluster.
+            canonical = self._canonical[self._entries[fingerprint]]
+            return canonical, canonical != fingerprint
+        keys = block_keys(item)
+        signature = minhash(signature_text(item))
+        if not keys or signature is None:
+            return fingerprint, False
+        site = item.get("site")
+        bands = list(self._bands(signature))
+        candidates = {
+            c for key in keys for band in bands for c in self._buckets.get((key, band), ()) if self._sites[c] != site
+        }
+        best, best_similarity = None, self.threshold
+        # Most similar first, the earliest ad on ties.
+        for candidate in sorted(candidates):
+            s = similarity(signature, self._signatures[candidate])
+            if s > best_similarity or (best is None and s == best_similarity):
+                best, best_similarity = candidate, s
+        canonical = self._canonical[best] if best is not None else fingerprint
+        self._insert(fingerprint, canonical, site, keys[0], signature)
+        if self.store is not None:
+            self.store.add(fingerprint, canonical, site, keys[0], signature)
+        return canonical, best is not None
+
+    def clear(self):
+        self._buckets.clear()
+        self._signatures.clear()
+        self._canonical.clear()
+        self._sites.clear()
+        self._entries.clear()
+
+
+class NearDuplicatePipeline:
+    """Sets ``canonicalId`` on every item that has the field."""
+
+    def __init__(self, threshold=0.5, path=None):
+        self.threshold = threshold
+        self.path = path
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("NEAR_DUPLICATES_ENABLED", True):
+            raise NotConfigured
+        return cls(settings.getfloat("NEAR_DUPLICATES_THRESHOLD", 0.5), settings.get("NEAR_DUPLICATES_PATH"))
+
+    def open_spider(self, spider):
+        store = NearDuplicateStore(spider_path(self.path, spider)) if self.path else None
+        self.index = NearDuplicateIndex(self.threshold, store)
+
+    def close_spider(self, spider):
+        if self.index.store is not None:
+            self.index.store.close()
+        self.index.clear()
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if "canonicalId" not in adapter.field_names():
+            return item
+        canonical, duplicate = self.index.add(adapter)
+        adapter["canonicalId"] = canonical
+        if duplicate:
+            spider.crawler.stats.inc_value("near_duplicates/clustered", spider=spider)
+        return item
+
+
+if __name__ == "__main__":
+    from pipelines import read_jsonlines
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSON Lines output of a vehicle crawl")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+    index = NearDuplicateIndex(args.threshold)
+    clusters = defaultdict(list)
+    for item in read_jsonlines(args.path):
+        canonical, _ = index.add(item)
+        clusters[canonical].append(item)
+    duplicates = {k: v for k, v in clusters.items() if len(v) > 1}
+    print(f"{len(index)} ads, {len(clusters)} listings, {len(duplicates)} posted more than once")
+    for canonical, items in sorted(duplicates.items(), key=lambda kv: -len(kv[1])):
+        print(f"\n{canonical}")
+        for item in items:
+            print(f"  {item.get('site')}: {_text(item.get('title'))} {item.get('url')}")
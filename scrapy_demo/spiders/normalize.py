@@ -0,0 +1,149 @@
+"""Post-crawl normalization of prices, mileage, engine capacity and year.
+
+The callbacks keep these fields as text, which is also what the JSON Lines
+output and the save API get ("7,250,000", "68,000 km", "1500 cc", "2016").
+This stage loads a crawl's JSON Lines output as Arrow columns and parses
+each field for all rows at once with ``pyarrow.compute`` kernels, instead
+of string juggling per item:
+
+* ``price``: first number in the text, commas dropped, times 100,000 for
+  "lakh(s)" and 1,000,000 for "mn"/"million"; float64.
+* ``mileage``: kilometres; int64.
+* ``engineCapacity``: cc, with values under 20 read as litres; int32.
+* ``modelYear``: int16, null outside 1900 to next year.
+
+Anything that does not parse becomes null. The typed table is written as
+Parquet to ``NORMALIZED_PATH``:
+
+    python normalize.py cars bikes       # cars.jl -> cars.parquet, bikes.jl -> bikes.parquet
+    python runner.py --normalize         # crawl, then normalize every category
+"""
+import argparse
+import datetime
+import re
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pajson
+import pyarrow.parquet as pq
+from itemloaders.processors import TakeFirst
+
+from pipelines import jsonlines_path, spider_path
+
+NUMBER = r"(?P<number>\d[\d,]*(?:\.\d+)?)"
+# Also after the callbacks strip spaces ("36.25Lakhs", "3.5Mn"); RE2
+# syntax, as pyarrow uses it, so no lookbehind.
+PRICE_MULTIPLIERS = [
+    (r"(?i)lakh|(?:^|[^a-z])lks?\b", 100_000),
+    (r"(?i)(?:^|[^a-z])mn\b|million", 1_000_000),
+]
+
+
+def number_value(text):
+    """First number in ``text`` as a float, None if there is none; the
+    one-value counterpart of ``parse_numbers``."""
+    match = re.search(NUMBER, text or "")
+    return float(match.group("number").replace(",", "")) if match else None
+
+
+def price_value(text):
+    """``text`` as a price, like ``parse_price`` does for a column."""
+    price = number_value(text)
+    if price is not None:
+        for pattern, factor in PRICE_MULTIPLIERS:
+            if re.search(pattern, text):
+                price *= factor
+    return price
+
+
+def item_schema(item_class):
+    """Arrow schema of the JSON Lines written for ``item_class``: string
+    fields, and lists of strings for fields without ``TakeFirst``."""
+    fields = []
+    for name, meta in item_class.fields.items():
+        scalar = isinstance(meta.get("output_processor"), TakeFirst)
+        fields.append(pa.field(name, pa.string() if scalar else pa.list_(pa.string())))
+    return pa.schema(fields)
+
+
+def read_items(path, item_class):
+    options = pajson.ParseOptions(explicit_schema=item_schema(item_class), unexpected_field_behavior="ignore")
+    return pajson.read_json(path, parse_options=options)
+
+
+def parse_numbers(column):
+    """First number in each string as float64, null where there is none."""
+    number = pc.struct_field(pc.extract_regex(column, NUMBER), [0])
+    return pc.cast(pc.replace_substring(number, ",", ""), pa.float64())
+
+
+def _null_unless(mask, values):
+    return pc.if_else(mask, values, pa.scalar(None, values.type))
+
+
+def parse_price(column):
+    price = parse_numbers(column)
+    for pattern, factor in PRICE_MULTIPLIERS:
+        price = pc.if_else(pc.match_substring_regex(column, pattern), pc.multiply(price, factor), price)
+    return price
+
+
+def parse_mileage(column):
+    return pc.cast(pc.round(parse_numbers(column)), pa.int64())
+
+
+def parse_engine_capacity(column):
+    cc = parse_numbers(column)
+    cc = pc.if_else(pc.less(cc, 20), pc.multiply(cc, 1000), cc)
+    return pc.cast(pc.round(cc), pa.int32())
+
+
+def parse_model_year(column):
+    year = parse_numbers(column)
+    valid = pc.and_(pc.greater_equal(year, 1900), pc.less_equal(year, datetime.date.today().year + 1))
+    return pc.cast(_null_unless(valid, year), pa.int16())
+
+
+PARSERS = {
+    "price": parse_price,
+    "mileage": parse_mileage,
+    "engineCapacity": parse_engine_capacity,
+    "modelYear": parse_model_year,
+}
+
+
+def normalize_table(table):
+    """Replace the text columns in ``PARSERS`` with their typed values."""
+    for name, parse in PARSERS.items():
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, parse(table[name]))
+    return table
+
+
+def normalize_file(path, output_path, item_class):
+    """Normalize the JSON Lines at ``path`` into Parquet; returns the row count."""
+    table = normalize_table(read_items(path, item_class))
+    pq.write_table(table, output_path)
+    return table.num_rows
+
+
+def normalize_category(spider_cls, settings):
+    """Normalize the JSON Lines output of ``spider_cls``; returns
+    ``(output_path, rows)``."""
+    output_path = spider_path(settings.get("NORMALIZED_PATH", "%(category)s.parquet"), spider_cls)
+    return output_path, normalize_file(jsonlines_path(settings, spider_cls), output_path, spider_cls.item_class)
+
+
+if __name__ == "__main__":
+    from runner import SPIDERS
+    from settings import SETTINGS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("categories", nargs="*", help=f"categories to normalize: {', '.join(SPIDERS)} (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.categories) - set(SPIDERS)
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(sorted(unknown))}")
+    for category in args.categories or SPIDERS:
+        output_path, rows = normalize_category(SPIDERS[category], SETTINGS)
+        print(f"{category}: {rows} rows -> {output_path}")
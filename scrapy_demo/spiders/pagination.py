@@ -0,0 +1,93 @@
+import re
+
+from scrapy import Request
+
+DIGITS = re.compile(r"\d+")
+
+
+def infer_page_template(urls):
+    """Find the pattern shared by pagination links that differ in one number.
+
+    Returns ``(prefix, suffix, numbers)`` so that page ``n`` lives at
+    ``f"{prefix}{n}{suffix}"``, or None when fewer than two links agree on a
+    pattern (e.g. a page that only has a "Next" link).
+    """
+    candidates = {}
+    for url in set(urls):
+        for match in DIGITS.finditer(url):
+            key = (url[:match.start()], url[match.end():])
+            candidates.setdefault(key, set()).add(int(match.group()))
+    if not candidates:
+        return None
+    (prefix, suffix), numbers = max(candidates.items(), key=lambda kv: len(kv[1]))
+    if len(numbers) < 2:
+        return None
+    return prefix, suffix, numbers
+
+
+def is_stale(spider, response, site, listings):
+    """Record the ``listings`` URLs of this page and return True once
+    ``spider.stale_pages[site]`` pages in a row held only known ones.
+
+    A page without any listings (changed markup, a block page) breaks the
+    streak: the feed is broken, not stale.
+    """
+    if not listings:
+        spider.logger.warning(f"No listings on {site} page {response.url}")
+        spider.crawler.stats.inc_value(f"pagination/empty_pages/{site}", spider=spider)
+    streak = spider.stale_streak.get(site, 0) + 1 if listings and spider.seen_urls.known(site, listings) else 0
+    spider.seen_urls.add(site, listings)
+    spider.stale_streak[site] = streak
+    if streak < spider.settings.getdict("STALE_PAGES").get(site, spider.stale_pages[site]):
+        return False
+    spider.logger.info(f"Stopping {site} at {response.url}: {streak} pages without new listings")
+    spider.crawler.stats.inc_value(f"pagination/stale_stops/{site}", spider=spider)
+    return True
+
+
+def follow_pages(spider, response, site, callback, next_css, listings=None):
+    """Yield requests for the listing pages of ``site`` that follow ``response``.
+
+    With ``PAGINATION_MODE = "enumerate"`` (the default) the page URL pattern
+    is read off the pagination links (``spider.pagination_links[site]``) and
+    every page up to ``max_pages`` is scheduled at once, so listing pages
+    download concurrently. Sites without a usable pattern, and
+    ``PAGINATION_MODE = "sequential"``, follow the "Next" link one page at a
+    time. ``MAX_PAGES`` (site to page count) overrides ``max_pages``.
+
+    A site in ``spider.stale_pages`` is paginated sequentially while the
+    spider has ``seen_urls`` (see seen_urls.py), and stops early once that
+    many pages in a row (or ``STALE_PAGES[site]``) list only ``listings``
+    URLs seen before.
+    """
+    max_pages = spider.settings.getdict("MAX_PAGES").get(site, spider.max_pages[site])
+    stale = getattr(spider, "seen_urls", None) is not None and site in getattr(spider, "stale_pages", {})
+    if stale and listings is not None:
+        if is_stale(spider, response, site, [response.urljoin(url) for url in listings]):
+            return
+    links_css = spider.pagination_links.get(site)
+    if links_css and not stale and spider.settings.get("PAGINATION_MODE", "enumerate") == "enumerate":
+        urls = [response.urljoin(href) for href in response.css(links_css).getall()]
+        template = infer_page_template(urls)
+        if template is not None:
+            prefix, suffix, numbers = template
+            # Page 1 plus at most max_pages further pages, as with "Next".
+            last = min(max(numbers), max_pages + 1)
+            first = spider.scheduled_pages.get(site, 1) + 1
+            for page in range(first, last + 1):
+                spider.page_count[site] += 1
+                yield Request(f"{prefix}{page}{suffix}", callback)
+            if last >= first:
+                spider.scheduled_pages[site] = last
+                spider.logger.info(f"Scheduled {site} listing pages {first}-{last}")
+            return
+    if site in spider.scheduled_pages:
+        return
+
+    next_page = response.css(next_css).get()
+    if next_page and spider.page_count[site] < max_pages:
+        spider.page_count[site] += 1
+        spider.logger.info(f"Following next page: {next_page}")
+        yield response.follow(next_page, callback)
+    else:
+        spider.logger.info("No next page found or maximum page limit reached.")
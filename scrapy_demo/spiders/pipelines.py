@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+from scrapy.exporters import JsonLinesItemExporter
+from scrapy.utils.defer import deferred_from_coro
+
+from dedup import DedupStore
+
+
+def spider_path(template, spider):
+    """Fill ``%(name)s``/``%(category)s`` placeholders in ``template`` with
+    the spider's attributes, like ``FEEDS`` URIs.
+
+    Every per-spider file setting (``JSONLINES_PATH``, ``CHECKPOINT_PATH``,
+    ``PRICE_HISTORY_PATH``, ...) goes through this, so all of them can hold
+    these placeholders.
+    """
+    params = {"name": spider.name, "category": getattr(spider, "category", spider.name)}
+    return template % params
+
+
+def jsonlines_path(settings, spider):
+    """Output path for ``spider``, from the ``JSONLINES_PATH`` template."""
+    return spider_path(settings.get("JSONLINES_PATH", "%(category)s.jl"), spider)
+
+
+def resumed(spider):
+    """True if ``spider`` is carrying on from a checkpoint of a crawl that
+    did not finish."""
+    checkpoint = getattr(spider, "checkpoint", None)
+    return checkpoint is not None and checkpoint.resumed
+
+
+class ValidationPipeline:
+    """Drops items whose ``validate()`` raises ``DropItem``."""
+
+    def process_item(self, item, spider):
+        validate = getattr(item, "validate", None)
+        if callable(validate):
+            try:
+                validate()
+            except DropItem:
+                site = ItemAdapter(item).get("site") or "unknown"
+                spider.crawler.stats.inc_value("validation/dropped", spider=spider)
+                spider.crawler.stats.inc_value(f"validation/dropped/{site}", spider=spider)
+                raise
+        return item
+
+
+class DedupPipeline:
+    """Drops items whose fingerprint has already been seen in this crawl.
+
+    A crawl resumed from a checkpoint also counts the items already in its
+    JSON Lines output as seen.
+    """
+
+    def __init__(self, content_fields=None, settings=None):
+        self.content_fields = content_fields
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getlist("DEDUP_CONTENT_FIELDS") or None, crawler.settings)
+
+    def open_spider(self, spider):
+        self.seen = DedupStore(self.content_fields)
+        if resumed(spider) and self.settings is not None:
+            for item in read_jsonlines(jsonlines_path(self.settings, spider)):
+                self.seen.add(item)
+
+    def close_spider(self, spider):
+        self.seen.clear()
+
+    def process_item(self, item, spider):
+        if not self.seen.add(item):
+            spider.crawler.stats.inc_value("dedup/dropped", spider=spider)
+            raise DropItem(f"Duplicate item: {ItemAdapter(item).get('url')}")
+        return item
+
+
+class JsonLinesPipeline:
+    """Streams each item to a JSON Lines file as soon as it is scraped.
+
+    The file is flushed after every item, so it can be tailed while the
+    crawl is running and nothing is held in memory. A resumed crawl
+    appends to it.
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    def open_spider(self, spider):
+        self.path = jsonlines_path(self.settings, spider)
+        self.file = open(self.path, "ab" if resumed(spider) else "wb")
+        self.exporter = JsonLinesItemExporter(
+            self.file, encoding=self.settings.get("FEED_EXPORT_ENCODING") or "utf-8", ensure_ascii=False
+        )
+        self.exporter.start_exporting()
+
+    def close_spider(self, spider):
+        self.exporter.finish_exporting()
+        self.file.close()
+
+    def process_item(self, item, spider):
+        self.exporter.export_item(item)
+        self.file.flush()
+        return item
+
+
+def read_jsonlines(path):
+    """Iterate over the items written by ``JsonLinesPipeline`` without
+    loading the whole file."""
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class BatchUploader:
+    """Posts batches of items to a save API endpoint through a pooled
+    ``requests.Session``, retrying non-201 responses with exponential
+    backoff. ``post`` blocks, so it is called from worker threads, at most
+    ``concurrency`` at a time."""
+
+    def __init__(self, endpoint, api_key, concurrency=4, max_retries=3, backoff=0.5, timeout=30, logger=None):
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json", "x-api-key": api_key})
+
+    @classmethod
+    def from_settings(cls, endpoint, settings, logger=None):
+        return cls(
+            endpoint,
+            api_key=settings.get("API_UPLOAD_API_KEY", "your-api-key"),
+            concurrency=settings.getint("API_UPLOAD_CONCURRENCY", 4),
+            max_retries=settings.getint("API_UPLOAD_MAX_RETRIES", 3),
+            backoff=settings.getfloat("API_UPLOAD_BACKOFF", 0.5),
+            timeout=settings.getfloat("API_UPLOAD_TIMEOUT", 30),
+            logger=logger,
+        )
+
+    def post(self, batch):
+        """Post ``batch``; returns ``(uploaded, retries)``."""
+        body = json.dumps(batch, ensure_ascii=False).encode("utf-8")
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(self.endpoint, data=body, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.logger.warning(f"Upload to {self.endpoint} failed: {e}")
+                continue
+            if response.status_code == 201:
+                return True, attempt
+            self.logger.warning(f"Upload to {self.endpoint} returned {response.status_code}: {response.text[:200]}")
+        self.logger.error(f"Giving up on a batch of {len(batch)} items after {self.max_retries + 1} attempts")
+        return False, self.max_retries
+
+    def close(self):
+        self.session.close()
+
+
+class ApiUploadPipeline:
+    """Posts items to the spider's ``api_endpoint`` in batches while the
+    crawl is running.
+
+    A ``BatchUploader`` posts them on a worker thread pool, so the reactor
+    never blocks on the requests. At most ``API_UPLOAD_CONCURRENCY``
+    batches are in flight; once that many are pending, item processing
+    waits for a slot.
+    """
+
+    def __init__(self, stats, settings, batch_size=20):
+        self.stats = stats
+        self.settings = settings
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(crawler.stats, settings, batch_size=settings.getint("API_UPLOAD_BATCH_SIZE", 20))
+
+    def open_spider(self, spider):
+        self.endpoint = getattr(spider, "api_endpoint", None)
+        self.batch = []
+        self.tasks = set()
+        if self.endpoint is None:
+            return
+        self.uploader = BatchUploader.from_settings(self.endpoint, self.settings, spider.logger)
+        self.slots = asyncio.Semaphore(self.uploader.concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.uploader.concurrency, thread_name_prefix="api-upload")
+
+    def close_spider(self, spider):
+        if self.endpoint is None:
+            return None
+        return deferred_from_coro(self._drain(spider))
+
+    async def process_item(self, item, spider):
+        if self.endpoint is None:
+            return item
+        self.batch.append(ItemAdapter(item).asdict())
+        if len(self.batch) >= self.batch_size:
+            await self._submit(spider)
+        return item
+
+    async def _submit(self, spider):
+        batch, self.batch = self.batch, []
+        await self.slots.acquire()
+        task = asyncio.ensure_future(self._upload(batch, spider))
+        self.tasks.add(task)
+        task.add_done_callback(self._upload_done)
+
+    def _upload_done(self, task):
+        self.tasks.discard(task)
+        self.slots.release()
+
+    async def _drain(self, spider):
+        if self.batch:
+            await self._submit(spider)
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        self.uploader.close()
+
+    async def _upload(self, batch, spider):
+        loop = asyncio.get_running_loop()
+        uploaded, retries = await loop.run_in_executor(self.executor, self.uploader.post, batch)
+        if retries:
+            self.stats.inc_value("api_upload/retries", retries, spider=spider)
+        if uploaded:
+            self.stats.inc_value("api_upload/batches", spider=spider)
+            self.stats.inc_value("api_upload/items", len(batch), spider=spider)
+        else:
+            self.stats.inc_value("api_upload/failed_batches", spider=spider)
+            self.stats.inc_value("api_upload/failed_items", len(batch), spider=spider)
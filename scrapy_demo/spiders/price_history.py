@@ -0,0 +1,146 @@
+"""Append-only price history per listing.
+
+``PriceHistory`` keeps, in SQLite, one row per listing (URL + site
+fingerprint, as in ``listing_state``) with its last known price, and one
+row per price change: ``(listing, timestamp, price, previous price)``. A
+listing whose price is the same as last time adds nothing, so daily
+re-crawls cost one lookup per ad and the file only grows with actual
+changes. Change rows are never updated or deleted.
+
+Changes are stored clustered by listing and time, so one listing's history
+is a single range scan, and a partial index over the drops alone (price
+below the previous one) by time makes "every price drop this week" a range
+scan too.
+
+``PriceHistoryPipeline`` feeds it from every spider when
+``PRICE_HISTORY_PATH`` is set. Ads an incremental run carries over are
+unchanged, so they add no rows.
+
+    python price_history.py cars --drops 7          # drops in the last 7 days
+    python price_history.py cars --url https://riyasewana.com/buy/...
+"""
+import argparse
+import datetime
+import time
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+from dedup import item_fingerprint
+from normalize import price_value
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+
+class PriceHistory(SqliteStore):
+    """Price changes of every listing seen, oldest first."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " id INTEGER PRIMARY KEY, fingerprint BLOB UNIQUE, url TEXT, site TEXT, price REAL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS changes ("
+            " listing INTEGER, ts REAL, price REAL, previous REAL,"
+            " PRIMARY KEY (listing, ts)) WITHOUT ROWID"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS drops ON changes (ts) WHERE price < previous")
+
+    def record(self, item, ts=None):
+        """Append ``item``'s price if it differs from the last one recorded
+        for its listing. Returns True if a change was written; items
+        without a parseable price are ignored."""
+        price = price_value(item.get("price"))
+        if price is None:
+            return False
+        fingerprint = item_fingerprint(item)
+        row = self.db.execute("SELECT id, price FROM listings WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is not None and row[1] == price:
+            return False
+        ts = time.time() if ts is None else ts
+        if row is None:
+            listing = self.db.execute(
+                "INSERT INTO listings (fingerprint, url, site, price) VALUES (?, ?, ?, ?)",
+                (fingerprint, item.get("url"), item.get("site"), price),
+            ).lastrowid
+            previous = None
+        else:
+            listing, previous = row
+            self.db.execute("UPDATE listings SET price = ? WHERE id = ?", (price, listing))
+        self.db.execute("INSERT OR REPLACE INTO changes VALUES (?, ?, ?, ?)", (listing, ts, price, previous))
+        self._maybe_commit()
+        return True
+
+    def history(self, url, site):
+        """``[(timestamp, price), ...]`` of the listing at ``url`` on ``site``."""
+        rows = self.db.execute(
+            "SELECT ts, changes.price FROM changes JOIN listings ON listings.id = changes.listing"
+            " WHERE listings.fingerprint = ? ORDER BY ts",
+            (item_fingerprint({"url": url, "site": site}),),
+        )
+        return rows.fetchall()
+
+    def drops(self, since, until=None):
+        """``[(url, site, timestamp, previous, price), ...]`` for every price
+        drop between ``since`` and ``until`` (timestamps), oldest first."""
+        rows = self.db.execute(
+            "SELECT url, site, ts, previous, changes.price FROM changes INDEXED BY drops"
+            " JOIN listings ON listings.id = changes.listing"
+            " WHERE changes.price < previous AND ts >= ? AND ts < ? ORDER BY ts",
+            (since, time.time() + 1 if until is None else until),
+        )
+        return rows.fetchall()
+
+
+class PriceHistoryPipeline:
+    """Records each scraped item's price in the spider's ``PriceHistory``."""
+
+    def __init__(self, settings):
+        if not settings.get("PRICE_HISTORY_PATH"):
+            raise NotConfigured
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings)
+
+    def open_spider(self, spider):
+        self.history = PriceHistory(spider_path(self.settings.get("PRICE_HISTORY_PATH"), spider))
+
+    def close_spider(self, spider):
+        self.history.close()
+
+    def process_item(self, item, spider):
+        if self.history.record(ItemAdapter(item)):
+            spider.crawler.stats.inc_value("price_history/changes", spider=spider)
+        return item
+
+
+if __name__ == "__main__":
+    from runner import SPIDERS
+    from settings import SETTINGS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("category", choices=list(SPIDERS))
+    parser.add_argument("--drops", type=float, metavar="DAYS", help="list price drops in the last DAYS days")
+    parser.add_argument("--url", help="print the price history of the listing at URL")
+    parser.add_argument("--site", help="site of --url, as in the items (default: every site with that URL)")
+    args = parser.parse_args()
+    history = PriceHistory(spider_path(SETTINGS["PRICE_HISTORY_PATH"], SPIDERS[args.category]))
+
+    def when(ts):
+        return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+    if args.url:
+        sites = [args.site] if args.site else [
+            site for site, in history.db.execute("SELECT site FROM listings WHERE url = ?", (args.url,))
+        ]
+        for site in sites:
+            for ts, price in history.history(args.url, site):
+                print(f"{when(ts)}  {site:<12} {price:>14,.0f}")
+    if args.drops is not None:
+        for url, site, ts, previous, price in history.drops(time.time() - args.drops * 86400):
+            print(f"{when(ts)}  {site:<12} {previous:>14,.0f} -> {price:>14,.0f} ({price / previous - 1:+.1%})  {url}")
+    history.close()
@@ -0,0 +1,90 @@
+"""Run several category spiders in one process and one reactor.
+
+    python runner.py                 # all categories
+    python runner.py cars bikes      # a subset
+    python runner.py cars --cache    # reuse cached responses, revalidate after the TTL
+    python runner.py cars --offline  # replay from the cache only
+    python runner.py --incremental   # detail pages only for new or changed ads
+    python runner.py --stop-when-stale  # stop newest-first feeds at pages of already seen ads
+    python runner.py --instrument    # callback timings in the stats and <category>.instrumentation.json
+    python runner.py --profile       # the same, plus sampled stacks in profile.folded
+    python runner.py --parquet       # also stream typed Parquet into crawls/category=.../site=.../crawl_date=...
+    python runner.py --store-api     # mobiles/mics from the WooCommerce Store API, HTML if it fails
+    python runner.py --sitemaps      # mobiles/mics: only products new or modified in the store sitemaps
+    python runner.py --images        # also store every gallery image once per perceptual hash in images/
+    python runner.py --normalize     # then write typed <category>.parquet (needs pyarrow)
+"""
+import argparse
+
+from scrapy.crawler import CrawlerProcess
+
+from bike import BikeScrapper
+from car import CarScrapper
+from httpcache import cache_settings
+from mic import MicsScrapper
+from mobile import MobileScraper
+from settings import SETTINGS
+
+SPIDERS = {
+    "cars": CarScrapper,
+    "bikes": BikeScrapper,
+    "mobiles": MobileScraper,
+    "mics": MicsScrapper,
+}
+
+
+def run(categories=None, settings=None):
+    process = CrawlerProcess(settings=settings or SETTINGS)
+    for category in categories or SPIDERS:
+        process.crawl(SPIDERS[category])
+    process.start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("categories", nargs="*", help=f"categories to crawl: {', '.join(SPIDERS)} (default: all)")
+    parser.add_argument("--cache", action="store_true", help="cache responses on disk and reuse them")
+    parser.add_argument("--offline", action="store_true", help="serve every request from the cache, skip the rest")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep listing state in <category>.state.db and skip unchanged ads")
+    parser.add_argument("--stop-when-stale", action="store_true",
+                        help="keep seen listing URLs in <category>.seen.db and stop feeds once pages are all known")
+    parser.add_argument("--instrument", action="store_true", help="time callbacks and write a report per category")
+    parser.add_argument("--profile", action="store_true", help="--instrument plus a sampling profiler")
+    parser.add_argument("--store-api", action="store_true",
+                        help="fetch the WooCommerce stores through their JSON Store API")
+    parser.add_argument("--sitemaps", action="store_true",
+                        help="fetch only WooCommerce products whose sitemap lastmod changed, keep the rest")
+    parser.add_argument("--parquet", nargs="?", const="crawls", metavar="DIR",
+                        help="also write a partitioned Parquet dataset under DIR (default: crawls)")
+    parser.add_argument("--images", nargs="?", const="images", metavar="DIR",
+                        help="download item images into DIR (default: images)")
+    parser.add_argument("--normalize", action="store_true", help="write typed Parquet files after the crawl")
+    args = parser.parse_args()
+    unknown = set(args.categories) - set(SPIDERS)
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(sorted(unknown))}")
+    settings = SETTINGS
+    if args.cache or args.offline:
+        settings = {**settings, **cache_settings(offline=args.offline)}
+    if args.incremental:
+        settings = {**settings, "INCREMENTAL_STATE_PATH": "%(category)s.state.db"}
+    if args.stop_when_stale:
+        settings = {**settings, "SEEN_URLS_PATH": "%(category)s.seen.db"}
+    if args.instrument or args.profile:
+        settings = {**settings, "INSTRUMENTATION_ENABLED": True, "INSTRUMENTATION_PROFILE": args.profile}
+    if args.store_api:
+        settings = {**settings, "WOOCOMMERCE_FETCH_MODE": "api"}
+    if args.sitemaps:
+        settings = {**settings, "WOOCOMMERCE_FETCH_MODE": "sitemap"}
+    if args.parquet:
+        settings = {**settings, "PARQUET_EXPORT_DIR": args.parquet}
+    if args.images:
+        settings = {**settings, "FILES_STORE": args.images}
+    run(args.categories, settings)
+    if args.normalize:
+        from normalize import normalize_category
+
+        for category in args.categories or SPIDERS:
+            output_path, rows = normalize_category(SPIDERS[category], settings)
+            print(f"{category}: {rows} rows -> {output_path}")
@@ -0,0 +1,187 @@
+"""Priority classes and a bounded detail backlog per site.
+
+``PriorityScheduler`` sorts every request into one class when it is
+enqueued and gives it that class's priority from ``SCHEDULER_PRIORITIES``:
+
+* ``retry``: a request the retry middleware sent back (``retry_times`` in
+  its meta), first, so a failed page is not left behind a full queue;
+* ``listing``: listing pages, ahead of detail pages so pagination keeps
+  feeding the crawl;
+* ``detail``: detail pages, recognised by the ``partial`` item in their
+  ``cb_kwargs`` (``follow_detail`` and the WooCommerce parsers) or by
+  ``request_class`` in their meta.
+
+Listing pages are only ahead while there is room for the detail pages they
+spawn. A site's backlog counts its waiting detail requests plus, for each
+of its listing pages being downloaded, the detail requests a listing page
+of that site has yielded on average, so pages scheduled together are not
+all let through before the first one is parsed. Once the backlog reaches
+``DETAIL_BACKLOG`` the site's listing pages are held back until it is
+down to half of that. So the queue, and the partial items the detail
+requests carry, stay bounded while items keep coming out at a steady rate.
+Held pages are let through anyway, one at a time per site, when nothing
+else is left to schedule.
+
+The peak depth per class (``scheduler/depth_max/<class>``) and backlog
+per site are updated as requests are enqueued. The current depth per
+class, the held pages and each site's detail backlog are sampled every
+``SCHEDULER_STATS_INTERVAL`` seconds, with the series in
+``scheduler/depth_history`` (``[seconds, listing, detail, retry, held]``).
+"""
+import time
+from collections import Counter, defaultdict, deque
+
+from scrapy.utils.httpobj import urlparse_cached
+from twisted.internet import task
+
+from checkpoint import CheckpointScheduler
+from handlers import domain_key
+
+META_KEY = "request_class"
+PARSING_KEY = "listing_site"
+CLASSES = ("listing", "detail", "retry")
+
+
+def request_class(request):
+    if request.meta.get("retry_times"):
+        return "retry"
+    return request.meta.get(META_KEY) or ("detail" if "partial" in request.cb_kwargs else "listing")
+
+
+class PriorityScheduler(CheckpointScheduler):
+    """``CheckpointScheduler`` with priority classes and per-site detail
+    backlogs."""
+
+    def open(self, spider):
+        settings = self.crawler.settings
+        self.priorities = {"retry": 20, "listing": 10, "detail": 0, **settings.getdict("SCHEDULER_PRIORITIES")}
+        self.backlog_limit = settings.getint("DETAIL_BACKLOG", 100)
+        self.depth = Counter()
+        self.backlog = Counter()
+        self.details = Counter()
+        self.listings = Counter()
+        self.downloading = Counter()
+        self.held = defaultdict(deque)
+        self.started = time.monotonic()
+        result = super().open(spider)
+        self.sampler = task.LoopingCall(self.sample)
+        self.sampler.start(settings.getfloat("SCHEDULER_STATS_INTERVAL", 10), now=False)
+        return result
+
+    def close(self, reason):
+        self.sampler.stop()
+        self.sample()
+        return super().close(reason)
+
+    def enqueue_request(self, request):
+        site = request.meta.pop(PARSING_KEY, None)
+        if site is not None:
+            # A retry or redirect of a listing page: the copy takes its place.
+            self.downloading[site] = max(self.downloading[site] - 1, 0)
+        cls = request_class(request)
+        request.priority = self.priorities[cls]
+        if cls != "retry":
+            request.meta[META_KEY] = cls
+        if not super().enqueue_request(request):
+            return False
+        self.depth[cls] += 1
+        self.stats.max_value(f"scheduler/depth_max/{cls}", self.depth[cls], spider=self.spider)
+        if request.meta.get(META_KEY) == "detail":
+            site = domain_key(urlparse_cached(request).hostname)
+            self.backlog[site] += 1
+            if cls == "detail":
+                # New ones only, for the average per listing page.
+                self.details[site] += 1
+            self.stats.max_value(f"scheduler/backlog_max/{site}", self.backlog[site], spider=self.spider)
+        return True
+
+    def projected_backlog(self, site):
+        """Waiting detail requests of ``site`` plus those expected from its
+        listing pages being downloaded."""
+        per_page = self.details[site] / self.listings[site] if self.listings[site] else 0
+        return self.backlog[site] + self.downloading[site] * per_page
+
+    def next_request(self):
+        request = self._release(lambda site: self.projected_backlog(site) <= self.backlog_limit // 2)
+        if request is not None:
+            return request
+        while True:
+            request = super().next_request()
+            if request is None:
+                # Nothing else to do: let a held listing page go, one per
+                # site at a time, or any if nothing is downloading.
+                idle = not self.crawler.engine.downloader.active
+                return self._release(lambda site: idle or not self.downloading[site])
+            cls = request_class(request)
+            # Requests restored from a checkpoint were never counted.
+            self.depth[cls] = max(self.depth[cls] - 1, 0)
+            site = domain_key(urlparse_cached(request).hostname)
+            if request.meta.get(META_KEY) == "detail":
+                self.backlog[site] = max(self.backlog[site] - 1, 0)
+            elif request.meta.get(META_KEY) == "listing":
+                if cls == "listing" and self.projected_backlog(site) >= self.backlog_limit:
+                    self.held[site].append(request)
+                    self.stats.inc_value(f"scheduler/held/{site}", spider=self.spider)
+                    continue
+                self._downloading(request, site)
+            return request
+
+    def _release(self, ready):
+        for site, held in self.held.items():
+            if held and ready(site):
+                request = held.popleft()
+                self._downloading(request, site)
+                return request
+        return None
+
+    def _downloading(self, request, site):
+        request.meta[PARSING_KEY] = site
+        self.downloading[site] += 1
+
+    def listing_parsed(self, request):
+        """Called once everything the listing page's callback yielded has
+        been scheduled."""
+        site = request.meta.pop(PARSING_KEY, None)
+        if site is not None:
+            self.downloading[site] = max(self.downloading[site] - 1, 0)
+            self.listings[site] += 1
+
+    def __len__(self):
+        return super().__len__() + sum(len(held) for held in self.held.values())
+
+    def sample(self):
+        held = sum(len(held) for held in self.held.values())
+        depths = [self.depth[cls] for cls in CLASSES]
+        for cls, depth in zip(CLASSES, depths):
+            self.stats.set_value(f"scheduler/depth/{cls}", depth, spider=self.spider)
+        self.stats.set_value("scheduler/depth/held", held, spider=self.spider)
+        for site, backlog in self.backlog.items():
+            self.stats.set_value(f"scheduler/backlog/{site}", backlog, spider=self.spider)
+        history = self.stats.get_value("scheduler/depth_history", [], spider=self.spider)
+        history.append([round(time.monotonic() - self.started, 1), *depths, held])
+        self.stats.set_value("scheduler/depth_history", history, spider=self.spider)
+
+
+class PriorityMiddleware:
+    """Spider middleware that tells the ``PriorityScheduler`` when a listing
+    page has been parsed, so its detail requests are in the backlog."""
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _parsed(self, response):
+        # Not isinstance(): every scheduler passes it (BaseSchedulerMeta).
+        listing_parsed = getattr(getattr(self.crawler.engine.slot, "scheduler", None), "listing_parsed", None)
+        if listing_parsed is not None and response.request is not None:
+            listing_parsed(response.request)
+
+    def process_spider_output(self, response, result, spider):
+        yield from result
+        self._parsed(response)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._parsed(response)
@@ -0,0 +1,67 @@
+"""Persistent set of the listing URLs seen on each site's listing pages.
+
+riyasewana, autolanka and saleme list ads newest first, so once a few
+pages in a row hold nothing but ads from earlier runs, the rest of the
+feed is old too. With ``SEEN_URLS_PATH`` set (python runner.py
+--stop-when-stale) ``SeenUrlsExtension`` opens a ``SeenUrls`` file for
+the spider, and ``pagination.follow_pages`` stops a site listed in the
+spider's ``stale_pages`` after that many consecutive pages of known URLs.
+Such sites are paginated through their "Next" link, one page at a time,
+so a re-crawl only fetches the new head of each feed.
+
+URLs are recorded when their listing page is parsed, whether or not the
+detail page is fetched later; a failed detail request is retried by the
+retry middleware, not by the next run.
+"""
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+
+class SeenUrls(SqliteStore):
+    """Listing URLs seen per site."""
+
+    # Counted per listing page.
+    COMMIT_EVERY = 50
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS seen (site TEXT, url TEXT, PRIMARY KEY (site, url)) WITHOUT ROWID"
+        )
+
+    def known(self, site, urls):
+        """True if every URL in ``urls`` was seen on ``site`` before."""
+        return all(
+            self.db.execute("SELECT 1 FROM seen WHERE site = ? AND url = ?", (site, url)).fetchone()
+            for url in urls
+        )
+
+    def add(self, site, urls):
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?, ?)", [(site, url) for url in urls])
+        self._maybe_commit()
+
+
+class SeenUrlsExtension:
+    """Opens the spider's ``SeenUrls`` as ``spider.seen_urls``."""
+
+    def __init__(self, settings):
+        if not settings.get("SEEN_URLS_PATH"):
+            raise NotConfigured
+        self.settings = settings
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls(crawler.settings)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        spider.seen_urls = SeenUrls(spider_path(self.settings.get("SEEN_URLS_PATH"), spider))
+
+    def spider_closed(self, spider):
+        spider.seen_urls.close()
+        spider.seen_urls = None
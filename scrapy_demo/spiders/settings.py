@@ -0,0 +1,108 @@
+# Settings shared by every spider, whether it runs on its own
+# (python car.py) or together with the others (python runner.py).
+SETTINGS = {
+    "ITEM_PIPELINES": {
+        "pipelines.ValidationPipeline": 100,
+        "listing_state.IncrementalPipeline": 150,
+        "pipelines.DedupPipeline": 200,
+        "price_history.PriceHistoryPipeline": 250,
+        "near_duplicates.NearDuplicatePipeline": 300,
+        "images.ImageStorePipeline": 700,
+        "pipelines.JsonLinesPipeline": 800,
+        "columnar.ParquetPipeline": 850,
+        "pipelines.ApiUploadPipeline": 900,
+    },
+    "SPIDER_MIDDLEWARES": {
+        "checkpoint.CheckpointMiddleware": 10,
+        "scheduling.PriorityMiddleware": 20,
+    },
+    # Below RetryMiddleware (550), so its process_exception runs after the
+    # retry one and only sees the failures that are not retried.
+    "DOWNLOADER_MIDDLEWARES": {
+        "checkpoint.CheckpointDownloaderMiddleware": 50,
+    },
+    "EXTENSIONS": {
+        "instrumentation.Instrumentation": 500,
+        "seen_urls.SeenUrlsExtension": 510,
+    },
+    # Callback timers and per-site/per-domain counters in the crawl stats,
+    # plus a JSON report at close (python runner.py --instrument).
+    "INSTRUMENTATION_ENABLED": False,
+    "INSTRUMENTATION_REPORT": "%(category)s.instrumentation.json",
+    # Estimated title+description similarity at which vehicle ads in the
+    # same make/year/mileage/price block share a canonicalId, and the index
+    # that keeps those IDs from one run to the next (near_duplicates.py).
+    "NEAR_DUPLICATES_THRESHOLD": 0.5,
+    "NEAR_DUPLICATES_PATH": "%(category)s.near_dups.db",
+    "API_UPLOAD_BATCH_SIZE": 20,
+    "API_UPLOAD_CONCURRENCY": 4,
+    "DOWNLOAD_HANDLERS": {
+        "http": "handlers.SharedPoolDownloadHandler",
+        "https": "handlers.SharedPoolDownloadHandler",
+    },
+    "CONCURRENT_REQUESTS": 32,
+    # Ceiling for any one domain; the download handler sets the actual
+    # process-wide limit, starting from each spider's domain_concurrency
+    # budget (or DOMAIN_CONCURRENCY_DEFAULT) and adapting it to latency and
+    # 429/5xx responses. DOMAIN_CONCURRENCY pins a domain to a fixed limit.
+    "CONCURRENT_REQUESTS_PER_DOMAIN": 16,
+    "DOMAIN_CONCURRENCY_DEFAULT": 4,
+    "DOMAIN_CONCURRENCY": {},
+    "ADAPTIVE_CONCURRENCY": True,
+    # Rates each domain settled on, used as the starting point next run.
+    "ADAPTIVE_CONCURRENCY_STATE": "domain_rates.json",
+    # Partitioned Parquet dataset written during the crawl (python runner.py
+    # --parquet), see columnar.py. Off when unset.
+    "PARQUET_EXPORT_DIR": None,
+    "PARQUET_ROW_GROUP_SIZE": 5000,
+    "PARQUET_COMPRESSION": "zstd",
+    # Content-addressed gallery images (python runner.py --images), see
+    # images.py. Off when FILES_STORE is unset.
+    "FILES_STORE": None,
+    "IMAGE_INDEX_PATH": "images.db",
+    "IMAGE_RECHECK_DAYS": 7,
+    # Typed output of normalize.py / runner.py --normalize.
+    "NORMALIZED_PATH": "%(category)s.parquet",
+    # "enumerate" schedules all listing pages up front, "sequential" follows "Next".
+    "PAGINATION_MODE": "enumerate",
+    # Per-site overrides of the spiders' max_pages and stale_pages.
+    "MAX_PAGES": {},
+    "STALE_PAGES": {},
+    # Seen listing URLs, so newest-first feeds stop at the first pages of
+    # known ads (python runner.py --stop-when-stale, see seen_urls.py).
+    "SEEN_URLS_PATH": None,
+    # "api" fetches the WooCommerce stores (mobiles, mics) as JSON from their
+    # Store API, 100 products a page (woocommerce.py), "sitemap" only fetches
+    # the products their sitemaps show as new or modified since the last run
+    # (sitemaps.py), "html" crawls their pages.
+    "WOOCOMMERCE_FETCH_MODE": "html",
+    "SITEMAP_INDEX_PATH": "%(category)s.sitemap.db",
+    # Append-only SQLite log of price changes per listing (price_history.py).
+    "PRICE_HISTORY_PATH": "%(category)s.prices.db",
+    # Crash-safe crawl state, committed every CHECKPOINT_INTERVAL seconds
+    # and deleted when a crawl finishes; a restarted run resumes from it
+    # (see checkpoint.py). The scheduler adds retry/listing/detail priority
+    # classes and holds a site's listing pages while DETAIL_BACKLOG of its
+    # detail requests are waiting (see scheduling.py).
+    "SCHEDULER": "scheduling.PriorityScheduler",
+    "SCHEDULER_PRIORITIES": {"retry": 20, "listing": 10, "detail": 0},
+    "DETAIL_BACKLOG": 100,
+    "SCHEDULER_STATS_INTERVAL": 10,
+    "DUPEFILTER_CLASS": "checkpoint.CheckpointDupeFilter",
+    "CHECKPOINT_PATH": "%(category)s.checkpoint.db",
+    "CHECKPOINT_INTERVAL": 5,
+    # SQLite listing state for incremental runs (python runner.py --incremental).
+    "INCREMENTAL_STATE_PATH": None,
+    # On-disk response cache for re-runs, off unless runner.py gets --cache
+    # or --offline (see httpcache.py). Stored under .scrapy/httpcache.
+    "HTTPCACHE_DIR": "httpcache",
+    "HTTPCACHE_GZIP": True,
+    "HTTPCACHE_POLICY": "httpcache.RevalidatingPolicy",
+    "HTTPCACHE_TTL": 6 * 60 * 60,
+    "HTTPCACHE_IGNORE_HTTP_CODES": [403, 404, 429, 500, 502, 503, 504],
+    "USER_AGENT": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "REQUEST_FINGERPRINTER_IMPLEMENTATION": "2.7",
+    "FEED_EXPORT_ENCODING": "utf-8",
+    "ROBOTSTXT_OBEY": False,
+    "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+}
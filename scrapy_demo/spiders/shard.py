@@ -0,0 +1,205 @@
+"""Sharded crawl: spread the start URLs of each spider over worker processes.
+
+Every start URL (one per site) is a shard. Each worker process runs its
+own CrawlerProcess for one shard and writes its own JSON Lines file and
+its own state (checkpoint, incremental state, seen URLs, sitemap and image
+indexes, domain rates) in the output directory, so no two processes write
+the same SQLite file. When all shards are done the files are merged per
+category into ``<category>.jl`` with cross-shard dedup, and the steps that
+need every site's items run there instead of in the shards: near-duplicate
+clustering, the price history and the upload to the save API. The shards'
+Parquet output has no ``canonicalId``. The domain rates the shards settled
+on are merged back into ``ADAPTIVE_CONCURRENCY_STATE``.
+
+    python shard.py --workers 4              # all categories
+    python shard.py cars bikes --workers 6
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.exporters import JsonLinesItemExporter
+from scrapy.settings import Settings
+
+from dedup import DedupStore
+from handlers import domain_key
+from near_duplicates import NearDuplicateIndex, NearDuplicateStore
+from pipelines import BatchUploader, jsonlines_path, read_jsonlines, spider_path
+from price_history import PriceHistory
+from runner import SPIDERS
+from settings import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# State each shard keeps in a file of its own, when the setting is on.
+SHARD_STATE = {
+    "CHECKPOINT_PATH": "checkpoint.db",
+    "INCREMENTAL_STATE_PATH": "state.db",
+    "SEEN_URLS_PATH": "seen.db",
+    "SITEMAP_INDEX_PATH": "sitemap.db",
+    "IMAGE_INDEX_PATH": "images.db",
+    "INSTRUMENTATION_REPORT": "instrumentation.json",
+    "ADAPTIVE_CONCURRENCY_STATE": "domain_rates.json",
+}
+# Run by merge_shards over the merged items instead.
+MERGE_PIPELINES = (
+    "price_history.PriceHistoryPipeline",
+    "near_duplicates.NearDuplicatePipeline",
+    "pipelines.ApiUploadPipeline",
+)
+
+
+def plan_shards(categories=None):
+    """Return one ``(category, site, start_urls)`` shard per site."""
+    shards = []
+    for category in categories or SPIDERS:
+        by_site = {}
+        for url in SPIDERS[category].start_urls:
+            by_site.setdefault(domain_key(urlparse(url).hostname), []).append(url)
+        shards.extend((category, site, urls) for site, urls in by_site.items())
+    return shards
+
+
+def shard_path(output_dir, category, site, suffix="jl"):
+    return os.path.join(output_dir, f"{category}-{site}.{suffix}")
+
+
+def crawl_shard(category, site, start_urls, output_dir):
+    settings = dict(SETTINGS)
+    settings["JSONLINES_PATH"] = shard_path(output_dir, category, site)
+    for name, suffix in SHARD_STATE.items():
+        if settings.get(name):
+            settings[name] = shard_path(output_dir, category, site, suffix)
+    settings["ITEM_PIPELINES"] = dict(SETTINGS["ITEM_PIPELINES"], **dict.fromkeys(MERGE_PIPELINES))
+    process = CrawlerProcess(settings=settings)
+    process.crawl(SPIDERS[category], start_urls=start_urls)
+    process.start()
+    return category, site
+
+
+def merge_shards(paths, output_path, spider_cls, settings):
+    """Merge shard outputs into ``output_path``, dropping items already seen
+    in another shard, and run the ``MERGE_PIPELINES`` steps on the rest.
+    Returns ``(written, dropped, uploaded)``."""
+    seen = DedupStore()
+    near_duplicates = history = uploader = None
+    if settings.getbool("NEAR_DUPLICATES_ENABLED", True) and "canonicalId" in spider_cls.item_class.fields:
+        path = settings.get("NEAR_DUPLICATES_PATH")
+        near_duplicates = NearDuplicateIndex(settings.getfloat("NEAR_DUPLICATES_THRESHOLD", 0.5),
+                                             NearDuplicateStore(spider_path(path, spider_cls)) if path else None)
+    if settings.get("PRICE_HISTORY_PATH"):
+        history = PriceHistory(spider_path(settings.get("PRICE_HISTORY_PATH"), spider_cls))
+    endpoint = getattr(spider_cls, "api_endpoint", None)
+    if endpoint is not None:
+        uploader = BatchUploader.from_settings(endpoint, settings, logger)
+        executor = ThreadPoolExecutor(max_workers=uploader.concurrency, thread_name_prefix="api-upload")
+    batch_size = settings.getint("API_UPLOAD_BATCH_SIZE", 20)
+    batch, uploads = [], {}
+    written = dropped = uploaded = 0
+
+    def collect(futures):
+        nonlocal uploaded
+        for future in futures:
+            if future.result()[0]:
+                uploaded += len(uploads[future])
+            del uploads[future]
+
+    def upload(batch):
+        # Keep at most ``concurrency`` batches waiting besides those posting.
+        if len(uploads) >= 2 * uploader.concurrency:
+            collect(wait(uploads, return_when=FIRST_COMPLETED).done)
+        uploads[executor.submit(uploader.post, batch)] = batch
+
+    with open(output_path, "wb") as f:
+        exporter = JsonLinesItemExporter(f, encoding=settings.get("FEED_EXPORT_ENCODING") or "utf-8",
+                                         ensure_ascii=False)
+        exporter.start_exporting()
+        for path in paths:
+            for item in read_jsonlines(path):
+                if not seen.add(item):
+                    dropped += 1
+                    continue
+                if near_duplicates is not None:
+                    item["canonicalId"], _ = near_duplicates.add(item)
+                if history is not None:
+                    history.record(item)
+                exporter.export_item(item)
+                written += 1
+                if uploader is not None:
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        upload(batch)
+                        batch = []
+        exporter.finish_exporting()
+    if uploader is not None:
+        if batch:
+            upload(batch)
+        collect(wait(uploads).done)
+        executor.shutdown()
+        uploader.close()
+    if history is not None:
+        history.close()
+    if near_duplicates is not None and near_duplicates.store is not None:
+        near_duplicates.store.close()
+    return written, dropped, uploaded
+
+
+def merge_rates(paths, output_path):
+    """Write the newest rate of every domain in the shards' rate files to
+    ``output_path``."""
+    rates = {}
+    for path in [output_path, *paths]:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for domain, rate in json.load(f).items():
+                if domain not in rates or rate.get("updated", 0) >= rates[domain].get("updated", 0):
+                    rates[domain] = rate
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(rates, f, indent=2, sort_keys=True)
+
+
+def run(categories=None, workers=None, output_dir="shards"):
+    os.makedirs(output_dir, exist_ok=True)
+    shards = plan_shards(categories)
+    # Every shard starts from the saved rates and saves its own.
+    rates_path = SETTINGS.get("ADAPTIVE_CONCURRENCY_STATE")
+    rate_paths = [shard_path(output_dir, c, site, SHARD_STATE["ADAPTIVE_CONCURRENCY_STATE"]) for c, site, _ in shards]
+    if rates_path and os.path.exists(rates_path):
+        for path in rate_paths:
+            shutil.copyfile(rates_path, path)
+    # A Twisted reactor cannot be restarted, so every shard gets a fresh process.
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes=workers or os.cpu_count(), maxtasksperchild=1) as pool:
+        results = [pool.apply_async(crawl_shard, (category, site, urls, output_dir)) for category, site, urls in shards]
+        for result in results:
+            result.get()
+
+    if rates_path:
+        merge_rates(rate_paths, rates_path)
+
+    settings = Settings(SETTINGS)
+    for category in categories or SPIDERS:
+        paths = [shard_path(output_dir, c, site) for c, site, _ in shards if c == category]
+        output_path = jsonlines_path(settings, SPIDERS[category])
+        written, dropped, uploaded = merge_shards(paths, output_path, SPIDERS[category], settings)
+        print(f"{category}: {written} items from {len(paths)} shards, {dropped} cross-shard duplicates dropped, "
+              f"{uploaded} uploaded")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("categories", nargs="*", help=f"categories to crawl: {', '.join(SPIDERS)} (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default="shards", help="directory for per-shard output")
+    args = parser.parse_args()
+    unknown = set(args.categories) - set(SPIDERS)
+    if unknown:
+        parser.error(f"unknown categories: {', '.join(sorted(unknown))}")
+    run(args.categories, args.workers, args.output_dir)
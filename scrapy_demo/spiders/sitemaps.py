@@ -0,0 +1,183 @@
+"""Sitemap-driven change detection for the WooCommerce stores.
+
+With ``WOOCOMMERCE_FETCH_MODE = "sitemap"`` (python runner.py --sitemaps)
+a spider using ``SitemapMixin`` does not walk the category pages. It reads
+each store's product sitemaps (``/sitemap_index.xml``, as written by Yoast
+and Rank Math, else the WordPress core ``/wp-sitemap.xml``) and compares
+every product's ``lastmod`` with ``SitemapIndex``, kept in SQLite at
+``SITEMAP_INDEX_PATH``:
+
+* unchanged products of the spider's category are carried over: the item
+  stored for them last time is scraped again, so the output is still a
+  full snapshot of the catalogue;
+* new or modified products get their product page fetched. A page in the
+  category (WooCommerce's ``product_cat-<slug>`` class, the slug being the
+  last path segment of the start URL) goes through the site's usual detail
+  callback and its item is stored; a product of another category is only
+  remembered, and not fetched again until it changes.
+
+Entries without ``lastmod`` are always fetched. Products gone from the
+sitemap drop out of the snapshot. The first run fetches every product page
+of each store once. A store without a sitemap is crawled through its HTML
+pages.
+"""
+import json
+from urllib.parse import urlparse
+
+from scrapy import Request, signals
+from scrapy.loader import ItemLoader
+from scrapy.utils.gz import gunzip, gzip_magic_number
+from scrapy.utils.sitemap import Sitemap
+
+from handlers import domain_key
+from pipelines import spider_path
+from sqlite_store import SqliteStore
+
+SITEMAP_PATHS = ("/sitemap_index.xml", "/wp-sitemap.xml")
+
+
+def category_slug(start_url):
+    return urlparse(start_url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def is_product_sitemap(url):
+    """True for the product sitemaps of an index: ``product-sitemap2.xml``,
+    ``wp-sitemap-posts-product-1.xml``..."""
+    name = urlparse(url).path.rsplit("/", 1)[-1]
+    return "product" in name and "product_cat" not in name and "categor" not in name
+
+
+class SitemapIndex(SqliteStore):
+    """``lastmod`` of every product seen in a sitemap, whether it belongs to
+    the crawled category, and its last scraped item."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            " url TEXT PRIMARY KEY, site TEXT, lastmod TEXT, member INTEGER, item TEXT)"
+        )
+
+    def get(self, url):
+        """``(lastmod, member, item)`` of ``url``, or None if never seen."""
+        row = self.db.execute("SELECT lastmod, member, item FROM products WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        lastmod, member, item = row
+        return lastmod, bool(member), json.loads(item) if item else None
+
+    def record(self, url, site, lastmod, member, item=None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?)",
+            (url, site, lastmod, int(member), json.dumps(dict(item), ensure_ascii=False) if item else None),
+        )
+        self._maybe_commit()
+
+
+class SitemapMixin:
+    """``start_requests`` and callbacks for the sitemap mode.
+
+    Besides ``store_sites`` the spider names, in ``store_details``, the
+    detail callback of each store (domain to method name); it is called
+    with the product page and the title, price, URL and site read from it.
+    """
+
+    store_details = {}
+
+    def start_requests(self):
+        if self.settings.get("WOOCOMMERCE_FETCH_MODE", "html") != "sitemap":
+            yield from super().start_requests()
+            return
+        self.sitemap_index = SitemapIndex(spider_path(self.settings.get("SITEMAP_INDEX_PATH"), self))
+        self.crawler.signals.connect(self._close_sitemap_index, signals.spider_closed)
+        for url in self.start_urls:
+            yield self._sitemap_request(url, 0)
+
+    def _close_sitemap_index(self, spider):
+        if spider is self:
+            self.sitemap_index.close()
+
+    def _sitemap_request(self, html_url, attempt):
+        url = urlparse(html_url)
+        return Request(f"{url.scheme}://{url.netloc}{SITEMAP_PATHS[attempt]}", callback=self.parse_sitemap,
+                       errback=self.sitemap_failed, cb_kwargs={"html_url": html_url, "attempt": attempt})
+
+    def parse_sitemap(self, response, html_url, attempt=None):
+        body = response.body
+        if body[:2] == gzip_magic_number:
+            body = gunzip(body)
+        sitemap = Sitemap(body) if body.lstrip()[:1] == b"<" else None
+        if sitemap is None or sitemap.type not in ("sitemapindex", "urlset"):
+            yield from self._sitemap_fallback(html_url, attempt, f"not a sitemap ({response.url})")
+            return
+        if sitemap.type == "sitemapindex":
+            for entry in sitemap:
+                if is_product_sitemap(entry["loc"]):
+                    yield Request(entry["loc"], callback=self.parse_sitemap, errback=self.sitemap_failed,
+                                  cb_kwargs={"html_url": html_url})
+            return
+        self.crawler.stats.inc_value("sitemap/sitemaps", spider=self)
+        site = self.store_sites.get(domain_key(urlparse(html_url).hostname))
+        for entry in sitemap:
+            yield from self._sitemap_product(entry["loc"], entry.get("lastmod"), site, html_url)
+
+    def _sitemap_product(self, url, lastmod, site, html_url):
+        stats = self.crawler.stats
+        known = self.sitemap_index.get(url)
+        if known is not None and lastmod and known[0] == lastmod:
+            _, member, item = known
+            if member and item:
+                stats.inc_value("sitemap/unchanged", spider=self)
+                yield self.item_class(item)
+            return
+        stats.inc_value("sitemap/changed" if known else "sitemap/new", spider=self)
+        yield Request(url, callback=self.parse_sitemap_product, meta={"request_class": "detail"},
+                      cb_kwargs={"site": site, "lastmod": lastmod, "html_url": html_url})
+
+    def parse_sitemap_product(self, response, site, lastmod, html_url):
+        index = self.sitemap_index
+        # Keyed by the sitemap's URL, even if the product page redirects.
+        url = response.meta.get("redirect_urls", [response.url])[0]
+        if not response.css(f".product_cat-{category_slug(html_url)}"):
+            index.record(url, site, lastmod, member=False)
+            return
+        if response.css("p.stock.out-of-stock"):
+            index.record(url, site, lastmod, member=True)
+            return
+        loader = ItemLoader(item=self.item_class(), selector=response)
+        loader.add_css("title", "h1.product_title::text")
+        # The sale price if there is one.
+        loader.add_value("price", response.css("p.price ins bdi::text").get()
+                         or response.css("p.price bdi::text").get())
+        loader.add_value("url", response.url)
+        loader.add_value("site", site)
+        partial = dict(loader.load_item())
+        detail = getattr(self, self.store_details[domain_key(urlparse(html_url).hostname)])
+        item = None
+        for item in detail(response, partial):
+            if not item.get("description"):
+                # The listing card's description, where the detail callback
+                # has none of its own (celltronics).
+                description = " | ".join(
+                    response.css("div.woocommerce-product-details__short-description li::text").getall())
+                if description:
+                    item["description"] = description
+            yield item
+        index.record(url, site, lastmod, member=True, item=item)
+
+    def sitemap_failed(self, failure):
+        kwargs = failure.request.cb_kwargs
+        yield from self._sitemap_fallback(kwargs["html_url"], kwargs.get("attempt"), repr(failure.value))
+
+    def _sitemap_fallback(self, html_url, attempt, reason):
+        if attempt is None:
+            # A product sitemap listed in the index; the others still count.
+            self.logger.warning(f"Sitemap for {html_url} failed: {reason}")
+            self.crawler.stats.inc_value("sitemap/failed", spider=self)
+            return
+        if attempt + 1 < len(SITEMAP_PATHS):
+            yield self._sitemap_request(html_url, attempt + 1)
+            return
+        self.logger.info(f"No sitemap for {html_url} ({reason}), crawling the HTML pages")
+        self.crawler.stats.inc_value(f"sitemap/fallbacks/{domain_key(urlparse(html_url).hostname)}", spider=self)
+        yield Request(html_url, callback=self.parse, dont_filter=True)
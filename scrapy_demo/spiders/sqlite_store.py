@@ -0,0 +1,68 @@
+"""Base class of the SQLite files the crawl keeps between runs.
+
+Price history, listing state, seen URLs, sitemap index, image index and
+checkpoints all open one connection in WAL mode, batch their writes into a
+transaction that is committed every ``COMMIT_EVERY`` changes (checkpoints
+on a timer instead), and commit on close. ``SqliteStore`` does that once
+for all of them.
+
+A file that several crawlers of one process write, like ``images.db`` when
+``runner.py`` runs every category, is opened with ``shared()``: one
+connection per path for the whole process, as ``SharedPoolDownloadHandler``
+shares its connection pool. Separate connections would each hold a write
+transaction open until their next commit and keep the others waiting on
+the lock.
+"""
+import os
+import sqlite3
+
+
+class SqliteStore:
+    """One SQLite file in WAL mode with batched commits.
+
+    Subclasses create their tables in ``__init__`` after calling this one,
+    and call ``_maybe_commit()`` after each change.
+    """
+
+    COMMIT_EVERY = 500
+    TIMEOUT = 30
+
+    _shared = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=self.TIMEOUT)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self._pending = 0
+        self._shared_key = None
+        self._refs = 0
+
+    @classmethod
+    def shared(cls, path):
+        """The process-wide store for ``path``; each caller closes it once,
+        and the connection is closed with the last one."""
+        key = (cls, os.path.abspath(path))
+        store = SqliteStore._shared.get(key)
+        if store is None:
+            store = SqliteStore._shared[key] = cls(path)
+            store._shared_key = key
+        store._refs += 1
+        return store
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        if self._shared_key is not None:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+            del SqliteStore._shared[self._shared_key]
+        self.db.close()
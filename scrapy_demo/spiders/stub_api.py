@@ -0,0 +1,73 @@
+"""Local stand-in for the save API (``/api/saveCars``, ``/api/saveBikes``).
+
+Run ``python stub_api.py --port 8080`` and point a crawl at it to exercise
+``ApiUploadPipeline`` without the real backend. ``--fail-rate`` makes a
+share of requests answer 500 so retries can be observed.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    paths = ("/api/saveCars", "/api/saveBikes")
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path not in self.paths:
+            self._reply(404, {"error": "not found"})
+            return
+        if server.latency:
+            time.sleep(server.latency)
+        if random.random() < server.fail_rate:
+            self._reply(500, {"error": "injected failure"})
+            return
+        try:
+            items = json.loads(body)
+        except ValueError:
+            self._reply(400, {"error": "invalid json"})
+            return
+        with server.lock:
+            server.received.setdefault(self.path, []).extend(items)
+        self._reply(201, {"saved": len(items)})
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8080, fail_rate=0.0, latency=0.0):
+    server = ThreadingHTTPServer((host, port), StubApiHandler)
+    server.fail_rate = fail_rate
+    server.latency = latency
+    server.received = {}
+    server.lock = threading.Lock()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.fail_rate, args.latency)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for path, items in server.received.items():
+            print(f"{path}: {len(items)} items")
@@ -0,0 +1,118 @@
+"""Bulk product fetch through the WooCommerce Store API.
+
+Every electronics store is a WooCommerce shop, and WooCommerce serves its
+catalogue as JSON at ``/wp-json/wc/store/v1/products``: up to 100 products
+per page, with price, stock, images, description and attributes. With
+``WOOCOMMERCE_FETCH_MODE = "api"`` (python runner.py --store-api) a spider
+using ``StoreApiMixin`` asks for its categories there instead of walking
+the HTML grid and one detail page per product, which turns thousands of
+requests into a few per store. The category is the last path segment of
+each start URL. All pages of a category are scheduled as soon as the first
+one reports the page count (``X-WP-TotalPages``).
+
+A store whose API does not answer, or answers with something other than a
+product list, is crawled through its HTML pages as before.
+"""
+import html
+from urllib.parse import urlencode, urlparse
+
+from scrapy import Request
+from scrapy.loader import ItemLoader
+
+from handlers import domain_key
+
+STORE_API_PATH = "/wp-json/wc/store/v1/products"
+PER_PAGE = 100
+
+
+def store_api_url(start_url, page=1):
+    url = urlparse(start_url)
+    category = url.path.rstrip("/").rsplit("/", 1)[-1]
+    query = urlencode({"category": category, "per_page": PER_PAGE, "page": page})
+    return f"{url.scheme}://{url.netloc}{STORE_API_PATH}?{query}"
+
+
+def format_price(prices):
+    """Store API price (minor units) as the text the shop shows, e.g.
+    ``"12,000.00"``."""
+    minor = int(prices.get("currency_minor_unit", 2))
+    return f"{int(prices['price']) / 10 ** minor:,.{minor}f}"
+
+
+def describe(product):
+    """Attributes as "name: value" parts, else the short description."""
+    parts = [
+        f"{attribute['name']}: {', '.join(term['name'] for term in attribute.get('terms', []))}"
+        for attribute in product.get("attributes") or []
+    ]
+    return " | ".join(parts) or product.get("short_description") or product.get("description") or ""
+
+
+class StoreApiMixin:
+    """``start_requests``, callback and errback for the Store API mode.
+
+    The spider names each store's ``site`` value in ``store_sites``
+    (domain to site), as its HTML callbacks do.
+    """
+
+    store_sites = {}
+
+    def start_requests(self):
+        if self.settings.get("WOOCOMMERCE_FETCH_MODE", "html") != "api":
+            yield from super().start_requests()
+            return
+        for url in self.start_urls:
+            yield Request(store_api_url(url), callback=self.parse_store_api, errback=self.store_api_failed,
+                          cb_kwargs={"html_url": url, "page": 1})
+
+    def parse_store_api(self, response, html_url, page):
+        stats = self.crawler.stats
+        try:
+            products = response.json()
+        except ValueError:
+            products = None
+        if not isinstance(products, list):
+            yield from self._store_api_fallback(html_url, page, f"not a product list ({response.url})")
+            return
+        stats.inc_value("store_api/pages", spider=self)
+        site = self.store_sites.get(domain_key(urlparse(html_url).hostname))
+        for product in products:
+            item = self.store_api_item(product, site)
+            if item is not None:
+                stats.inc_value("store_api/products", spider=self)
+                yield item
+        if page == 1:
+            pages = int(response.headers.get("X-WP-TotalPages", b"1") or 1)
+            for next_page in range(2, pages + 1):
+                yield Request(store_api_url(html_url, next_page), callback=self.parse_store_api,
+                              errback=self.store_api_failed, cb_kwargs={"html_url": html_url, "page": next_page})
+
+    def store_api_item(self, product, site):
+        """``product`` as an ``item_class`` item, None if it is out of stock
+        or has no price."""
+        prices = product.get("prices") or {}
+        if not product.get("is_in_stock", True) or not prices.get("price") or int(prices["price"]) == 0:
+            return None
+        loader = ItemLoader(item=self.item_class())
+        loader.add_value("title", html.unescape(product.get("name") or ""))
+        loader.add_value("price", format_price(prices))
+        loader.add_value("url", product.get("permalink"))
+        loader.add_value("site", site)
+        loader.add_value("description", describe(product))
+        loader.add_value("image", [image["src"] for image in product.get("images") or [] if image.get("src")])
+        return loader.load_item()
+
+    def store_api_failed(self, failure):
+        kwargs = failure.request.cb_kwargs
+        yield from self._store_api_fallback(kwargs["html_url"], kwargs["page"], repr(failure.value))
+
+    def _store_api_fallback(self, html_url, page, reason):
+        if page != 1:
+            # The first page worked, so this is a transient failure; the
+            # HTML crawl would repeat everything already fetched.
+            self.logger.warning(f"Store API page {page} for {html_url} failed: {reason}")
+            self.crawler.stats.inc_value("store_api/failed_pages", spider=self)
+            return
+        self.logger.info(f"Store API unavailable for {html_url} ({reason}), crawling the HTML pages")
+        self.crawler.stats.inc_value(f"store_api/fallbacks/{domain_key(urlparse(html_url).hostname)}", spider=self)
+        yield Request(html_url, callback=self.parse, dont_filter=True)